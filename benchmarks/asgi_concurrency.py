@@ -0,0 +1,203 @@
+"""Borrow requests in flight under WSGI threads and under one ASGI loop.
+
+Every request opens a Stripe checkout session inline, which
+``FakeStripeClient`` stretches to ``--stripe-delay`` seconds. The WSGI run
+serves the sync ``BorrowingViewSet.create`` from a pool of
+``--wsgi-threads`` threads, as a threaded gunicorn worker would; the ASGI run
+serves ``BorrowingCreateAsyncView`` from a single event loop with up to
+``--concurrency`` requests in flight, as one uvicorn worker would:
+
+    python -m benchmarks.asgi_concurrency --requests 400 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from benchmarks.common import (
+    benchmark_database,
+    print_table,
+    seed_books,
+    seed_users,
+    summarize,
+)
+
+
+def request_body(book_id):
+    return json.dumps(
+        {
+            "book": book_id,
+            "expected_return_date": (date.today() + timedelta(days=7)).isoformat(),
+        }
+    ).encode()
+
+
+def run_wsgi(tokens, book_ids, threads):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connections
+    from django.test import RequestFactory
+
+    handler = WSGIHandler()
+
+    def borrow(index):
+        environ = (
+            RequestFactory()
+            .generic(
+                "POST",
+                "/api/borrowing/",
+                request_body(book_ids[index % len(book_ids)]),
+                content_type="application/json",
+                HTTP_AUTHORIZATION=f"Bearer {tokens[index]}",
+            )
+            .environ
+        )
+        statuses = []
+        started = time.perf_counter()
+        b"".join(handler(environ, lambda status, headers: statuses.append(status)))
+        return int(statuses[0][:3]), started
+
+    def timed(index, submitted):
+        status, _ = borrow(index)
+        return status, (time.perf_counter() - submitted) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [
+            pool.submit(timed, index, time.perf_counter())
+            for index in range(len(tokens))
+        ]
+        results = [future.result() for future in futures]
+        pool.map(lambda _: connections.close_all(), range(threads))
+    return results, time.perf_counter() - started
+
+
+async def asgi_post(app, path, body, token):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"testserver"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"authorization", f"Bearer {token}".encode()),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    delivered = False
+    finished = asyncio.Event()
+    statuses = []
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    await app(scope, receive, send)
+    finished.set()
+    return statuses[0]
+
+
+def run_asgi(tokens, book_ids, concurrency):
+    from django.core.handlers.asgi import ASGIHandler
+
+    app = ASGIHandler()
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def borrow(index):
+            submitted = time.perf_counter()
+            async with semaphore:
+                status = await asgi_post(
+                    app,
+                    "/api/borrowing/async/",
+                    request_body(book_ids[index % len(book_ids)]),
+                    tokens[index],
+                )
+            return status, (time.perf_counter() - submitted) * 1000
+
+        return await asyncio.gather(*(borrow(i) for i in range(len(tokens))))
+
+    started = time.perf_counter()
+    results = asyncio.run(main())
+    return results, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--stripe-delay", type=float, default=0.2)
+    parser.add_argument("--wsgi-threads", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    with benchmark_database(on_disk=True):
+        from django.test import override_settings
+        from rest_framework.views import APIView
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        from book.models import Book
+        from library_service.asyncapi import AsyncAPIView
+        from payment.models import Payment
+        from user.models import User
+
+        # Far more requests than the "100/day" rates allow
+        APIView.throttle_classes = ()
+        AsyncAPIView.throttle_classes = ()
+        seed_books(50)
+        Book.objects.update(inventory=args.requests * 2)
+        book_ids = list(Book.objects.values_list("id", flat=True))
+
+        rows = []
+        stripe = {
+            "BACKEND": "payment.stripe_client.FakeStripeClient",
+            "OPTIONS": {"delay": args.stripe_delay},
+        }
+        with override_settings(PAYMENT_SESSION_MODE="sync", STRIPE_CLIENT=stripe):
+            for name, runner, width in (
+                (f"WSGI, {args.wsgi_threads} threads", run_wsgi, args.wsgi_threads),
+                (f"ASGI, {args.concurrency} in flight", run_asgi, args.concurrency),
+            ):
+                prefix = name.split(",")[0].lower()
+                tokens = [
+                    str(AccessToken.for_user(User(pk=user_id)))
+                    for user_id in seed_users(args.requests, prefix=prefix)
+                ]
+                results, elapsed = runner(tokens, book_ids, width)
+                statuses = [status for status, _ in results]
+                assert set(statuses) == {201}, set(statuses)
+                stats = summarize([latency for _, latency in results])
+                rows.append(
+                    (
+                        name,
+                        f"{args.requests / elapsed:,.0f}",
+                        f"{stats['p50']:.0f}",
+                        f"{stats['p99']:.0f}",
+                        f"{elapsed:.1f}",
+                    )
+                )
+        assert Payment.objects.count() == 2 * args.requests
+        print(f"{args.requests} borrowings, Stripe delay {args.stripe_delay}s")
+        print_table(("server", "req/s", "p50 ms", "p99 ms", "total s"), rows)
+
+
+if __name__ == "__main__":
+    main()
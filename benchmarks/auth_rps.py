@@ -0,0 +1,85 @@
+"""Requests per second on ``GET /api/books/`` by authentication method.
+
+The catalog list is answered from the response cache, so what remains of a
+request is mostly routing, throttling and authentication. Compares loading
+the user row (``JWTAuthentication``) with building it from the token claims,
+without and with the in-process token cache:
+
+    python -m benchmarks.auth_rps --requests 5000
+"""
+
+import argparse
+import time
+
+from benchmarks.common import (
+    benchmark_database,
+    count_queries,
+    create_user,
+    print_table,
+    seed_books,
+)
+
+
+def run(client, url, requests):
+    from django.db import connection
+
+    with count_queries(connection) as queries:
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = client.get(url)
+        elapsed = time.perf_counter() - started
+    assert response.status_code == 200, response.status_code
+    return requests / elapsed, queries["count"] / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--cache-ttl", type=int, default=30)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        from django.conf import settings
+        from django.test import override_settings
+        from rest_framework.test import APIClient
+        from rest_framework.views import APIView
+        from rest_framework_simplejwt.authentication import JWTAuthentication
+
+        from book.views import BookViewSet
+        from user.authentication import ClaimsJWTAuthentication
+
+        seed_books(1_000)
+        create_user()
+        APIView.throttle_classes = ()
+        client = APIClient()
+        access = client.post(
+            "/api/user/token/",
+            {"email": "bench@example.com", "password": "benchpass123"},
+        ).data["access"]
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        url = "/api/books/"
+        client.get(url)  # fill the response cache
+
+        redis_client = settings.REDIS_CLIENT
+        if "OPTIONS" not in redis_client:
+            # The in-process FakeRedis; one process shares it with itself
+            redis_client = {**redis_client, "OPTIONS": {"shared": True}}
+        rows = []
+        for name, authentication, ttl in (
+            ("user row (JWTAuthentication)", JWTAuthentication, 0),
+            ("token claims", ClaimsJWTAuthentication, 0),
+            (
+                f"token claims, {args.cache_ttl}s cache",
+                ClaimsJWTAuthentication,
+                args.cache_ttl,
+            ),
+        ):
+            BookViewSet.authentication_classes = (authentication,)
+            with override_settings(JWT_CLAIMS_CACHE_TTL=ttl, REDIS_CLIENT=redis_client):
+                rps, queries = run(client, url, args.requests)
+            rows.append((name, f"{rps:,.0f}", f"{queries:.1f}"))
+        print_table(("authentication", "requests/s", "queries/request"), rows)
+
+
+if __name__ == "__main__":
+    main()
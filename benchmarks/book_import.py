@@ -0,0 +1,122 @@
+"""Time and peak memory of a catalog import.
+
+Writes a synthetic feed of ``--rows`` books (a tenth of them repeating an
+earlier title and author, to exercise the upsert), imports it with the
+``import_books`` pipeline and checks the run against ``--target-seconds``.
+The per-row ``BookSerializer`` path that ``POST /api/books/`` takes is
+timed on ``--legacy-rows`` for comparison:
+
+    python -m benchmarks.book_import --rows 1000000 --target-seconds 300
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import WORDS, PeakRSS, benchmark_database, print_table
+
+
+def write_feed(path, rows, import_format, seed=42):
+    rng = random.Random(seed)
+    fields = ("title", "author", "cover", "inventory", "daily_fee")
+    with open(path, "w", newline="") as feed:
+        writer = csv.writer(feed) if import_format == "csv" else None
+        if writer:
+            writer.writerow(fields)
+        for i in range(rows):
+            # Every tenth row updates a book imported earlier
+            number = rng.randrange(i) if i and i % 10 == 0 else i
+            row = (
+                f"{WORDS[number % 30].title()} {WORDS[number // 30 % 30]} {number}",
+                f"Author {number % 50_000}",
+                rng.choice(("HARD", "SOFT")),
+                rng.randint(0, 20),
+                f"{rng.randint(10, 999) / 100:.2f}",
+            )
+            if writer:
+                writer.writerow(row)
+            else:
+                feed.write(json.dumps(dict(zip(fields, row))) + "\n")
+
+
+def legacy_import(path, limit):
+    """One serializer and one INSERT per row, as the API does today."""
+    from book.serializers import BookSerializer
+
+    with open(path, newline="") as feed:
+        for i, row in enumerate(csv.DictReader(feed)):
+            if i == limit:
+                break
+            serializer = BookSerializer(data=row)
+            if serializer.is_valid():
+                serializer.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--legacy-rows", type=int, default=10_000)
+    parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--target-seconds", type=float, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="library-import-") as directory:
+        path = os.path.join(directory, f"feed.{args.format}")
+        write_feed(path, args.rows, args.format)
+
+        with benchmark_database(on_disk=True):
+            from django.conf import settings
+
+            from book.importer import import_books
+            from book.models import Book
+
+            # As in production: with DEBUG every INSERT and its parameters
+            # would be kept in connection.queries
+            settings.DEBUG = False
+
+            rows = []
+            if args.format == "csv" and args.legacy_rows:
+                started = time.perf_counter()
+                legacy_import(path, args.legacy_rows)
+                elapsed = time.perf_counter() - started
+                rows.append(
+                    (
+                        "serializer per row",
+                        f"{args.legacy_rows:,}",
+                        f"{elapsed:.1f}",
+                        f"{args.legacy_rows / elapsed:,.0f}",
+                        "-",
+                    )
+                )
+                Book.objects.all().delete()
+
+            with PeakRSS() as rss, open(path, newline="") as feed:
+                started = time.perf_counter()
+                report = import_books(feed, args.format, batch_size=args.batch_size)
+                elapsed = time.perf_counter() - started
+            rows.append(
+                (
+                    f"import_books ({args.format})",
+                    f"{report['rows']:,}",
+                    f"{elapsed:.1f}",
+                    f"{report['rows'] / elapsed:,.0f}",
+                    f"{rss.growth_mb:,.1f}",
+                )
+            )
+            print_table(
+                ("path", "rows", "seconds", "rows/s", "peak RSS growth MB"), rows
+            )
+            print(
+                f"\n{Book.objects.count():,} books, {report['rejected']} rejected; "
+                f"target {args.target_seconds:.0f}s "
+                + ("met" if elapsed <= args.target_seconds else "MISSED")
+            )
+
+
+if __name__ == "__main__":
+    main()
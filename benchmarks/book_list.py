@@ -0,0 +1,67 @@
+"""Latency of ``GET /api/books/`` as the catalog grows.
+
+    python -m benchmarks.book_list --sizes 10000 100000 1000000
+"""
+
+import argparse
+from base64 import b64encode
+from urllib.parse import urlencode
+
+from benchmarks.common import (
+    api_client,
+    benchmark_database,
+    create_user,
+    measure,
+    print_table,
+    seed_books,
+    summarize,
+)
+
+
+def cursor_for(position):
+    return b64encode(urlencode({"p": position}).encode()).decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        from book.models import Book
+
+        client = api_client(create_user())
+        client.get("/api/books/")  # warm up URL resolution and imports
+        rows = []
+        seeded = 0
+        for size in sorted(args.sizes):
+            seed_books(size - seeded, start=seeded)
+            seeded = size
+            middle_id = Book.objects.order_by("id").values_list("id", flat=True)[
+                size // 2
+            ]
+            scenarios = {
+                "first page": {},
+                "middle page": {"cursor": cursor_for(middle_id)},
+                "by title": {"ordering": "title"},
+            }
+            for name, params in scenarios.items():
+                stats = summarize(
+                    measure(lambda: client.get("/api/books/", params), args.repeat)
+                )
+                rows.append(
+                    (
+                        f"{size:,}",
+                        name,
+                        f"{stats['p50']:.2f}",
+                        f"{stats['p99']:.2f}",
+                    )
+                )
+        print_table(("rows", "scenario", "p50 ms", "p99 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Latency of catalog search and facets against a seeded catalog.
+
+Compares the FTS5 word-prefix and trigram tables with a plain ``icontains``
+scan:
+
+    python -m benchmarks.book_search --size 1000000
+"""
+
+import argparse
+import time
+
+from benchmarks.common import (
+    api_client,
+    benchmark_database,
+    create_user,
+    measure,
+    print_table,
+    seed_books,
+    summarize,
+)
+
+QUERIES = ("river", "golden ocean", "stati", "secret journey 4242")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        from django.db.models import Q
+        from django.test import override_settings
+
+        from book.models import Book
+
+        started = time.perf_counter()
+        seed_books(args.size)
+        print(f"seeded {args.size:,} books in {time.perf_counter() - started:.1f}s")
+
+        client = api_client(create_user())
+        client.get("/api/books/")
+        rows = []
+
+        def record(backend, scenario, func):
+            stats = summarize(measure(func, args.repeat))
+            rows.append(
+                (backend, scenario, f"{stats['p50']:.2f}", f"{stats['p99']:.2f}")
+            )
+
+        for backend in ("fts5", "trigram"):
+            with override_settings(BOOK_SEARCH_BACKEND=backend):
+                for query in QUERIES:
+                    record(
+                        backend,
+                        f"search {query!r}",
+                        lambda: client.get("/api/books/", {"search": query}),
+                    )
+                record(
+                    backend,
+                    "facets 'river' in stock",
+                    lambda: client.get(
+                        "/api/books/facets/", {"search": "river", "in_stock": "1"}
+                    ),
+                )
+
+        for query in QUERIES:
+
+            def scan():
+                condition = Q()
+                for term in query.split():
+                    condition &= Q(title__icontains=term) | Q(author__icontains=term)
+                list(Book.objects.filter(condition).order_by("id")[:51])
+
+            record("icontains", f"search {query!r}", scan)
+
+        print_table(("backend", "scenario", "p50 ms", "p99 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
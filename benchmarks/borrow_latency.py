@@ -0,0 +1,67 @@
+"""Borrow request latency with Stripe in and out of the request path.
+
+Stripe is replaced by ``FakeStripeClient`` with an injected delay:
+
+    python -m benchmarks.borrow_latency --requests 100 --stripe-delay 0.2
+"""
+
+import argparse
+import time
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from benchmarks.common import (
+    api_client,
+    benchmark_database,
+    create_user,
+    print_table,
+    summarize,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--stripe-delay", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        from django.test import override_settings
+
+        from book.models import Book
+
+        book = Book.objects.create(
+            title="Popular",
+            author="Author",
+            cover="HARD",
+            inventory=10 * args.requests,
+            daily_fee="1.00",
+        )
+        payload = {
+            "book": book.id,
+            "expected_return_date": date.today() + timedelta(days=7),
+        }
+        stripe = {
+            "BACKEND": "payment.stripe_client.FakeStripeClient",
+            "OPTIONS": {"delay": args.stripe_delay},
+        }
+        rows = []
+        for mode in ("sync", "async"):
+            samples = []
+            with override_settings(
+                PAYMENT_SESSION_MODE=mode, STRIPE_CLIENT=stripe
+            ), patch("payment.tasks.create_stripe_session.delay"):
+                for i in range(args.requests):
+                    client = api_client(create_user(f"{mode}-{i}@example.com"))
+                    started = time.perf_counter()
+                    response = client.post("/api/borrowing/", payload)
+                    samples.append((time.perf_counter() - started) * 1000)
+                    assert response.status_code == 201, response.content
+            stats = summarize(samples)
+            rows.append((mode, f"{stats['p50']:.1f}", f"{stats['p99']:.1f}"))
+        print(f"Stripe delay: {args.stripe_delay * 1000:.0f} ms")
+        print_table(("mode", "p50 ms", "p99 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""500 single returns against one bulk return.
+
+Every borrowing is overdue, so each return also charges a fine. Stripe is
+``FakeStripeClient`` and session tasks run inline, so ``single`` and ``bulk``
+do the same work; ``bulk, deferred`` leaves the sessions to Celery and shows
+the cost of the request itself:
+
+    python -m benchmarks.bulk_return --borrowings 500 --stripe-delay 0
+"""
+
+import argparse
+import time
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from benchmarks.common import (
+    api_client,
+    benchmark_database,
+    count_queries,
+    create_user,
+    print_table,
+    seed_books,
+    seed_users,
+)
+
+
+def seed(count, prefix):
+    from book.models import Book
+    from borrow.models import Borrowing
+
+    book_ids = list(Book.objects.values_list("id", flat=True))
+    today = date.today()
+    Borrowing.objects.bulk_create(
+        Borrowing(
+            user_id=user_id,
+            book_id=book_ids[i % len(book_ids)],
+            borrow_date=today - timedelta(days=14),
+            expected_return_date=today - timedelta(days=1 + i % 5),
+        )
+        for i, user_id in enumerate(seed_users(count, prefix=prefix))
+    )
+    return list(
+        Borrowing.objects.filter(user__email__startswith=prefix).values_list(
+            "id", flat=True
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--borrowings", type=int, default=500)
+    parser.add_argument("--stripe-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with benchmark_database() as connection:
+        from django.test import override_settings
+
+        from payment.models import Payment
+
+        seed_books(50)
+        client = api_client(create_user(is_staff=True))
+        stripe = {
+            "BACKEND": "payment.stripe_client.FakeStripeClient",
+            "OPTIONS": {"delay": args.stripe_delay},
+        }
+
+        def single(ids):
+            for pk in ids:
+                response = client.post(f"/api/borrowing/{pk}/return_book/")
+                assert response.status_code == 200, response.content
+
+        def bulk(ids):
+            response = client.post(
+                "/api/borrowing/bulk-return/", {"borrowings": ids}, format="json"
+            )
+            assert response.status_code == 200, response.content
+
+        rows = []
+        scenarios = (
+            ("single", single, lambda group: group.apply()),
+            ("bulk", bulk, lambda group: group.apply()),
+            ("bulk, deferred", bulk, lambda group: None),
+        )
+        for index, (name, func, dispatch) in enumerate(scenarios):
+            with override_settings(STRIPE_CLIENT=stripe), patch(
+                "celery.canvas.group.apply_async", dispatch
+            ):
+                ids = seed(args.borrowings, prefix=f"run{index}-")
+                with count_queries(connection) as queries:
+                    started = time.perf_counter()
+                    func(ids)
+                    elapsed = time.perf_counter() - started
+                fines = Payment.objects.filter(
+                    borrowing_id__in=ids, type=Payment.TypeChoices.FINE
+                ).count()
+                assert fines == len(ids), fines
+                rows.append(
+                    (
+                        name,
+                        f"{len(ids):,}",
+                        len(ids) if func is single else 1,
+                        f"{queries['count']:,}",
+                        f"{elapsed * 1000:.0f}",
+                    )
+                )
+        print(f"Stripe delay: {args.stripe_delay * 1000:.0f} ms")
+        print_table(("mode", "returns", "requests", "queries", "ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Shared scaffolding for the benchmark scripts.
+
+Benchmarks run against a throwaway test database, so they never touch the
+development ``db.sqlite3``. Run them from the repository root, e.g.::
+
+    python -m benchmarks.book_list --sizes 10000 100000
+"""
+
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service.settings")
+    # Test settings: an in-process FakeRedis unless REDIS_URL is set
+    os.environ.setdefault("DJANGO_TESTING", "1")
+    import django
+
+    django.setup()
+
+
+@contextmanager
+def benchmark_database(on_disk=False):
+    """Create a throwaway test database for the duration of the block.
+
+    SQLite test databases live in memory by default; ``on_disk`` puts them
+    in a temporary file instead, which multi-threaded benchmarks need to get
+    real lock waiting rather than immediate shared-cache lock errors.
+    """
+    setup_django()
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    directory = None
+    if on_disk and connection.vendor == "sqlite":
+        directory = tempfile.mkdtemp(prefix="library-bench-")
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(directory, "db.sqlite3")
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def api_client(user):
+    from rest_framework.test import APIClient
+    from rest_framework.views import APIView
+
+    # Benchmarks issue far more requests than the "100/day" rates allow.
+    APIView.throttle_classes = ()
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def create_user(email="bench@example.com", is_staff=False):
+    from user.models import User
+
+    return User.objects.create_user(
+        email=email, password="benchpass123", is_staff=is_staff
+    )
+
+
+WORDS = (
+    "river night garden shadow empire silent winter glass crown storm "
+    "letter island hidden memory golden ocean forest broken city dream "
+    "stone fire secret journey house lost light summer station paper"
+).split()
+
+
+def seed_books(count, start=0, batch_size=10_000, seed=42):
+    """Insert ``count`` synthetic books, numbered from ``start``."""
+    from book.models import Book
+
+    rng = random.Random(seed + start)
+    for offset in range(start, start + count, batch_size):
+        stop = min(offset + batch_size, start + count)
+        Book.objects.bulk_create(
+            Book(
+                title=f"{' '.join(rng.choices(WORDS, k=3)).title()} {i}",
+                author=f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}",
+                cover=rng.choice(("HARD", "SOFT")),
+                inventory=rng.randint(0, 20),
+                daily_fee=f"{rng.randint(10, 999) / 100:.2f}",
+            )
+            for i in range(offset, stop)
+        )
+
+
+@contextmanager
+def count_queries(connection):
+    """Count statements without the 9000-entry cap of ``connection.queries``."""
+    stats = {"count": 0, "seconds": 0.0}
+
+    def wrapper(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats["count"] += 1
+            stats["seconds"] += time.perf_counter() - started
+
+    with connection.execute_wrapper(wrapper):
+        yield stats
+
+
+def measure(func, repeat):
+    """Call ``func`` ``repeat`` times and return the latencies in ms."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        "p50": percentile(samples, 50),
+        "p99": percentile(samples, 99),
+        "mean": statistics.fmean(samples),
+    }
+
+
+def print_table(headers, rows):
+    widths = [
+        max(len(str(header)), *(len(str(row[i])) for row in rows))
+        for i, header in enumerate(headers)
+    ]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
+
+
+def seed_users(count, prefix="reader", batch_size=10_000):
+    """Insert ``count`` users without hashing passwords; returns their ids."""
+    from user.models import User
+
+    for offset in range(0, count, batch_size):
+        User.objects.bulk_create(
+            User(email=f"{prefix}{i}@example.com", password="!")
+            for i in range(offset, min(offset + batch_size, count))
+        )
+    return list(
+        User.objects.filter(email__startswith=prefix)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+
+def seed_overdue_borrowings(count, books=1_000, days=30, batch_size=10_000):
+    """One open, overdue borrowing per fresh user, spread over ``days``."""
+    from datetime import date, timedelta
+
+    from book.models import Book
+    from borrow.models import Borrowing
+
+    if Book.objects.count() < books:
+        seed_books(books - Book.objects.count(), start=Book.objects.count())
+    book_ids = list(Book.objects.values_list("id", flat=True)[:books])
+    user_ids = seed_users(count, prefix="overdue")
+    today = date.today()
+    for offset in range(0, count, batch_size):
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                user_id=user_id,
+                book_id=book_ids[i % len(book_ids)],
+                borrow_date=today - timedelta(days=60),
+                expected_return_date=today - timedelta(days=1 + i % days),
+            )
+            for i, user_id in enumerate(
+                user_ids[offset : offset + batch_size], start=offset
+            )
+        )
+
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def current_rss():
+    """Resident set size of this process in bytes (Linux only)."""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * PAGE_SIZE
+
+
+class PeakRSS:
+    """Sample the RSS every few milliseconds while the block runs."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    @property
+    def growth_mb(self):
+        return (self.peak - self.baseline) / 2**20
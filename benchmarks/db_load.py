@@ -0,0 +1,200 @@
+"""pgbench-style mixed load against the API, per database profile.
+
+Each client thread runs a fixed mix of requests for ``--duration`` seconds
+through the real WSGI handler, so connections are opened and closed exactly
+as in production (``CONN_MAX_AGE`` is honoured on request start and finish).
+The mix is catalog and payment reads plus borrowing a book and returning it. SQLite
+compares the rollback journal with per-request connections against WAL with
+persistent connections; with ``DB_ENGINE=postgresql`` the two profiles differ
+in ``CONN_MAX_AGE`` only:
+
+    python -m benchmarks.db_load --clients 8 --duration 10
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import (
+    WORDS,
+    benchmark_database,
+    create_user,
+    print_table,
+    seed_books,
+    summarize,
+)
+
+SQLITE_PROFILES = (
+    (
+        "rollback journal, no reuse",
+        {"CONN_MAX_AGE": 0},
+        {"journal_mode": "DELETE", "synchronous": "FULL", "transaction_mode": None},
+    ),
+    (
+        "WAL, persistent",
+        {"CONN_MAX_AGE": 60},
+        {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "transaction_mode": "IMMEDIATE",
+        },
+    ),
+)
+POSTGRES_PROFILES = (
+    ("connection per request", {"CONN_MAX_AGE": 0}, {}),
+    ("persistent connections", {"CONN_MAX_AGE": 60}, {}),
+)
+
+
+def request_environ(method, path, token, payload=None):
+    from django.test import RequestFactory
+
+    factory = RequestFactory(HTTP_AUTHORIZATION=f"Bearer {token}")
+    if payload is None:
+        return factory.generic(method, path).environ
+    return factory.generic(
+        method, path, json.dumps(payload), content_type="application/json"
+    ).environ
+
+
+def client_loop(handler, token, book_ids, deadline, rng):
+    """Run the request mix until ``deadline``; returns latencies and errors."""
+    latencies, errors = [], 0
+
+    def call(method, path, payload=None):
+        nonlocal errors
+        statuses = []
+        started = time.perf_counter()
+        body = b"".join(
+            handler(
+                request_environ(method, path, token, payload),
+                lambda status, headers: statuses.append(int(status[:3])),
+            )
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+        if statuses[0] >= 400:
+            errors += 1
+            return None
+        return body
+
+    due = (date.today() + timedelta(days=7)).isoformat()
+    while time.perf_counter() < deadline:
+        call("GET", f"/api/books/?page_size=20&search={rng.choice(WORDS)}")
+        call("GET", f"/api/books/{rng.choice(book_ids)}/")
+        call("GET", "/api/payments/")
+        call(
+            "POST",
+            "/api/borrowing/",
+            {"book": rng.choice(book_ids), "expected_return_date": due},
+        )
+        # Readers only see their active borrowings
+        active = call("GET", "/api/borrowing/")
+        for borrowing in json.loads(active or "[]"):
+            call("POST", f"/api/borrowing/{borrowing['id']}/return_book/", {})
+    return latencies, errors
+
+
+def run(profile, clients, duration, tokens, book_ids):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connection, connections
+    from django.db.backends.signals import connection_created
+
+    name, settings, options = profile
+    connection.settings_dict.update(settings)
+    connection.settings_dict["OPTIONS"].update(options)
+    connections.close_all()
+
+    # The journal mode is a property of the file; switch it before the
+    # clients start rather than have them race for the exclusive lock
+    connection.ensure_connection()
+    connections.close_all()
+
+    handler = WSGIHandler()
+    opened = []
+
+    def count_connection(**kwargs):
+        opened.append(kwargs["connection"].alias)
+
+    connection_created.connect(count_connection)
+    results = []
+    barrier = threading.Barrier(clients)
+
+    def worker(index):
+        rng = random.Random(index)
+        barrier.wait()
+        try:
+            results.append(
+                client_loop(
+                    handler,
+                    tokens[index],
+                    book_ids,
+                    time.perf_counter() + duration,
+                    rng,
+                )
+            )
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    connection_created.disconnect(count_connection)
+
+    latencies = [sample for samples, _ in results for sample in samples]
+    stats = summarize(latencies)
+    return (
+        name,
+        f"{len(latencies) / duration:,.0f}",
+        f"{stats['p50']:.1f}",
+        f"{stats['p99']:.1f}",
+        sum(errors for _, errors in results),
+        len(opened),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--books", type=int, default=2_000)
+    args = parser.parse_args()
+
+    with benchmark_database(on_disk=True) as connection:
+        from django.test import override_settings
+        from rest_framework.views import APIView
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        from book.models import Book
+
+        # Far more requests than the "100/day" rates allow
+        APIView.throttle_classes = ()
+        seed_books(args.books)
+        Book.objects.update(inventory=1_000_000)
+        book_ids = list(Book.objects.values_list("id", flat=True))
+        tokens = [
+            str(AccessToken.for_user(create_user(f"client{i}@example.com")))
+            for i in range(args.clients)
+        ]
+        profiles = (
+            SQLITE_PROFILES if connection.vendor == "sqlite" else POSTGRES_PROFILES
+        )
+
+        rows = []
+        with override_settings(
+            STRIPE_CLIENT={"BACKEND": "payment.stripe_client.FakeStripeClient"}
+        ):
+            for profile in profiles:
+                rows.append(run(profile, args.clients, args.duration, tokens, book_ids))
+        print(f"{connection.vendor}, {args.clients} clients, {args.duration:g}s each")
+        print_table(
+            ("profile", "req/s", "p50 ms", "p99 ms", "errors", "connections"), rows
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Peak memory of the streamed borrowing export as the table grows.
+
+Seeds returned borrowings in steps up to the largest size, downloads
+``/api/borrowing/export/`` after each step and samples the process RSS
+while the response is consumed. The streamed export should stay flat; the
+list endpoint it replaces for reports (unpaginated, every row through the
+serializer into one body) is measured at the smallest size for comparison.
+Linux only, as RSS is read from ``/proc``:
+
+    python -m benchmarks.export_memory --sizes 100000 1000000 5000000
+"""
+
+import argparse
+import time
+
+from benchmarks.common import (
+    PeakRSS,
+    api_client,
+    benchmark_database,
+    create_user,
+    print_table,
+    seed_books,
+    seed_users,
+)
+
+
+def seed_returned_borrowings(start, stop, user_ids, book_ids, batch_size=20_000):
+    from datetime import date, timedelta
+
+    from borrow.models import Borrowing
+
+    today = date.today()
+    for offset in range(start, stop, batch_size):
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                user_id=user_ids[i % len(user_ids)],
+                book_id=book_ids[i % len(book_ids)],
+                borrow_date=today - timedelta(days=30 + i % 365),
+                expected_return_date=today - timedelta(days=16 + i % 365),
+                actual_return_date=today - timedelta(days=20 + i % 365),
+            )
+            for i in range(offset, min(offset + batch_size, stop))
+        )
+
+
+def streamed(client, export_format):
+    from django.urls import reverse
+
+    response = client.get(
+        reverse("borrowing:borrowing-export"), {"export_format": export_format}
+    )
+    size = 0
+    for chunk in response.streaming_content:
+        size += len(chunk)
+    return size
+
+
+def listed(client):
+    from django.urls import reverse
+
+    # The list endpoint is not paginated: the whole result set is loaded
+    # and rendered as one body, which is how reports were built before.
+    return len(client.get(reverse("borrowing:borrowing-list")).content)
+
+
+def measure_rss(func, label, size):
+    with PeakRSS() as rss:
+        started = time.perf_counter()
+        body = func()
+        elapsed = time.perf_counter() - started
+    return (
+        label,
+        f"{size:,}",
+        f"{body / 2**20:,.0f}",
+        f"{elapsed:.1f}",
+        f"{size / elapsed:,.0f}",
+        f"{rss.growth_mb:,.1f}",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000]
+    )
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    args = parser.parse_args()
+
+    with benchmark_database(on_disk=True):
+        from book.models import Book
+
+        seed_books(1_000)
+        book_ids = list(Book.objects.values_list("id", flat=True))
+        user_ids = seed_users(1_000)
+        client = api_client(create_user(is_staff=True))
+
+        rows = []
+        seeded = 0
+        for size in sorted(args.sizes):
+            seed_returned_borrowings(seeded, size, user_ids, book_ids)
+            seeded = size
+            if size == min(args.sizes):
+                rows.append(measure_rss(lambda: listed(client), "list endpoint", size))
+            rows.append(
+                measure_rss(
+                    lambda: streamed(client, args.format), f"export {args.format}", size
+                )
+            )
+        print_table(
+            ("path", "rows", "body MB", "seconds", "rows/s", "peak RSS growth MB"),
+            rows,
+        )
+
+
+if __name__ == "__main__":
+    main()
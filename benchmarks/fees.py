@@ -0,0 +1,73 @@
+"""Nightly billing and the outstanding-balance report, SQL vs Python.
+
+Totals the fines of every open borrowing with the per-object
+``calculate_fine`` loop and with one ``annotate_fees`` aggregate, then times
+the staff outstanding-balance report:
+
+    python -m benchmarks.fees --rows 100000
+"""
+
+import argparse
+import time
+
+from benchmarks.common import (
+    benchmark_database,
+    count_queries,
+    print_table,
+    seed_overdue_borrowings,
+)
+
+
+def timed(func):
+    from django.db import connection
+
+    with count_queries(connection) as queries:
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+    return result, queries["count"], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        from django.db.models import Sum
+
+        from borrow.models import Borrowing
+        from payment.fees import annotate_fees, outstanding_balance_report
+        from payment.service import calculate_fine
+
+        seed_overdue_borrowings(args.rows)
+        open_borrowings = Borrowing.objects.filter(actual_return_date__isnull=True)
+
+        def python_loop():
+            return sum(
+                calculate_fine(borrowing)
+                for borrowing in open_borrowings.select_related("book").iterator(
+                    chunk_size=2_000
+                )
+            )
+
+        def sql_aggregate():
+            return annotate_fees(open_borrowings).aggregate(total=Sum("fine"))["total"]
+
+        rows = []
+        totals = []
+        for name, func in (
+            ("calculate_fine loop", python_loop),
+            ("annotate_fees aggregate", sql_aggregate),
+            ("outstanding report", outstanding_balance_report),
+        ):
+            result, queries, elapsed = timed(func)
+            if name != "outstanding report":
+                totals.append(result)
+            rows.append((name, f"{args.rows:,}", queries, f"{elapsed * 1000:.1f}"))
+        assert totals[0] == totals[1], totals
+        print_table(("scenario", "open rows", "queries", "ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""N workers borrow one hot book at the same time.
+
+Compares the atomic reservation path with the previous read-modify-write
+code, reporting throughput and whether inventory ended up consistent:
+
+    python -m benchmarks.inventory_contention --workers 32 --attempts 50
+"""
+
+import argparse
+import threading
+import time
+
+from benchmarks.common import benchmark_database, print_table
+
+
+def naive_reserve(book_id):
+    from book.models import Book
+
+    book = Book.objects.get(pk=book_id)
+    if book.inventory <= 0:
+        return False
+    book.inventory -= 1
+    book.save()
+    return True
+
+
+def atomic_reserve(book_id):
+    from borrow.services import BookOutOfStock, reserve_book
+
+    try:
+        reserve_book(book_id)
+    except BookOutOfStock:
+        return False
+    return True
+
+
+def run(strategy, book_id, workers, attempts):
+    from django.db import OperationalError, connections
+
+    barrier = threading.Barrier(workers)
+    reserved = []
+    retries = []
+
+    def worker():
+        barrier.wait()
+        mine = busy = 0
+        try:
+            for _ in range(attempts):
+                while True:
+                    try:
+                        mine += strategy(book_id)
+                        break
+                    except OperationalError:
+                        busy += 1
+        finally:
+            connections.close_all()
+        reserved.append(mine)
+        retries.append(busy)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(reserved), sum(retries), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--attempts", type=int, default=50)
+    parser.add_argument("--inventory", type=int, default=500)
+    args = parser.parse_args()
+
+    with benchmark_database(on_disk=True):
+        from book.models import Book
+
+        rows = []
+        for name, strategy in (
+            ("read-modify-write", naive_reserve),
+            ("atomic", atomic_reserve),
+        ):
+            book = Book.objects.create(
+                title=f"Hot Book ({name})",
+                author="Author",
+                cover="HARD",
+                inventory=args.inventory,
+                daily_fee="1.00",
+            )
+            reserved, retries, elapsed = run(
+                strategy, book.pk, args.workers, args.attempts
+            )
+            book.refresh_from_db()
+            expected = args.inventory - min(reserved, args.inventory)
+            rows.append(
+                (
+                    name,
+                    reserved,
+                    book.inventory,
+                    (
+                        "yes"
+                        if book.inventory == expected and reserved <= args.inventory
+                        else "NO"
+                    ),
+                    retries,
+                    f"{args.workers * args.attempts / elapsed:,.0f}",
+                )
+            )
+        print_table(
+            (
+                "strategy",
+                "reserved",
+                "inventory left",
+                "consistent",
+                "busy retries",
+                "attempts/s",
+            ),
+            rows,
+        )
+
+
+if __name__ == "__main__":
+    main()
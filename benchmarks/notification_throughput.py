@@ -0,0 +1,79 @@
+"""Enqueue latency and delivery throughput of the notification outbox.
+
+Delivery goes through ``FakeBotTransport`` with an injected per-call
+latency and Telegram's rate limits, so it runs offline:
+
+    python -m benchmarks.notification_throughput --notifications 5000 --chats 20
+"""
+
+import argparse
+import time
+
+from benchmarks.common import benchmark_database, measure, print_table, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--notifications", type=int, default=5000)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        from borrow.notifications import (
+            DEFAULT_RATE_LIMITS,
+            FakeBotTransport,
+            RateLimiter,
+            drain_outbox,
+            enqueue_notification,
+        )
+
+        counter = iter(range(args.notifications))
+
+        def enqueue_next():
+            number = next(counter)
+            enqueue_notification(
+                f"Notification {number}", chat_id=f"chat-{number % args.chats}"
+            )
+
+        enqueue = summarize(measure(enqueue_next, args.notifications))
+
+        transport = FakeBotTransport(latency=args.latency)
+        rate_limiter = RateLimiter(**DEFAULT_RATE_LIMITS)
+        delivered = messages = 0
+        started = time.perf_counter()
+        while True:
+            stats = drain_outbox(
+                batch_size=args.batch_size,
+                transport=transport,
+                rate_limiter=rate_limiter,
+            )
+            if not stats["notifications"]:
+                break
+            delivered += stats["notifications"]
+            messages += stats["messages"]
+        elapsed = time.perf_counter() - started
+
+        # One blocking send per notification, as before the outbox, is
+        # capped by the global rate limit and the per-call latency.
+        per_message = max(args.latency, 1 / DEFAULT_RATE_LIMITS["global_per_second"])
+        print_table(
+            ("metric", "value"),
+            [
+                ("enqueue p50 ms", f"{enqueue['p50']:.3f}"),
+                ("enqueue p99 ms", f"{enqueue['p99']:.3f}"),
+                ("notifications delivered", delivered),
+                ("Telegram API calls", messages),
+                ("drain time s", f"{elapsed:.2f}"),
+                ("notifications / s", f"{delivered / elapsed:,.0f}"),
+                (
+                    "one-send-per-notification time s",
+                    f"{args.notifications * per_message:.1f}",
+                ),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    main()
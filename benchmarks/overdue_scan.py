@@ -0,0 +1,116 @@
+"""Queries and wall time of the nightly overdue scan.
+
+Compares the streamed digest scan with the previous per-row loop (run on a
+subset, since it needs two queries per borrowing) and with the sharded
+scan, run eagerly in this process. Its shards run one after the other
+here; on workers the wall time is that of the longest shard. The digest
+scan reports each borrowing once, so it is run again after
+``--newly-overdue`` borrowings have become overdue:
+
+    python -m benchmarks.overdue_scan --rows 100000 --legacy-rows 5000
+"""
+
+import argparse
+import time
+
+from benchmarks.common import (
+    benchmark_database,
+    count_queries,
+    print_table,
+    seed_overdue_borrowings,
+)
+
+
+def legacy_scan(limit):
+    """The pre-digest implementation: lazy FK loads and one message per row."""
+    from borrow.models import Borrowing
+    from borrow.notifications import enqueue_notification
+
+    for borrowing in Borrowing.objects.filter(actual_return_date__isnull=True)[:limit]:
+        enqueue_notification(
+            f"Borrowing overdue:\n"
+            f"Book: {borrowing.book.title}\n"
+            f"User: {borrowing.user.email}\n"
+            f"Expected Return Date: {borrowing.expected_return_date}"
+        )
+
+
+def run(func):
+    from django.db import connection
+
+    from borrow.models import Notification
+
+    Notification.objects.all().delete()
+    with count_queries(connection) as queries:
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+    return queries["count"], elapsed, Notification.objects.count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--legacy-rows", type=int, default=5_000)
+    parser.add_argument("--shard-size", type=int, default=25_000)
+    parser.add_argument("--newly-overdue", type=int, default=1_000)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        from borrow.tasks import check_overdue_borrowings
+
+        seed_overdue_borrowings(args.rows)
+        rows = []
+        queries, elapsed, messages = run(lambda: legacy_scan(args.legacy_rows))
+        rows.append(
+            (
+                f"per-row loop ({args.legacy_rows:,} rows)",
+                queries,
+                f"{elapsed:.2f}",
+                messages,
+            )
+        )
+        queries, elapsed, messages = run(check_overdue_borrowings)
+        rows.append(
+            (f"digest scan ({args.rows:,} rows)", queries, f"{elapsed:.2f}", messages)
+        )
+
+        from borrow.models import Borrowing
+
+        # As if these had fallen due since the last run
+        Borrowing.objects.filter(
+            pk__in=Borrowing.objects.order_by("?").values("pk")[: args.newly_overdue]
+        ).update(overdue_notified_at=None)
+        queries, elapsed, messages = run(check_overdue_borrowings)
+        rows.append(
+            (
+                f"digest scan again ({args.newly_overdue:,} newly overdue)",
+                queries,
+                f"{elapsed:.2f}",
+                messages,
+            )
+        )
+
+        from django.test import override_settings
+
+        from borrow.models import OverdueScanShard
+        from borrow.tasks import scan_overdue_borrowings
+
+        with override_settings(
+            CELERY_TASK_ALWAYS_EAGER=True, OVERDUE_SHARD_SIZE=args.shard_size
+        ):
+            queries, elapsed, messages = run(scan_overdue_borrowings.apply)
+        shards = OverdueScanShard.objects.count()
+        rows.append(
+            (
+                f"sharded scan ({args.rows:,} rows, {shards} shards)",
+                queries,
+                f"{elapsed:.2f}",
+                messages,
+            )
+        )
+        print_table(("implementation", "queries", "seconds", "messages"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Logins per second per core across password hasher settings.
+
+Each setting hashes a user's password and logs them in through
+``POST /api/user/token/`` from one thread, so the rate is per core. The
+second table runs concurrent async logins next to a coroutine that ticks
+every millisecond and reports the longest the event loop went without
+ticking, with the hashing on the loop (Django's ``acheck_password``) and
+in the hasher thread pool:
+
+    python -m benchmarks.password_hashing --logins 20
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import time
+
+from benchmarks.common import benchmark_database, create_user, print_table
+
+PBKDF2 = "user.hashers.PBKDF2PasswordHasher"
+SCRYPT = "user.hashers.ScryptPasswordHasher"
+ARGON2 = "user.hashers.Argon2PasswordHasher"
+
+SETTINGS = [
+    ("pbkdf2 (Django default)", PBKDF2, "pbkdf2", {"iterations": 870_000}),
+    ("pbkdf2", PBKDF2, "pbkdf2", {"iterations": 210_000}),
+    ("scrypt (default)", SCRYPT, "scrypt", {"work_factor": 2**14}),
+    ("scrypt", SCRYPT, "scrypt", {"work_factor": 2**13}),
+    ("scrypt", SCRYPT, "scrypt", {"work_factor": 2**12}),
+]
+if importlib.util.find_spec("argon2") is not None:
+    SETTINGS += [
+        ("argon2 (Django default)", ARGON2, "argon2", {}),
+        (
+            "argon2",
+            ARGON2,
+            "argon2",
+            {"time_cost": 2, "memory_cost": 19_456, "parallelism": 1},
+        ),
+    ]
+
+
+def hashers_for(first):
+    return [first, *(path for path in (SCRYPT, ARGON2, PBKDF2) if path != first)]
+
+
+def logins_per_second(client, email, logins):
+    started = time.perf_counter()
+    for _ in range(logins):
+        response = client.post(
+            "/api/user/token/", {"email": email, "password": "benchpass123"}
+        )
+        assert response.status_code == 200, response.status_code
+    return logins / (time.perf_counter() - started)
+
+
+async def loop_stall(check_password, user, logins):
+    """The longest gap between ticks in ms, and the logins per second."""
+    done = asyncio.Event()
+    longest = 0.0
+
+    async def tick():
+        nonlocal longest
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            longest = max(longest, now - last)
+            last = now
+
+    ticker = asyncio.create_task(tick())
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(check_password(user, "benchpass123") for _ in range(logins))
+    )
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ticker
+    assert all(results)
+    return longest * 1000, logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=20)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        from django.contrib.auth.base_user import AbstractBaseUser
+        from django.test import override_settings
+        from rest_framework.test import APIClient
+        from rest_framework.views import APIView
+
+        from user.models import User
+
+        APIView.throttle_classes = ()
+        client = APIClient()
+        rows = []
+        for index, (name, path, key, cost) in enumerate(SETTINGS):
+            with override_settings(
+                PASSWORD_HASHERS=hashers_for(path),
+                PASSWORD_HASHER_COST={key: cost},
+            ):
+                user = create_user(email=f"bench{index}@example.com")
+                started = time.perf_counter()
+                user.set_password("benchpass123")
+                hash_ms = (time.perf_counter() - started) * 1000
+                user.save(update_fields=["password"])
+                rate = logins_per_second(client, user.email, args.logins)
+            params = ", ".join(f"{k}={v}" for k, v in cost.items()) or "-"
+            rows.append((name, params, f"{hash_ms:.0f}", f"{rate:.1f}"))
+        print_table(("hasher", "cost", "hash ms", "logins/s per core"), rows)
+        print()
+
+        rows = []
+        with override_settings(PASSWORD_HASHERS=hashers_for(SCRYPT)):
+            user = create_user(email="async@example.com")
+            for name, check_password in (
+                ("on the event loop", AbstractBaseUser.acheck_password),
+                ("hasher thread pool", User.acheck_password),
+            ):
+                stall_ms, rate = asyncio.run(
+                    loop_stall(check_password, user, args.logins)
+                )
+                rows.append((name, f"{stall_ms:.0f}", f"{rate:.1f}"))
+        print_table(("async login hashing", "longest loop stall ms", "logins/s"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Serialization throughput of the list serializers, per 1k objects.
+
+Compares ``ModelSerializer(many=True)`` + ``JSONRenderer`` with the
+``values()`` path + ``FastJSONRenderer``. Rows are fetched once up front so
+only serialization and rendering are timed; both paths must produce the same
+bytes.
+
+    python -m benchmarks.serialization --objects 1000 --repeat 50
+"""
+
+import argparse
+from datetime import date, timedelta
+
+from benchmarks.common import (
+    benchmark_database,
+    measure,
+    print_table,
+    seed_books,
+    seed_users,
+    summarize,
+)
+
+
+def seed(count):
+    from book.models import Book
+    from borrow.models import Borrowing
+    from payment.models import Payment
+
+    seed_books(count)
+    book_ids = list(Book.objects.values_list("id", flat=True))
+    user_ids = seed_users(count)
+    today = date.today()
+    Borrowing.objects.bulk_create(
+        Borrowing(
+            user_id=user_id,
+            book_id=book_ids[i % len(book_ids)],
+            borrow_date=today - timedelta(days=10),
+            expected_return_date=today + timedelta(days=i % 14),
+            actual_return_date=today if i % 3 == 0 else None,
+        )
+        for i, user_id in enumerate(user_ids)
+    )
+    Payment.objects.bulk_create(
+        Payment(
+            borrowing_id=borrowing_id,
+            session_url=f"https://checkout.stripe.com/c/pay/cs_test_{borrowing_id}",
+            session_id=f"cs_test_{borrowing_id}",
+            money_to_pay="12.50",
+        )
+        for borrowing_id in Borrowing.objects.values_list("id", flat=True)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        from rest_framework.renderers import JSONRenderer
+
+        from book.models import Book
+        from book.serializers import BookSerializer
+        from borrow.models import Borrowing
+        from borrow.serializers import BorrowingListSerializer
+        from library_service.renderers import FastJSONRenderer
+        from library_service.values import values_serializer
+        from payment.models import Payment
+        from payment.serializers import PaymentSerializer
+
+        seed(args.objects)
+        cases = (
+            ("books", Book, BookSerializer),
+            ("borrowings", Borrowing, BorrowingListSerializer),
+            ("payments", Payment, PaymentSerializer),
+        )
+        per_1k = 1_000 / args.objects
+        rows = []
+        for name, model, serializer_class in cases:
+            instances = list(model.objects.order_by("id"))
+            compiled = values_serializer(serializer_class)
+            values = list(compiled.values(model.objects.order_by("id")))
+
+            def drf():
+                data = serializer_class(instances, many=True).data
+                return JSONRenderer().render(data)
+
+            def fast():
+                return FastJSONRenderer().render(compiled.many(values))
+
+            assert drf() == fast(), f"{name}: output differs"
+            baseline = summarize(measure(drf, args.repeat))
+            optimized = summarize(measure(fast, args.repeat))
+            for label, stats in (("ModelSerializer", baseline), ("values", optimized)):
+                rows.append(
+                    (
+                        name,
+                        label,
+                        f"{stats['p50'] * per_1k:.2f}",
+                        f"{1_000 * args.objects / stats['p50']:,.0f}",
+                        f"{baseline['p50'] / stats['p50']:.1f}x",
+                    )
+                )
+        print_table(
+            ("endpoint", "serializer", "ms / 1k objs", "objs / s", "speed-up"), rows
+        )
+
+
+if __name__ == "__main__":
+    main()
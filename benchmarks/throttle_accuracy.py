@@ -0,0 +1,106 @@
+"""N workers send requests for one user through a rate limit at the same time.
+
+Compares DRF's cache-backed ``UserRateThrottle`` with the sliding-window
+throttle. Both keep their state in the Redis configured by ``REDIS_CLIENT``
+(set ``REDIS_URL`` to use a real server), so the difference is only the
+read-modify-write of the history against the atomic script. ``--latency``
+adds a delay to every Redis round trip, as a server on the network does;
+without it the in-process fake rarely lets the race show:
+
+    python -m benchmarks.throttle_accuracy --workers 32 --latency 1
+"""
+
+import argparse
+import threading
+import time
+from types import SimpleNamespace
+
+from benchmarks.common import print_table, setup_django
+
+
+class SlowRedis:
+    """Proxy that waits ``latency`` seconds before every round trip."""
+
+    def __init__(self, client, latency):
+        self.client = client
+        self.latency = latency
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            time.sleep(self.latency)
+            return command(*args, **kwargs)
+
+        return call
+
+    def register_script(self, lua):
+        script = self.client.register_script(lua)
+
+        def call(keys=(), args=(), client=None):
+            time.sleep(self.latency)
+            return script(keys=keys, args=args)
+
+        return call
+
+
+def run(throttle_class, workers, requests):
+    request = SimpleNamespace(user=SimpleNamespace(is_authenticated=True, pk=1))
+    barrier = threading.Barrier(workers)
+    admitted = []
+
+    def worker():
+        barrier.wait()
+        admitted.append(
+            sum(throttle_class().allow_request(request, None) for _ in range(requests))
+        )
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(admitted), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0, help="ms per command")
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.throttling import UserRateThrottle
+
+    from library_service import redis_client
+    from library_service.throttling import UserSlidingWindowThrottle
+
+    client = redis_client.get_redis()
+    if args.latency:
+        redis_client._client = SlowRedis(client, args.latency / 1000)
+    rate = f"{args.limit}/hour"
+    rows = []
+    for name, base in (
+        ("cache read-modify-write", UserRateThrottle),
+        ("sliding window script", UserSlidingWindowThrottle),
+    ):
+        throttle_class = type(name, (base,), {"get_rate": lambda self: rate})
+        client.flushdb()
+        admitted, elapsed = run(throttle_class, args.workers, args.requests)
+        rows.append(
+            (
+                name,
+                args.limit,
+                admitted,
+                "yes" if admitted == args.limit else "NO",
+                f"{args.workers * args.requests / elapsed:,.0f}",
+            )
+        )
+    print_table(("throttle", "limit", "admitted", "exact", "checks/s"), rows)
+
+
+if __name__ == "__main__":
+    main()
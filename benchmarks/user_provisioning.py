@@ -0,0 +1,89 @@
+"""Users created per second by ``provision_users`` against one at a time.
+
+Writes a cohort CSV of emails and temporary passwords (a tenth of them
+already registered), creates a sample of users through ``create_user`` one
+by one, as registering them one POST at a time would, then provisions the
+whole file with each ``--workers`` count. The last column extrapolates the
+rate to a 50k cohort. Uses the configured hasher and cost:
+
+    python -m benchmarks.user_provisioning --users 50000 --workers 1 4 8
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import benchmark_database, print_table
+
+COHORT = 50_000
+
+
+def write_cohort(path, users):
+    with open(path, "w", newline="") as cohort:
+        cohort.write("email,password\n")
+        for i in range(users):
+            cohort.write(f"student{i}@example.edu,temp-{i:08d}\n")
+
+
+def row(path, users, elapsed):
+    rate = users / elapsed
+    return (
+        path,
+        f"{users:,}",
+        f"{elapsed:.1f}",
+        f"{rate:,.0f}",
+        f"{COHORT / rate / 60:,.1f}",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=COHORT)
+    parser.add_argument("--sample", type=int, default=100)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1]
+    )
+    args = parser.parse_args()
+
+    with benchmark_database(on_disk=True):
+        from django.conf import settings
+
+        from user.models import User
+        from user.provisioning import provision_users
+
+        settings.DEBUG = False
+        rows = []
+        started = time.perf_counter()
+        for i in range(args.sample):
+            User.objects.create_user(
+                email=f"single{i}@example.edu", password=f"temp-{i:08d}"
+            )
+        rows.append(row("create_user", args.sample, time.perf_counter() - started))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cohort.csv")
+            write_cohort(path, args.users)
+            for workers in args.workers:
+                User.objects.filter(email__startswith="student").delete()
+                with open(path, newline="") as cohort:
+                    # Some of the cohort registered on their own already
+                    provision_users(
+                        (line for i, line in enumerate(cohort) if i % 10 == 0),
+                        workers=workers,
+                    )
+                with open(path, newline="") as cohort:
+                    report = provision_users(cohort, workers=workers)
+                assert report["created"] + report["existing"] == args.users
+                rows.append(
+                    row(
+                        f"provision_users, {workers} workers",
+                        args.users,
+                        report["seconds"],
+                    )
+                )
+        print_table(("path", "rows", "seconds", "rows/s", "minutes for 50k"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Burst of signed Stripe webhook events against the ingestion pipeline.
+
+Workers post ``checkout.session.completed`` events, a share of them
+redelivered duplicates, then the Celery task applies the backlog. Reports
+acknowledgement latency and throughput, drain time, and checks that every
+payment was paid exactly once:
+
+    python -m benchmarks.webhook_load --events 5000 --workers 8 --duplicates 0.2
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from benchmarks.common import benchmark_database, print_table, summarize
+
+SECRET = "whsec_load_test"
+
+
+def seed_payments(count):
+    from datetime import date
+
+    from book.models import Book
+    from borrow.models import Borrowing
+    from payment.models import Payment
+    from user.models import User
+
+    user = User.objects.create_user(email="payer@example.com")
+    book = Book.objects.create(
+        title="Book", author="Author", cover="HARD", inventory=1, daily_fee="1.00"
+    )
+    borrowing = Borrowing.objects.create(
+        user=user, book=book, expected_return_date=date.today()
+    )
+    Payment.objects.bulk_create(
+        Payment(borrowing=borrowing, session_id=f"cs_load_{i}", money_to_pay=1)
+        for i in range(count)
+    )
+
+
+def build_events(count, duplicates, seed=7):
+    from library_service.testing import signed_stripe_event
+
+    rng = random.Random(seed)
+    unique = int(count * (1 - duplicates))
+    events = [
+        signed_stripe_event(
+            {
+                "id": f"evt_load_{i}",
+                "object": "event",
+                "type": "checkout.session.completed",
+                "data": {"object": {"id": f"cs_load_{i}"}},
+            },
+            SECRET,
+        )
+        for i in range(unique)
+    ]
+    events += [rng.choice(events) for _ in range(count - unique)]
+    rng.shuffle(events)
+    return unique, events
+
+
+def post_all(events, workers):
+    from django.db import OperationalError, connections
+    from django.test import Client
+
+    latencies, retries, statuses = [], [], []
+    barrier = threading.Barrier(workers)
+
+    def worker(chunk):
+        client = Client()
+        mine, busy, codes = [], 0, []
+        barrier.wait()
+        try:
+            for payload, signature in chunk:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        response = client.post(
+                            "/api/payments/webhooks/stripe/",
+                            payload,
+                            content_type="application/json",
+                            HTTP_STRIPE_SIGNATURE=signature,
+                        )
+                        break
+                    except OperationalError:
+                        busy += 1
+                mine.append((time.perf_counter() - started) * 1000)
+                codes.append(response.status_code)
+        finally:
+            connections.close_all()
+        latencies.extend(mine)
+        retries.append(busy)
+        statuses.extend(codes)
+
+    threads = [
+        threading.Thread(target=worker, args=(events[i::workers],))
+        for i in range(workers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(retries), statuses, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=5_000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--duplicates", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with benchmark_database(on_disk=True):
+        from django.test import override_settings
+
+        from payment.models import Payment, StripeEvent
+        from payment.tasks import process_stripe_events
+
+        unique, events = build_events(args.events, args.duplicates)
+        seed_payments(unique)
+
+        with override_settings(STRIPE_WEBHOOK_KEY=SECRET):
+            latencies, retries, statuses, elapsed = post_all(events, args.workers)
+            started = time.perf_counter()
+            drained = process_stripe_events.apply().get()
+            drain = time.perf_counter() - started
+
+        stats = summarize(latencies)
+        assert set(statuses) == {200}, set(statuses)
+        assert StripeEvent.objects.count() == unique
+        assert drained["payments"] == unique, drained
+        assert Payment.objects.filter(status="PAID").count() == unique
+        print_table(
+            ("metric", "value"),
+            [
+                ("events posted", f"{args.events:,}"),
+                ("unique events", f"{unique:,}"),
+                ("workers", args.workers),
+                ("ack p50 ms", f"{stats['p50']:.2f}"),
+                ("ack p99 ms", f"{stats['p99']:.2f}"),
+                ("ack throughput / min", f"{args.events / elapsed * 60:,.0f}"),
+                ("lock retries", retries),
+                ("drain ms", f"{drain * 1000:.0f}"),
+                ("payments paid", f"{drained['payments']:,}"),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    main()
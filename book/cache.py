@@ -0,0 +1,263 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from redis.exceptions import RedisError
+from rest_framework import status
+from rest_framework.response import Response
+
+from library_service.db.routers import primary_reads
+from library_service.redis_client import get_redis
+from library_service.renderers import FastJSONRenderer
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "catalog:version"
+
+DEFAULT_RESPONSE_CACHE = {
+    "BACKEND": "book.cache.RedisBackend",
+    "TIMEOUT": 300,
+}
+
+
+class LocMemLRUBackend:
+    """Per-process LRU bounded by both entry count and total payload bytes.
+
+    Only for a single process: the catalog version lives in the process
+    that bumps it, so other workers keep serving their entries until the
+    ``timeout`` they were set with runs out.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self._size -= len(value)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        if len(value) > self.max_bytes:
+            return
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+            self._entries[key] = (expires_at, value)
+            self._size += len(value)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+            self._size = 0
+
+
+class RedisBackend:
+    """Shared backend for any server speaking the Redis protocol.
+
+    Entries expire after ``TIMEOUT`` seconds; the version counter is bumped
+    with ``INCR`` so every worker observes invalidations atomically.
+    """
+
+    def __init__(self, url=None, prefix="books", client=None):
+        if client is None and url is not None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        # The Redis configured by REDIS_CLIENT unless told otherwise
+        self.client = client or get_redis()
+        self.prefix = prefix
+
+    def _key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def get(self, key):
+        return self.client.get(self._key(key))
+
+    def set(self, key, value, timeout=None):
+        self.client.set(self._key(key), value, ex=timeout)
+
+    def get_counter(self, key):
+        return int(self.client.get(self._key(key)) or 0)
+
+    def incr(self, key):
+        return self.client.incr(self._key(key))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self._key("*")))
+        if keys:
+            self.client.delete(*keys)
+
+
+class CatalogResponseCache:
+    """The versioned catalog responses in ``backend``.
+
+    Fails open like the throttles: while the backend's Redis is down,
+    ``version`` returns ``None``, lookups miss, stores and bumps do nothing,
+    and every error is logged.
+    """
+
+    def __init__(self, backend, timeout=None):
+        self.backend = backend
+        self.timeout = timeout
+
+    def version(self):
+        try:
+            return self.backend.get_counter(VERSION_KEY)
+        except RedisError as error:
+            logger.warning("Catalog cache unavailable: %s", error)
+            return None
+
+    def bump_version(self):
+        try:
+            return self.backend.incr(VERSION_KEY)
+        except RedisError as error:
+            logger.warning("Could not bump the catalog version: %s", error)
+            return None
+
+    def key_for(self, request, version):
+        digest = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+        return f"catalog:v{version}:{digest}"
+
+    def get(self, key):
+        try:
+            payload = self.backend.get(key)
+        except RedisError as error:
+            logger.warning("Catalog cache unavailable: %s", error)
+            return None
+        if payload is None:
+            return None
+        entry = json.loads(payload)
+        return entry["etag"], entry["data"]
+
+    def set(self, key, data):
+        body = FastJSONRenderer().render(data)
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        payload = json.dumps({"etag": etag, "data": json.loads(body)})
+        try:
+            self.backend.set(key, payload.encode(), timeout=self.timeout)
+        except RedisError as error:
+            logger.warning("Could not cache a catalog response: %s", error)
+        return etag
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        config = getattr(settings, "BOOK_RESPONSE_CACHE", DEFAULT_RESPONSE_CACHE)
+        backend_class = import_string(config["BACKEND"])
+        _response_cache = CatalogResponseCache(
+            backend_class(**config.get("OPTIONS", {})),
+            timeout=config.get("TIMEOUT"),
+        )
+    return _response_cache
+
+
+@receiver(setting_changed)
+def reset_response_cache(setting, **kwargs):
+    global _response_cache
+    if setting == "BOOK_RESPONSE_CACHE":
+        _response_cache = None
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response.
+
+    Bumps right away so this process stops serving the old data, and again
+    on commit so that a response cached from a read taken before the commit
+    can never outlive it. A bump while Redis is down is logged and skipped;
+    the write itself goes ahead.
+    """
+    cache = get_response_cache()
+    cache.bump_version()
+    transaction.on_commit(cache.bump_version)
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get("If-None-Match", "")
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class CatalogCacheMixin:
+    """Serve ``list``/``retrieve`` from the versioned catalog cache.
+
+    Cached entries are keyed by the catalog version, so any write to
+    ``Book`` makes every earlier entry unreachable. A miss is filled from
+    the primary even under ``ReplicaReadMixin``. Responses carry an
+    ``ETag`` and conditional requests are answered with 304.
+    """
+
+    def cached_response(self, request, produce):
+        cache = get_response_cache()
+        version = cache.version()
+        if version is None:
+            # The cache is down: serve straight from the database
+            return produce()
+        key = cache.key_for(request, version)
+        cached = cache.get(key)
+        if cached is not None:
+            etag, data = cached
+        else:
+            # A lagging replica would cache rows older than the version
+            # they are stored under, until the entry times out
+            with primary_reads():
+                response = produce()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            etag = cache.set(key, response.data)
+            data = response.data
+
+        if _etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        return Response(data, headers={"ETag": etag})
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request,
+            lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request,
+            lambda: super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs),
+        )
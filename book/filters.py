@@ -0,0 +1,74 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from book.models import Book
+from book.search import get_search_backend
+
+TRUE_VALUES = ("1", "true", "yes")
+FALSE_VALUES = ("0", "false", "no")
+
+DEFAULT_FEE_FACET_RANGES = (
+    ("0.00", "1.00"),
+    ("1.00", "2.00"),
+    ("2.00", "5.00"),
+    ("5.00", None),
+)
+
+
+def fee_facet_ranges():
+    ranges = getattr(settings, "BOOK_FEE_FACET_RANGES", DEFAULT_FEE_FACET_RANGES)
+    return [
+        (Decimal(low), Decimal(high) if high is not None else None)
+        for low, high in ranges
+    ]
+
+
+def _parse_decimal(name, value):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: "A valid number is required."})
+
+
+class BookSearchFilter(BaseFilterBackend):
+    """``?search=`` over title and author through the catalog search index."""
+
+    search_param = "search"
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "").strip()
+        if not query:
+            return queryset
+        return get_search_backend().filter(queryset, query)
+
+
+class BookCatalogFilter(BaseFilterBackend):
+    """Facet filters: ``cover``, ``in_stock``, ``min_fee`` and ``max_fee``."""
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        cover = params.get("cover")
+        if cover:
+            if cover not in Book.CoverChoices.values:
+                raise ValidationError({"cover": f'"{cover}" is not a valid choice.'})
+            queryset = queryset.filter(cover=cover)
+
+        in_stock = params.get("in_stock", "").lower()
+        if in_stock in TRUE_VALUES:
+            queryset = queryset.filter(inventory__gt=0)
+        elif in_stock in FALSE_VALUES:
+            queryset = queryset.filter(inventory=0)
+
+        if params.get("min_fee"):
+            queryset = queryset.filter(
+                daily_fee__gte=_parse_decimal("min_fee", params["min_fee"])
+            )
+        if params.get("max_fee"):
+            queryset = queryset.filter(
+                daily_fee__lt=_parse_decimal("max_fee", params["max_fee"])
+            )
+        return queryset
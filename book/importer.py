@@ -0,0 +1,178 @@
+"""Bulk catalog import from CSV or JSON Lines.
+
+Rows are read and validated one chunk at a time and each chunk is upserted
+with a single ``bulk_create(update_conflicts=True)`` on the natural key
+(title, author): a known book gets the imported cover, inventory and fee,
+an unknown one is created. Memory is bounded by the chunk size whatever
+the size of the file.
+
+Rows are checked by ``validate_row``, a plain function mirroring the model
+field constraints, instead of a ``BookSerializer`` per row. ``bulk_create``
+sends no signals, so the search index and catalog cache are invalidated
+once per chunk instead of once per book.
+"""
+
+import csv
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from book.cache import bump_catalog_version
+from book.models import Book
+
+CSV = "csv"
+JSONL = "jsonl"
+IMPORT_FORMATS = (CSV, JSONL)
+FIELDS = ("title", "author", "cover", "inventory", "daily_fee")
+UPDATE_FIELDS = ["cover", "inventory", "daily_fee"]
+
+_TEXT_MAX_LENGTH = Book._meta.get_field("title").max_length
+_FEE_LIMIT = Decimal(10) ** (
+    Book._meta.get_field("daily_fee").max_digits
+    - Book._meta.get_field("daily_fee").decimal_places
+)
+_CENT = Decimal("0.01")
+_COVERS = frozenset(Book.CoverChoices.values)
+
+
+class ImportFormatError(Exception):
+    """The file cannot be read as the requested format at all."""
+
+
+def _text(value):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("This field is required.")
+    value = value.strip()
+    if len(value) > _TEXT_MAX_LENGTH:
+        raise ValueError(
+            f"Ensure this field has no more than {_TEXT_MAX_LENGTH} characters."
+        )
+    return value
+
+
+def _cover(value):
+    cover = str(value or "").strip().upper()
+    if cover not in _COVERS:
+        raise ValueError(f'"{value}" is not a valid choice.')
+    return cover
+
+
+def _inventory(value):
+    try:
+        inventory = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("A valid integer is required.")
+    if inventory < 0:
+        raise ValueError("Ensure this value is greater than or equal to 0.")
+    return inventory
+
+
+def _daily_fee(value):
+    try:
+        fee = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError("A valid number is required.")
+    if not fee.is_finite() or fee < 0 or fee >= _FEE_LIMIT:
+        raise ValueError(f"Ensure this value is between 0 and {_FEE_LIMIT - _CENT}.")
+    if fee != fee.quantize(_CENT):
+        raise ValueError("Ensure that there are no more than 2 decimal places.")
+    return fee.quantize(_CENT)
+
+
+_VALIDATORS = {
+    "title": _text,
+    "author": _text,
+    "cover": _cover,
+    "inventory": _inventory,
+    "daily_fee": _daily_fee,
+}
+
+
+def validate_row(row):
+    """``(values, errors)`` for one input row; ``errors`` is empty if valid."""
+    values, errors = {}, {}
+    for field, validate in _VALIDATORS.items():
+        try:
+            values[field] = validate(row.get(field))
+        except ValueError as error:
+            errors[field] = str(error)
+    return values, errors
+
+
+def read_csv(stream):
+    """``(line, row)`` pairs from a text stream with a header row."""
+    reader = csv.DictReader(stream)
+    missing = set(FIELDS) - set(reader.fieldnames or ())
+    if missing:
+        raise ImportFormatError(f"Missing columns: {', '.join(sorted(missing))}.")
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(stream):
+    """``(line, row)`` pairs from a text stream of JSON objects."""
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError:
+            row = None
+        # Not an object: reported as a bad row, not a bad file
+        yield line, row if isinstance(row, dict) else {}
+
+
+READERS = {CSV: read_csv, JSONL: read_jsonl}
+EXTENSIONS = {".csv": CSV, ".jsonl": JSONL, ".ndjson": JSONL}
+
+
+def format_for(filename):
+    """The import format matching a file name's extension, or ``None``."""
+    _, extension = os.path.splitext(filename or "")
+    return EXTENSIONS.get(extension.lower())
+
+
+def _upsert(books):
+    with transaction.atomic():
+        Book.objects.bulk_create(
+            books,
+            update_conflicts=True,
+            unique_fields=["title", "author"],
+            update_fields=UPDATE_FIELDS,
+        )
+        bump_catalog_version()
+
+
+def import_books(stream, import_format, progress=None, batch_size=None, max_errors=100):
+    """Upsert the books in ``stream``; returns a report dict.
+
+    ``progress`` is called with the running report after every chunk. At
+    most ``max_errors`` rejected rows are listed, all are counted.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, "BOOK_IMPORT_BATCH_SIZE", 2000)
+    report = {"rows": 0, "imported": 0, "rejected": 0, "errors": []}
+    rows = READERS[import_format](stream)
+    while chunk := list(islice(rows, batch_size)):
+        # The last row for a title and author wins; one statement cannot
+        # update the same row twice
+        books = {}
+        for line, row in chunk:
+            values, errors = validate_row(row)
+            if errors:
+                report["rejected"] += 1
+                if len(report["errors"]) < max_errors:
+                    report["errors"].append({"line": line, "errors": errors})
+                continue
+            books[values["title"], values["author"]] = Book(**values)
+            report["imported"] += 1
+        if books:
+            _upsert(list(books.values()))
+        report["rows"] += len(chunk)
+        if progress is not None:
+            progress(report)
+    return report
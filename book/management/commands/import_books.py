@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from book.importer import IMPORT_FORMATS, ImportFormatError, format_for, import_books
+
+
+class Command(BaseCommand):
+    help = "Upsert books from a CSV or JSON Lines file, matching on title and author."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            dest="import_format",
+            choices=IMPORT_FORMATS,
+            help="Defaults to the one matching the file extension.",
+        )
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, path, import_format, batch_size, verbosity, **options):
+        import_format = import_format or format_for(path)
+        if import_format is None:
+            raise CommandError(
+                "Cannot tell the format from the file name; use --format."
+            )
+
+        def progress(report):
+            if verbosity >= 1:
+                self.stdout.write(
+                    f"{report['rows']} rows: {report['imported']} imported, "
+                    f"{report['rejected']} rejected"
+                )
+
+        try:
+            with open(path, encoding="utf-8-sig", newline="") as stream:
+                report = import_books(
+                    stream, import_format, progress=progress, batch_size=batch_size
+                )
+        except (OSError, ImportFormatError, UnicodeDecodeError) as error:
+            raise CommandError(error)
+
+        for error in report["errors"]:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        if report["rejected"] > len(report["errors"]):
+            self.stderr.write(
+                f"... and {report['rejected'] - len(report['errors'])} more rejected rows"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report['imported']} of {report['rows']} rows."
+            )
+        )
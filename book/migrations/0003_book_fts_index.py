@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from book.search import install_fts_index, uninstall_fts_index
+
+
+def install(apps, schema_editor):
+    install_fts_index(schema_editor)
+
+
+def uninstall(apps, schema_editor):
+    uninstall_fts_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0002_book_title_author_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.7 on 2026-10-18 21:07
+
+from django.db import migrations, models
+from django.db.models import Count
+
+from book.search import install_fts_index
+
+
+def check_duplicates(apps, schema_editor):
+    Book = apps.get_model("book", "Book")
+    duplicates = list(
+        Book.objects.values("title", "author")
+        .annotate(copies=Count("id"))
+        .filter(copies__gt=1)
+        .order_by("title", "author")[:10]
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Merge or rename books sharing a title and author before adding "
+            f"book_title_author_uniq, e.g. {duplicates}"
+        )
+
+
+def reinstall_fts_index(apps, schema_editor):
+    # Adding or removing the constraint remakes book_book on SQLite, which
+    # drops the triggers that keep the FTS table in step
+    install_fts_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0003_book_fts_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicates, reinstall_fts_index),
+        migrations.AddConstraint(
+            model_name="book",
+            constraint=models.UniqueConstraint(
+                fields=("title", "author"), name="book_title_author_uniq"
+            ),
+        ),
+        migrations.RunPython(reinstall_fts_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from book.search import install_trigram_index, uninstall_trigram_index
+
+
+def install(apps, schema_editor):
+    install_trigram_index(schema_editor)
+
+
+def uninstall(apps, schema_editor):
+    uninstall_trigram_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0004_book_title_author_uniq"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
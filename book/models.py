@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -13,5 +14,49 @@ class Book(models.Model):
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(max_digits=5, decimal_places=2)
 
+    class Meta:
+        constraints = [
+            # The natural key catalog imports upsert on
+            models.UniqueConstraint(
+                fields=["title", "author"], name="book_title_author_uniq"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["title", "id"], name="book_title_id_idx"),
+            models.Index(fields=["author", "id"], name="book_author_id_idx"),
+        ]
+
     def __str__(self):
         return self.title
+
+
+class BookImportJob(models.Model):
+    """A catalog file uploaded to ``/api/books/import/``.
+
+    ``book.tasks.run_import_job`` upserts it in Celery and keeps ``report``
+    current after every chunk. The file is kept in the default storage,
+    which the web and Celery workers must share, and deleted once the job
+    has run.
+    """
+
+    class StatusChoices(models.TextChoices):
+        PENDING = "PENDING", _("Pending")
+        RUNNING = "RUNNING", _("Running")
+        DONE = "DONE", _("Done")
+        FAILED = "FAILED", _("Failed")
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    status = models.CharField(
+        max_length=7, choices=StatusChoices.choices, default=StatusChoices.PENDING
+    )
+    import_format = models.CharField(max_length=5)
+    file = models.FileField(upload_to="book-imports/", blank=True)
+    report = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Book import job {self.pk} ({self.status})"
@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination
+
+
+class BookCursorPagination(CursorPagination):
+    """Keyset pagination for the catalog.
+
+    The cursor encodes the position of the last row of the page, so every
+    page is a bounded index range scan instead of an ``OFFSET`` that grows
+    with the catalog size.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = ("id",)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # "id" breaks ties between equal titles/authors so the order is total
+        if ordering[-1].lstrip("-") not in ("id", "pk"):
+            ordering += ("id",)
+        return ordering
@@ -0,0 +1,241 @@
+"""Catalog search over title and author, kept in the database.
+
+On SQLite two FTS5 tables follow ``book_book`` through triggers:
+``book_book_fts`` matches word prefixes and ``book_book_trigram`` (the
+trigram tokenizer, SQLite 3.34+) matches any substring of three or more
+characters. Other databases filter with ``icontains``, which on PostgreSQL
+is backed by ``pg_trgm`` GIN indexes. Every process reads the same index,
+and a match is joined as a subquery rather than a list of ids.
+
+SQLite drops triggers whenever a migration remakes ``book_book``, so any
+such migration must call ``install_fts_index`` and
+``install_trigram_index`` again afterwards.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "book_book_fts"
+TRIGRAM_TABLE = "book_book_trigram"
+
+
+def _triggers(table):
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON book_book BEGIN
+            INSERT INTO {table}(rowid, title, author)
+            VALUES (new.id, new.title, new.author);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON book_book BEGIN
+            INSERT INTO {table}({table}, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_au
+        AFTER UPDATE OF title, author ON book_book BEGIN
+            INSERT INTO {table}({table}, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO {table}(rowid, title, author)
+            VALUES (new.id, new.title, new.author);
+        END
+        """,
+    ]
+
+
+FTS_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, author,
+        content='book_book', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    *_triggers(FTS_TABLE),
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+TRIGRAM_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TRIGRAM_TABLE} USING fts5(
+        title, author,
+        content='book_book', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    *_triggers(TRIGRAM_TABLE),
+    f"INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}) VALUES ('rebuild')",
+]
+
+# Django's icontains on PostgreSQL is UPPER(column::text) LIKE UPPER(...)
+PG_TRIGRAM_SCHEMA = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS book_title_trgm_idx "
+    "ON book_book USING gin ((UPPER(title::text)) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS book_author_trgm_idx "
+    "ON book_book USING gin ((UPPER(author::text)) gin_trgm_ops)",
+]
+
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(query):
+    return [term.casefold() for term in TERM_RE.findall(query or "")]
+
+
+def fts5_available(conn):
+    if conn.vendor != "sqlite":
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any("FTS5" in row[0] for row in cursor.fetchall())
+
+
+def trigram_tokenizer_available(conn):
+    return fts5_available(conn) and conn.Database.sqlite_version_info >= (3, 34)
+
+
+def install_fts_index(schema_editor):
+    """Create (or recreate) the FTS5 table and the triggers that feed it."""
+    if not fts5_available(schema_editor.connection):
+        return
+    for statement in FTS_SCHEMA:
+        schema_editor.execute(statement)
+
+
+def uninstall_fts_index(schema_editor, table=FTS_TABLE):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for suffix in ("ai", "ad", "au"):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_{suffix}")
+    schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def install_trigram_index(schema_editor):
+    """The trigram FTS5 table on SQLite, ``pg_trgm`` indexes on PostgreSQL."""
+    conn = schema_editor.connection
+    if conn.vendor == "postgresql":
+        statements = PG_TRIGRAM_SCHEMA
+    elif trigram_tokenizer_available(conn):
+        statements = TRIGRAM_SCHEMA
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def uninstall_trigram_index(schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for index in ("book_title_trgm_idx", "book_author_trgm_idx"):
+            schema_editor.execute(f"DROP INDEX IF EXISTS {index}")
+    else:
+        uninstall_fts_index(schema_editor, TRIGRAM_TABLE)
+
+
+class SQLiteFTSBackend:
+    """Matches against the FTS5 table maintained by triggers on ``book_book``.
+
+    Every term is a prefix query, so ``"gat gre"`` finds "The Great Gatsby".
+    """
+
+    name = "fts5"
+
+    def filter(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        match = " ".join(f'"{term}"*' for term in terms)
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+            )
+        )
+
+
+class SQLiteTrigramBackend:
+    """Substring matches against the trigram FTS5 table.
+
+    Terms of three or more characters are matched through the index, so
+    ``"olkie"`` finds Tolkien; shorter terms fall back to ``LIKE`` over the
+    same table.
+    """
+
+    name = "trigram"
+
+    def filter(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        conditions, params = [], []
+        indexed = [term for term in terms if len(term) >= 3]
+        if indexed:
+            conditions.append(f"{TRIGRAM_TABLE} MATCH %s")
+            params.append(" ".join(f'"{term}"' for term in indexed))
+        for term in terms:
+            if len(term) < 3:
+                conditions.append(
+                    "(title LIKE %s ESCAPE '\\' OR author LIKE %s ESCAPE '\\')"
+                )
+                escaped = re.sub(r"([\\%_])", r"\\\1", term)
+                pattern = f"%{escaped}%"
+                params += [pattern, pattern]
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {TRIGRAM_TABLE} WHERE {' AND '.join(conditions)}",
+                params,
+            )
+        )
+
+
+class ContainsBackend:
+    """``icontains`` on title or author for each term.
+
+    For databases without FTS5; on PostgreSQL the ``pg_trgm`` indexes
+    created by ``install_trigram_index`` serve these filters.
+    """
+
+    name = "contains"
+
+    def filter(self, queryset, query):
+        for term in search_terms(query):
+            queryset = queryset.filter(
+                Q(title__icontains=term) | Q(author__icontains=term)
+            )
+        return queryset
+
+
+fts_backend = SQLiteFTSBackend()
+trigram_backend = SQLiteTrigramBackend()
+contains_backend = ContainsBackend()
+
+_tables = {}
+
+
+def _table_exists(table):
+    key = (connection.alias, table)
+    if key not in _tables:
+        _tables[key] = table in connection.introspection.table_names()
+    return _tables[key]
+
+
+def get_search_backend():
+    """Return the configured search backend.
+
+    ``BOOK_SEARCH_BACKEND`` may pick ``"fts5"``, ``"trigram"`` or
+    ``"contains"``; by default the word-prefix FTS5 table is used whenever
+    it exists, then the trigram table.
+    """
+    preferred = getattr(settings, "BOOK_SEARCH_BACKEND", None)
+    if preferred == "contains":
+        return contains_backend
+    if preferred != "trigram" and _table_exists(FTS_TABLE):
+        return fts_backend
+    if preferred != "fts5" and _table_exists(TRIGRAM_TABLE):
+        return trigram_backend
+    return contains_backend
@@ -1,9 +1,40 @@
 from rest_framework import serializers
 
-from book.models import Book
+from book.importer import IMPORT_FORMATS, format_for
+from book.models import Book, BookImportJob
 
 
 class BookSerializer(serializers.ModelSerializer):
     class Meta:
         model = Book
         fields = ("id", "title", "author", "cover", "inventory", "daily_fee")
+
+
+class BookImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    import_format = serializers.ChoiceField(choices=IMPORT_FORMATS, required=False)
+
+    def validate(self, attrs):
+        if "import_format" not in attrs:
+            attrs["import_format"] = format_for(attrs["file"].name)
+            if attrs["import_format"] is None:
+                raise serializers.ValidationError(
+                    {"import_format": "Cannot tell from the file name; set it."}
+                )
+        return attrs
+
+
+class BookImportJobSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name="books:book-import-job")
+
+    class Meta:
+        model = BookImportJob
+        fields = (
+            "id",
+            "url",
+            "status",
+            "import_format",
+            "report",
+            "created_at",
+            "finished_at",
+        )
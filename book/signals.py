@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from book.cache import bump_catalog_version
+from book.models import Book
+
+
+@receiver(post_save, sender=Book)
+def invalidate_catalog_on_save(sender, instance, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_delete, sender=Book)
+def invalidate_catalog_on_delete(sender, instance, **kwargs):
+    bump_catalog_version()
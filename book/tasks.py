@@ -0,0 +1,41 @@
+import io
+
+from celery import shared_task
+from django.utils import timezone
+
+from book.importer import ImportFormatError, import_books
+from book.models import BookImportJob
+
+
+@shared_task
+def run_import_job(job_id):
+    """Upsert the books of a ``BookImportJob``; returns its report."""
+    started = BookImportJob.objects.filter(
+        pk=job_id, status=BookImportJob.StatusChoices.PENDING
+    ).update(status=BookImportJob.StatusChoices.RUNNING, started_at=timezone.now())
+    if not started:
+        # Delivered again after it ran
+        return None
+    job = BookImportJob.objects.get(pk=job_id)
+
+    def progress(report):
+        job.report = dict(report)
+        BookImportJob.objects.filter(pk=job_id).update(report=job.report)
+
+    try:
+        with io.TextIOWrapper(
+            job.file.open("rb"), encoding="utf-8-sig", newline=""
+        ) as stream:
+            job.report = import_books(stream, job.import_format, progress=progress)
+        job.status = BookImportJob.StatusChoices.DONE
+    except Exception as error:
+        # Chunks upserted before the error stay; importing again is harmless
+        job.report = {**job.report, "error": str(error)}
+        job.status = BookImportJob.StatusChoices.FAILED
+        if not isinstance(error, (ImportFormatError, UnicodeDecodeError)):
+            raise
+    finally:
+        job.file.delete(save=False)
+        job.finished_at = timezone.now()
+        job.save(update_fields=["report", "status", "file", "finished_at"])
+    return job.report
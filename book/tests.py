@@ -1,5 +1,26 @@
-from django.test import TestCase
-from book.models import Book
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from book.cache import LocMemLRUBackend, RedisBackend, get_response_cache
+from book.importer import import_books, validate_row
+from book.models import Book, BookImportJob
+from book.pagination import BookCursorPagination
+from book.search import get_search_backend
+from borrow.models import Borrowing
 from user.models import User
 from django.core.exceptions import ValidationError
 
@@ -59,3 +80,530 @@ class BookModelTest(TestCase):
         self.book.daily_fee = 2.00
         self.book.save()
         self.assertEqual(self.book.daily_fee, 2.00)
+
+
+class BookListPaginationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="reader@example.com", password="password123"
+        )
+        self.client.force_authenticate(user=self.user)
+        Book.objects.bulk_create(
+            Book(
+                title=f"Book {i:03d}",
+                author=f"Author {i % 7}",
+                cover=Book.CoverChoices.SOFT,
+                inventory=1,
+                daily_fee=1.00,
+            )
+            for i in range(120)
+        )
+
+    def test_list_is_paginated_by_cursor(self):
+        response = self.client.get(reverse("books:book-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 50)
+        self.assertIsNotNone(response.data["next"])
+        self.assertIn("cursor=", response.data["next"])
+
+    def test_following_cursors_visits_every_book_once(self):
+        url = reverse("books:book-list")
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen.extend(book["id"] for book in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(
+            seen, list(Book.objects.order_by("id").values_list("id", flat=True))
+        )
+
+    def test_ordering_by_author_breaks_ties_by_id(self):
+        url = reverse("books:book-list") + "?ordering=author&page_size=40"
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen.extend(
+                (book["author"], book["id"]) for book in response.data["results"]
+            )
+            url = response.data["next"]
+        self.assertEqual(len(seen), 120)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_page_size_is_capped(self):
+        with patch.object(BookCursorPagination, "max_page_size", 100):
+            response = self.client.get(
+                reverse("books:book-list"), {"page_size": 10_000}
+            )
+        self.assertEqual(len(response.data["results"]), 100)
+
+
+class BookSearchTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="reader@example.com", password="password123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.gatsby = Book.objects.create(
+            title="The Great Gatsby",
+            author="F. Scott Fitzgerald",
+            cover=Book.CoverChoices.HARD,
+            inventory=3,
+            daily_fee=1.50,
+        )
+        self.dune = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            cover=Book.CoverChoices.SOFT,
+            inventory=0,
+            daily_fee=0.75,
+        )
+        self.hobbit = Book.objects.create(
+            title="The Hobbit",
+            author="J. R. R. Tolkien",
+            cover=Book.CoverChoices.SOFT,
+            inventory=7,
+            daily_fee=6.00,
+        )
+        self.url = reverse("books:book-list")
+
+    def ids(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {book["id"] for book in response.data["results"]}
+
+    def test_search_title_and_author(self):
+        self.assertEqual(self.ids({"search": "great gats"}), {self.gatsby.id})
+        self.assertEqual(self.ids({"search": "herbert"}), {self.dune.id})
+        self.assertEqual(self.ids({"search": "the"}), {self.gatsby.id, self.hobbit.id})
+        self.assertEqual(self.ids({"search": "nothing"}), set())
+
+    def test_search_follows_updates(self):
+        self.dune.title = "Dune Messiah"
+        self.dune.save()
+        self.assertEqual(self.ids({"search": "messiah"}), {self.dune.id})
+        self.dune.delete()
+        self.assertEqual(self.ids({"search": "herbert"}), set())
+
+    @override_settings(BOOK_SEARCH_BACKEND="trigram")
+    def test_trigram_fallback(self):
+        self.assertEqual(get_search_backend().name, "trigram")
+        self.assertEqual(self.ids({"search": "great gats"}), {self.gatsby.id})
+        self.assertEqual(self.ids({"search": "olkie"}), {self.hobbit.id})
+        self.assertEqual(self.ids({"search": "he hob"}), {self.hobbit.id})
+        self.assertEqual(self.ids({"search": "the"}), {self.gatsby.id, self.hobbit.id})
+
+        self.dune.title = "Dune Messiah"
+        self.dune.save()
+        self.assertEqual(self.ids({"search": "messiah"}), {self.dune.id})
+        self.dune.delete()
+        self.assertEqual(self.ids({"search": "herbert"}), set())
+
+    def test_search_joins_the_index(self):
+        for backend in ("fts5", "trigram"):
+            with self.subTest(backend=backend), override_settings(
+                BOOK_SEARCH_BACKEND=backend
+            ):
+                queryset = get_search_backend().filter(Book.objects.all(), "the")
+                self.assertIn("SELECT rowid FROM", str(queryset.query))
+
+    @override_settings(BOOK_SEARCH_BACKEND="contains")
+    def test_contains_backend(self):
+        self.assertEqual(get_search_backend().name, "contains")
+        self.assertEqual(self.ids({"search": "olkie"}), {self.hobbit.id})
+        self.assertEqual(self.ids({"search": "the"}), {self.gatsby.id, self.hobbit.id})
+
+    def test_catalog_filters(self):
+        self.assertEqual(
+            self.ids({"in_stock": "true"}), {self.gatsby.id, self.hobbit.id}
+        )
+        self.assertEqual(self.ids({"cover": "SOFT"}), {self.dune.id, self.hobbit.id})
+        self.assertEqual(self.ids({"min_fee": "1", "max_fee": "5"}), {self.gatsby.id})
+        self.assertEqual(
+            self.ids({"search": "the", "cover": "SOFT", "in_stock": "1"}),
+            {self.hobbit.id},
+        )
+
+    def test_invalid_filter_values(self):
+        response = self.client.get(self.url, {"cover": "LEATHER"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {"min_fee": "cheap"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_facets(self):
+        response = self.client.get(reverse("books:book-facets"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(response.data["in_stock"], 2)
+        self.assertEqual(response.data["cover"], {"HARD": 1, "SOFT": 2})
+        self.assertEqual(
+            [bucket["count"] for bucket in response.data["daily_fee"]], [1, 1, 0, 1]
+        )
+
+    def test_facets_respect_search(self):
+        response = self.client.get(reverse("books:book-facets"), {"search": "the"})
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(response.data["cover"], {"HARD": 1, "SOFT": 1})
+
+
+class FakeRedisClient:
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+
+    def incr(self, key):
+        self.store[key] = int(self.store.get(key, 0)) + 1
+        return self.store[key]
+
+    def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        return [key for key in self.store if key.startswith(prefix)]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+
+class LocMemLRUBackendTest(TestCase):
+    def test_evicts_least_recently_used_entry(self):
+        backend = LocMemLRUBackend(max_entries=2)
+        backend.set("a", b"1")
+        backend.set("b", b"2")
+        backend.get("a")
+        backend.set("c", b"3")
+        self.assertEqual(backend.get("a"), b"1")
+        self.assertIsNone(backend.get("b"))
+        self.assertEqual(backend.get("c"), b"3")
+
+    def test_evicts_to_stay_within_byte_budget(self):
+        backend = LocMemLRUBackend(max_entries=100, max_bytes=10)
+        backend.set("a", b"12345")
+        backend.set("b", b"12345")
+        backend.set("c", b"123")
+        self.assertIsNone(backend.get("a"))
+        self.assertEqual(backend.get("b"), b"12345")
+        backend.set("huge", b"x" * 11)
+        self.assertIsNone(backend.get("huge"))
+
+    def test_entries_expire_after_timeout(self):
+        backend = LocMemLRUBackend()
+        with patch("book.cache.time.monotonic", return_value=100.0):
+            backend.set("a", b"1", timeout=5)
+            backend.set("b", b"2")
+        with patch("book.cache.time.monotonic", return_value=105.0):
+            self.assertIsNone(backend.get("a"))
+            self.assertEqual(backend.get("b"), b"2")
+        self.assertEqual(backend._size, 1)
+
+    def test_redis_backend(self):
+        client = FakeRedisClient()
+        backend = RedisBackend(client=client)
+        backend.set("k", b"v", timeout=5)
+        self.assertEqual(client.store["books:k"], b"v")
+        self.assertEqual(backend.get("k"), b"v")
+        self.assertEqual(backend.get_counter("version"), 0)
+        self.assertEqual(backend.incr("version"), 1)
+        backend.clear()
+        self.assertEqual(client.store, {})
+
+
+class BookResponseCacheTest(APITestCase):
+    def setUp(self):
+        get_response_cache().backend.clear()
+        self.user = User.objects.create_user(
+            email="reader@example.com", password="password123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Cached Book",
+            author="Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=2,
+            daily_fee=1.00,
+        )
+        self.list_url = reverse("books:book-list")
+        self.detail_url = reverse("books:book-detail", args=[self.book.id])
+
+    def test_repeated_reads_skip_the_database(self):
+        first = self.client.get(self.list_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.list_url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first["ETag"], second["ETag"])
+
+        self.client.get(self.detail_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url)
+        self.assertEqual(response.data["title"], "Cached Book")
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+    def test_book_write_invalidates(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = "Renamed"
+            self.book.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["title"], "Renamed")
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_book_delete_invalidates(self):
+        self.client.get(self.list_url)
+        self.book.delete()
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data["results"], [])
+
+    def test_redis_outage_serves_uncached(self):
+        client = get_response_cache().backend.client
+        down = {"side_effect": RedisConnectionError("Connection refused")}
+        with patch.object(client, "get", **down), patch.object(
+            client, "set", **down
+        ), patch.object(client, "incr", **down), self.assertLogs(
+            "book.cache", "WARNING"
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                Book.objects.create(
+                    title="Written During Outage",
+                    author="Author",
+                    cover=Book.CoverChoices.SOFT,
+                    inventory=1,
+                    daily_fee=1.00,
+                )
+            response = self.client.get(self.list_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data["results"]), 2)
+            response = self.client.get(self.detail_url)
+            self.assertEqual(response.data["title"], "Cached Book")
+
+    @patch("borrow.views.request_payment_session")
+    def test_borrow_and_return_invalidate_inventory(self, mock_payment_session):
+        self.assertEqual(self.client.get(self.detail_url).data["inventory"], 2)
+
+        response = self.client.post(
+            reverse("borrowing:borrowing-list"),
+            {
+                "book": self.book.id,
+                "expected_return_date": date.today() + timedelta(days=3),
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.get(self.detail_url).data["inventory"], 1)
+
+        borrowing = Borrowing.objects.get(user=self.user)
+        response = self.client.post(
+            reverse("borrowing:borrowing-return-book", args=[borrowing.id])
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.detail_url).data["inventory"], 2)
+
+
+class BookImportTest(APITestCase):
+    CSV = (
+        "title,author,cover,inventory,daily_fee\n"
+        "Dune,Frank Herbert,hard,3,1.50\n"
+        "Emma,Jane Austen,SOFT,2,0.75\n"
+        ",Nobody,HARD,-1,abc\n"
+        "Dune,Frank Herbert,SOFT,7,1.25\n"
+    )
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@example.com", password="password123", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+        self.existing = Book.objects.create(
+            title="Emma",
+            author="Jane Austen",
+            cover=Book.CoverChoices.HARD,
+            inventory=1,
+            daily_fee="2.00",
+        )
+        self.url = reverse("books:book-import-books")
+
+    def catalog(self):
+        return {
+            (book.title, book.author): (book.cover, book.inventory, book.daily_fee)
+            for book in Book.objects.all()
+        }
+
+    def test_title_and_author_are_unique(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Book.objects.create(
+                title="Emma",
+                author="Jane Austen",
+                cover=Book.CoverChoices.SOFT,
+                inventory=1,
+                daily_fee="1.00",
+            )
+        response = self.client.post(
+            reverse("books:book-list"),
+            {
+                "title": "Emma",
+                "author": "Jane Austen",
+                "cover": "SOFT",
+                "inventory": 1,
+                "daily_fee": "1.00",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_validate_row(self):
+        values, errors = validate_row(
+            {
+                "title": " Dune ",
+                "author": "Frank Herbert",
+                "cover": "soft",
+                "inventory": "4",
+                "daily_fee": "1.5",
+            }
+        )
+        self.assertEqual(errors, {})
+        self.assertEqual(values["title"], "Dune")
+        self.assertEqual(values["cover"], "SOFT")
+        self.assertEqual(values["daily_fee"], Decimal("1.50"))
+
+        _, errors = validate_row(
+            {
+                "title": "x" * 256,
+                "cover": "paper",
+                "inventory": "1.5",
+                "daily_fee": "1000",
+            }
+        )
+        self.assertEqual(
+            set(errors), {"title", "author", "cover", "inventory", "daily_fee"}
+        )
+        _, errors = validate_row({"daily_fee": "1.005"})
+        self.assertIn("decimal places", errors["daily_fee"])
+
+    def test_upserts_in_chunks_and_reports(self):
+        progress = []
+        with patch("book.importer.bump_catalog_version") as bump:
+            report = import_books(
+                StringIO(self.CSV),
+                "csv",
+                progress=lambda report: progress.append(report["rows"]),
+                batch_size=2,
+            )
+        self.assertEqual(progress, [2, 4])
+        self.assertEqual(bump.call_count, 2)
+        self.assertEqual(report["rows"], 4)
+        self.assertEqual(report["imported"], 3)
+        self.assertEqual(report["rejected"], 1)
+        self.assertEqual(report["errors"][0]["line"], 4)
+        self.assertEqual(
+            set(report["errors"][0]["errors"]),
+            {"title", "inventory", "daily_fee"},
+        )
+        self.assertEqual(
+            self.catalog(),
+            {
+                ("Dune", "Frank Herbert"): ("SOFT", 7, Decimal("1.25")),
+                ("Emma", "Jane Austen"): ("SOFT", 2, Decimal("0.75")),
+            },
+        )
+        self.assertTrue(Book.objects.filter(pk=self.existing.pk).exists())
+
+    def test_import_refreshes_search(self):
+        self.assertEqual(
+            self.client.get(reverse("books:book-list"), {"search": "dune"}).data[
+                "results"
+            ],
+            [],
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            import_books(StringIO(self.CSV), "csv")
+        for backend in ("fts5", "trigram", "contains"):
+            with self.subTest(backend=backend), override_settings(
+                BOOK_SEARCH_BACKEND=backend
+            ):
+                response = self.client.get(
+                    reverse("books:book-list"), {"search": "dune"}
+                )
+                self.assertEqual(
+                    [book["title"] for book in response.data["results"]], ["Dune"]
+                )
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0, CELERY_TASK_ALWAYS_EAGER=True)
+    def test_endpoint(self):
+        lines = [
+            json.dumps(
+                {
+                    "title": "Dune",
+                    "author": "Frank Herbert",
+                    "cover": "HARD",
+                    "inventory": 3,
+                    "daily_fee": "1.50",
+                }
+            ),
+            "not json",
+        ]
+        upload = SimpleUploadedFile("feed.jsonl", "\n".join(lines).encode())
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            MEDIA_ROOT=media
+        ):
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post(
+                    self.url, {"file": upload}, format="multipart"
+                )
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(
+                response.data["status"], BookImportJob.StatusChoices.PENDING
+            )
+            self.assertEqual(response["Location"], response.data["url"])
+            # Stored for the worker, not imported within the request
+            self.assertFalse(Book.objects.filter(title="Dune").exists())
+            self.assertTrue(BookImportJob.objects.get().file)
+
+            for callback in callbacks:
+                callback()
+            response = self.client.get(response.data["url"])
+            self.assertEqual(response.data["status"], BookImportJob.StatusChoices.DONE)
+            self.assertEqual(response.data["report"]["imported"], 1)
+            self.assertEqual(response.data["report"]["errors"][0]["line"], 2)
+            self.assertTrue(Book.objects.filter(title="Dune").exists())
+            # The upload is deleted once imported
+            self.assertFalse(BookImportJob.objects.get().file)
+            self.assertEqual(os.listdir(os.path.join(media, "book-imports")), [])
+
+    def test_endpoint_rejects_bad_files(self):
+        for name, content, field in (
+            ("feed.xml", b"<books/>", "import_format"),
+            ("feed.csv", b"title,author\nDune,Frank Herbert\n", "file"),
+        ):
+            upload = SimpleUploadedFile(name, content)
+            response = self.client.post(self.url, {"file": upload}, format="multipart")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(field, response.data)
+
+    def test_endpoint_is_staff_only(self):
+        self.client.force_authenticate(
+            User.objects.create_user(email="reader@example.com")
+        )
+        upload = SimpleUploadedFile("feed.csv", self.CSV.encode())
+        response = self.client.post(self.url, {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command(self):
+        out, err = StringIO(), StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "feed.csv")
+            with open(path, "w") as feed:
+                feed.write(self.CSV)
+            call_command(
+                "import_books", path, "--batch-size", "3", stdout=out, stderr=err
+            )
+        self.assertIn("3 rows: 2 imported, 1 rejected", out.getvalue())
+        self.assertIn("Imported 3 of 4 rows.", out.getvalue())
+        self.assertIn("Line 4:", err.getvalue())
+        self.assertEqual(Book.objects.count(), 2)
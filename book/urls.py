@@ -1,10 +1,13 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from book.views import BookViewSet
+from book.views import BookImportJobView, BookViewSet
 
 app_name = "book"
 
 router = routers.DefaultRouter()
 router.register("", BookViewSet, basename="book")
-urlpatterns = [path("", include(router.urls))]
+urlpatterns = [
+    path("import/<int:pk>/", BookImportJobView.as_view(), name="book-import-job"),
+    path("", include(router.urls)),
+]
@@ -1,11 +1,129 @@
-from rest_framework import viewsets
+import io
 
-from book.models import Book
+from django.db import transaction
+from django.db.models import Count, Q
+from rest_framework import generics, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from book.cache import CatalogCacheMixin
+from book.filters import BookCatalogFilter, BookSearchFilter, fee_facet_ranges
+from book.importer import READERS, ImportFormatError
+from book.models import Book, BookImportJob
+from book.pagination import BookCursorPagination
 from book.permisions import IsAdminOrIfAuthenticatedReadOnly
-from book.serializers import BookSerializer
+from book.serializers import (
+    BookImportJobSerializer,
+    BookImportSerializer,
+    BookSerializer,
+)
+from book.tasks import run_import_job
+from library_service.db.routers import ReplicaReadMixin
+from library_service.values import ValuesListMixin
+from user.authentication import ClaimsJWTAuthentication
 
 
-class BookViewSet(viewsets.ModelViewSet):
-    queryset = Book.objects
+class BookViewSet(
+    ReplicaReadMixin, CatalogCacheMixin, ValuesListMixin, viewsets.ModelViewSet
+):
+    queryset = Book.objects.all()
     serializer_class = BookSerializer
+    # Only is_authenticated and is_staff are needed: no user query
+    authentication_classes = (ClaimsJWTAuthentication,)
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
+    throttle_scope = "books"
+    pagination_class = BookCursorPagination
+    filter_backends = (BookSearchFilter, BookCatalogFilter, OrderingFilter)
+    ordering_fields = ("id", "title", "author")
+    ordering = ("id",)
+
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        """Counts by cover, daily fee range and stock for the filtered catalog.
+
+        All facets are computed by a single aggregate query.
+        """
+        return self.cached_response(request, self._facets)
+
+    def _facets(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        ranges = fee_facet_ranges()
+
+        aggregates = {
+            "total": Count("id"),
+            "in_stock": Count("id", filter=Q(inventory__gt=0)),
+        }
+        for cover in Book.CoverChoices.values:
+            aggregates[f"cover_{cover}"] = Count("id", filter=Q(cover=cover))
+        for index, (low, high) in enumerate(ranges):
+            condition = Q(daily_fee__gte=low)
+            if high is not None:
+                condition &= Q(daily_fee__lt=high)
+            aggregates[f"fee_{index}"] = Count("id", filter=condition)
+        counts = queryset.order_by().aggregate(**aggregates)
+
+        return Response(
+            {
+                "count": counts["total"],
+                "in_stock": counts["in_stock"],
+                "cover": {
+                    cover: counts[f"cover_{cover}"]
+                    for cover in Book.CoverChoices.values
+                },
+                "daily_fee": [
+                    {
+                        "min": f"{low:.2f}",
+                        "max": f"{high:.2f}" if high is not None else None,
+                        "count": counts[f"fee_{index}"],
+                    }
+                    for index, (low, high) in enumerate(ranges)
+                ],
+            }
+        )
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[IsAdminUser],
+        parser_classes=[MultiPartParser],
+    )
+    def import_books(self, request):
+        """Queue an uploaded CSV or JSON Lines file for import (staff only).
+
+        Books are matched on title and author. The file is imported in
+        Celery; poll the returned ``url`` for the report of imported and
+        rejected rows.
+        """
+        serializer = BookImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["file"]
+        import_format = serializer.validated_data["import_format"]
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        try:
+            # Checks the header only; the rows are read by the task
+            next(READERS[import_format](stream), None)
+        except (ImportFormatError, UnicodeDecodeError) as error:
+            raise ValidationError({"file": str(error)})
+        finally:
+            stream.detach()
+        upload.seek(0)
+        with transaction.atomic():
+            job = BookImportJob.objects.create(
+                created_by=request.user, import_format=import_format, file=upload
+            )
+            transaction.on_commit(lambda: run_import_job.delay(job.pk))
+        data = BookImportJobSerializer(job, context={"request": request}).data
+        return Response(
+            data, status=status.HTTP_202_ACCEPTED, headers={"Location": data["url"]}
+        )
+
+
+class BookImportJobView(generics.RetrieveAPIView):
+    queryset = BookImportJob.objects.all()
+    serializer_class = BookImportJobSerializer
+    permission_classes = (IsAdminUser,)
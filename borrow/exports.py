@@ -0,0 +1,37 @@
+"""Borrowing export: columns and filters shared by the endpoint and command."""
+
+from django.utils import timezone
+
+from borrow.models import ACTIVE, Borrowing
+
+BORROWING_EXPORT_COLUMNS = (
+    ("id", "id"),
+    ("user_id", "user_id"),
+    ("user_email", "user__email"),
+    ("book_id", "book_id"),
+    ("book_title", "book__title"),
+    ("borrow_date", "borrow_date"),
+    ("expected_return_date", "expected_return_date"),
+    ("actual_return_date", "actual_return_date"),
+)
+BORROWING_EXPORT_STATUSES = ("active", "returned", "overdue")
+
+
+def borrowings_for_export(date_from=None, date_to=None, book=None, status=None):
+    """Borrowings made between ``date_from`` and ``date_to``, both included."""
+    queryset = Borrowing.objects.order_by("id")
+    if date_from is not None:
+        queryset = queryset.filter(borrow_date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(borrow_date__lte=date_to)
+    if book is not None:
+        queryset = queryset.filter(book_id=book)
+    if status == "active":
+        queryset = queryset.filter(ACTIVE)
+    elif status == "returned":
+        queryset = queryset.exclude(ACTIVE)
+    elif status == "overdue":
+        queryset = queryset.filter(
+            ACTIVE, expected_return_date__lt=timezone.now().date()
+        )
+    return queryset
@@ -0,0 +1,23 @@
+from borrow.exports import (
+    BORROWING_EXPORT_COLUMNS,
+    BORROWING_EXPORT_STATUSES,
+    borrowings_for_export,
+)
+from library_service.exports import ExportCommand
+
+
+class Command(ExportCommand):
+    help = "Stream borrowings as CSV or NDJSON."
+    columns = BORROWING_EXPORT_COLUMNS
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--status", choices=BORROWING_EXPORT_STATUSES)
+
+    def get_queryset(self, options):
+        return borrowings_for_export(
+            date_from=options["date_from"],
+            date_to=options["date_to"],
+            book=options["book"],
+            status=options["status"],
+        )
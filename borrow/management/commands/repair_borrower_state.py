@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from borrow.models import BorrowerState, Borrowing
+from borrow.state import repair_states
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute BorrowerState rows from borrowings and payments and fix "
+        "the ones that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report users with a wrong state without changing them.",
+        )
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        # Everyone who has borrowed, plus stored rows with nobody behind them
+        user_ids = sorted(
+            set(Borrowing.objects.values_list("user_id", flat=True).distinct())
+            | set(BorrowerState.objects.values_list("pk", flat=True))
+        )
+        wrong = []
+        for offset in range(0, len(user_ids), batch_size):
+            with transaction.atomic():
+                wrong += repair_states(
+                    user_ids[offset : offset + batch_size], dry_run=dry_run
+                )
+
+        verb = "Would repair" if dry_run else "Repaired"
+        self.stdout.write(
+            f"Checked {len(user_ids)} users. {verb} {len(wrong)}"
+            + (f": {wrong[:20]}" if wrong else ".")
+        )
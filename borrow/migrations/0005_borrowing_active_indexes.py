@@ -0,0 +1,50 @@
+# Generated by Django 5.0.7 on 2026-10-18 20:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0003_book_fts_index"),
+        ("borrow", "0004_notification_outbox"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # The composite index is built before the FK index it replaces is dropped
+    operations = [
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                fields=["user", "actual_return_date"], name="borrowing_user_return_idx"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="borrowing",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="borrowings",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                condition=models.Q(("actual_return_date__isnull", True)),
+                fields=["expected_return_date", "id"],
+                name="borrowing_active_due_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="borrowing",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("actual_return_date__isnull", True)),
+                fields=("user",),
+                name="borrowing_one_active_per_user",
+            ),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.0.7 on 2026-10-18 20:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill(apps, schema_editor):
+    from borrow.state import compute_states
+
+    Borrowing = apps.get_model("borrow", "Borrowing")
+    BorrowerState = apps.get_model("borrow", "BorrowerState")
+    Payment = apps.get_model("payment", "Payment")
+    user_ids = list(
+        Borrowing.objects.order_by("user_id")
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    for offset in range(0, len(user_ids), BATCH_SIZE):
+        states = compute_states(
+            user_ids[offset : offset + BATCH_SIZE], Borrowing, Payment
+        )
+        BorrowerState.objects.bulk_create(
+            BorrowerState(
+                user_id=user_id,
+                active_borrowing_id=active,
+                open_fines=fines,
+                pending_payments=pending,
+            )
+            for user_id, (active, fines, pending) in states.items()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrow", "0005_borrowing_active_indexes"),
+        ("payment", "0003_stripe_event_dedup"),
+        ("user", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BorrowerState",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="borrower_state",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "open_fines",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=10),
+                ),
+                ("pending_payments", models.IntegerField(default=0)),
+                (
+                    "active_borrowing",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="borrow.borrowing",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.7 on 2026-10-18 21:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrow", "0006_borrower_state"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OverdueScan",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("scan_date", models.DateField(unique=True)),
+                ("started_at", models.DateTimeField(auto_now_add=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("overdue", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="OverdueScanShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start_id", models.BigIntegerField()),
+                ("stop_id", models.BigIntegerField()),
+                ("last_id", models.BigIntegerField(blank=True, null=True)),
+                ("overdue_by_due", models.JSONField(default=dict)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "scan",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shards",
+                        to="borrow.overduescan",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="overduescanshard",
+            constraint=models.UniqueConstraint(
+                fields=("scan", "start_id"), name="overdue_shard_scan_start_uniq"
+            ),
+        ),
+    ]
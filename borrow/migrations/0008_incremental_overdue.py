@@ -0,0 +1,44 @@
+# Generated by Django 5.0.7 on 2026-10-18 21:47
+
+from datetime import date
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill(apps, schema_editor):
+    # The full daily scan reported everything due up to and including the
+    # day it ran; only what becomes overdue after today is new.
+    Borrowing = apps.get_model("borrow", "Borrowing")
+    Borrowing.objects.filter(
+        actual_return_date__isnull=True, expected_return_date__lte=date.today()
+    ).update(overdue_notified_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrow", "0007_overdue_scan_checkpoints"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="borrowing",
+            name="overdue_notified_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                condition=models.Q(
+                    ("actual_return_date__isnull", True),
+                    ("overdue_notified_at__isnull", True),
+                ),
+                fields=["expected_return_date", "id"],
+                name="borrowing_unnotified_due_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 21:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrow", "0008_incremental_overdue"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="next_attempt_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
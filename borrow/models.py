@@ -1,16 +1,58 @@
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 
 from book.models import Book
 from user.models import User
 
 
+ACTIVE = Q(actual_return_date__isnull=True)
+
+
 class Borrowing(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="borrowings")
+    # Covered by borrowing_user_return_idx, which leads with the user
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="borrowings", db_index=False
+    )
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="borrowings")
     borrow_date = models.DateField(editable=False)
     expected_return_date = models.DateField()
     actual_return_date = models.DateField(null=True, blank=True)
+    # When check_overdue_borrowings reported it; it is reported once
+    overdue_notified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Also the index behind every "active borrowing of this user"
+            # lookup: it only holds the rows that are still out.
+            models.UniqueConstraint(
+                fields=["user"],
+                condition=ACTIVE,
+                name="borrowing_one_active_per_user",
+            )
+        ]
+        indexes = [
+            # A user's whole history, returned or not
+            models.Index(
+                fields=["user", "actual_return_date"],
+                name="borrowing_user_return_idx",
+            ),
+            # The overdue scan, in the order it reads the rows
+            models.Index(
+                fields=["expected_return_date", "id"],
+                condition=ACTIVE,
+                name="borrowing_active_due_idx",
+            ),
+            # Due-date buckets of the borrowings not reported yet: the
+            # incremental overdue check reads only the buckets up to today,
+            # and rows leave the index once reported or returned
+            models.Index(
+                fields=["expected_return_date", "id"],
+                condition=ACTIVE & Q(overdue_notified_at__isnull=True),
+                name="borrowing_unnotified_due_idx",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.pk:
@@ -19,3 +61,102 @@ class Borrowing(models.Model):
 
     def __str__(self):
         return f"{self.user.email} borrowed {self.book.title}"
+
+
+class Notification(models.Model):
+    """Outbox row for a Telegram message awaiting delivery."""
+
+    class StatusChoices(models.TextChoices):
+        PENDING = "PENDING", _("Pending")
+        SENDING = "SENDING", _("Sending")
+        SENT = "SENT", _("Sent")
+        FAILED = "FAILED", _("Failed")
+
+    chat_id = models.CharField(max_length=64)
+    text = models.TextField()
+    status = models.CharField(
+        max_length=7, choices=StatusChoices.choices, default=StatusChoices.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    # A failed message is not claimed again before this
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="notification_status_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.status} message to {self.chat_id}"
+
+
+class BorrowerState(models.Model):
+    """What a user has out and owes, kept in step with borrowings and payments.
+
+    Read by primary key instead of aggregating ``Borrowing`` and ``Payment``;
+    maintained by ``borrow.state`` and rebuilt by ``repair_borrower_state``.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="borrower_state"
+    )
+    active_borrowing = models.ForeignKey(
+        Borrowing,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    # Unpaid FINE payments
+    open_fines = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Payments of any type not paid yet
+    pending_payments = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"State of user {self.user_id}"
+
+
+class OverdueScan(models.Model):
+    """One day's run of the sharded overdue scan in ``borrow.overdue``."""
+
+    scan_date = models.DateField(unique=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    # Set, with the total, once the summary has been queued
+    finished_at = models.DateTimeField(null=True, blank=True)
+    overdue = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Overdue scan of {self.scan_date}"
+
+
+class OverdueScanShard(models.Model):
+    """Checkpoint of one primary-key range of an ``OverdueScan``.
+
+    Saved after every chunk, so a shard that is run again carries on after
+    ``last_id`` with the counts it had.
+    """
+
+    scan = models.ForeignKey(
+        OverdueScan, on_delete=models.CASCADE, related_name="shards"
+    )
+    # Borrowing ids from start_id up to, not including, stop_id
+    start_id = models.BigIntegerField()
+    stop_id = models.BigIntegerField()
+    last_id = models.BigIntegerField(null=True, blank=True)
+    # Overdue borrowings seen so far by ISO due date
+    overdue_by_due = models.JSONField(default=dict)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["scan", "start_id"], name="overdue_shard_scan_start_uniq"
+            )
+        ]
+
+    def __str__(self):
+        return f"Shard {self.start_id}-{self.stop_id} of {self.scan}"
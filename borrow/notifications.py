@@ -0,0 +1,280 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from borrow.models import Notification
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+SEPARATOR = "\n\n"
+
+DEFAULT_RATE_LIMITS = {
+    # Telegram allows about 30 messages per second overall and one message
+    # per second to the same chat.
+    "global_per_second": 30,
+    "per_chat_per_second": 1,
+}
+
+
+def chunk_digest(header, lines):
+    """Split one digest into messages that fit Telegram's length limit."""
+    message = header
+    for line in lines:
+        if len(message) + 1 + len(line) > MAX_MESSAGE_LENGTH:
+            yield message
+            message = f"{header} (continued)"
+        message = f"{message}\n{line}"
+    yield message
+
+
+def enqueue_notification(text, chat_id=None):
+    """Queue a message for delivery by ``send_pending_notifications``.
+
+    This is a single insert, so callers never wait on the Telegram API.
+    """
+    return Notification.objects.create(
+        chat_id=str(chat_id or settings.TELEGRAM_CHAT_ID or ""), text=text
+    )
+
+
+async def aenqueue_notification(text, chat_id=None):
+    return await Notification.objects.acreate(
+        chat_id=str(chat_id or settings.TELEGRAM_CHAT_ID or ""), text=text
+    )
+
+
+def enqueue_notifications(texts, chat_id=None, batch_size=500):
+    """Queue many messages with batched inserts; returns how many."""
+    chat_id = str(chat_id or settings.TELEGRAM_CHAT_ID or "")
+    queued = 0
+    batch = []
+    for text in texts:
+        batch.append(Notification(chat_id=chat_id, text=text))
+        if len(batch) >= batch_size:
+            Notification.objects.bulk_create(batch)
+            queued += len(batch)
+            batch = []
+    if batch:
+        Notification.objects.bulk_create(batch)
+        queued += len(batch)
+    return queued
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Take one token, sleeping until one is available."""
+        with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                self.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class TelegramBotTransport:
+    def send(self, chat_id, text):
+        from borrow.telegram_utils import bot
+
+        bot.send_message(chat_id, text)
+
+
+class FakeBotTransport:
+    """Records messages instead of sending them, optionally slowly."""
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.sent = []
+
+    def send(self, chat_id, text):
+        if self.latency:
+            time.sleep(self.latency)
+        self.sent.append((chat_id, text))
+
+
+class RateLimiter:
+    def __init__(self, global_per_second, per_chat_per_second):
+        self.global_bucket = TokenBucket(global_per_second)
+        self.per_chat_per_second = per_chat_per_second
+        self.chat_buckets = defaultdict(lambda: TokenBucket(per_chat_per_second))
+
+    def acquire(self, chat_id):
+        self.chat_buckets[chat_id].acquire()
+        self.global_bucket.acquire()
+
+
+_transport = None
+_rate_limiter = None
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        config = getattr(
+            settings,
+            "NOTIFICATION_TRANSPORT",
+            {"BACKEND": "borrow.notifications.TelegramBotTransport"},
+        )
+        _transport = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+    return _transport
+
+
+def get_rate_limiter():
+    global _rate_limiter
+    if _rate_limiter is None:
+        limits = getattr(settings, "NOTIFICATION_RATE_LIMITS", DEFAULT_RATE_LIMITS)
+        _rate_limiter = RateLimiter(**limits)
+    return _rate_limiter
+
+
+@receiver(setting_changed)
+def reset_notification_delivery(setting, **kwargs):
+    global _transport, _rate_limiter
+    if setting == "NOTIFICATION_TRANSPORT":
+        _transport = None
+    elif setting == "NOTIFICATION_RATE_LIMITS":
+        _rate_limiter = None
+
+
+def coalesce(texts):
+    """Join texts into as few messages as fit Telegram's length limit."""
+    return [message for message, _ in coalesce_rows(enumerate(texts))]
+
+
+def coalesce_rows(rows):
+    """``coalesce`` for ``(id, text)`` pairs: ``(message, ids)`` per message."""
+    chunks = []
+    current, ids = "", []
+    for row_id, text in rows:
+        text = text[:MAX_MESSAGE_LENGTH]
+        if current and len(current) + len(SEPARATOR) + len(text) > MAX_MESSAGE_LENGTH:
+            chunks.append((current, ids))
+            current, ids = text, [row_id]
+        else:
+            current = f"{current}{SEPARATOR}{text}" if current else text
+            ids.append(row_id)
+    if current:
+        chunks.append((current, ids))
+    return chunks
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next try after ``attempts`` failed sends."""
+    backoff = getattr(settings, "NOTIFICATION_RETRY_BACKOFF", 30)
+    backoff_max = getattr(settings, "NOTIFICATION_RETRY_BACKOFF_MAX", 3600)
+    return min(backoff * 2 ** (attempts - 1), backoff_max)
+
+
+def _claim_batch(batch_size, lease):
+    """Mark up to ``batch_size`` notifications as being sent by this worker.
+
+    Claiming takes a short transaction of its own, so the slow sending that
+    follows never holds locks that ``enqueue_notification`` would wait on.
+    Claims older than ``lease`` seconds belong to a crashed worker and are
+    taken over; failed messages wait for their ``next_attempt_at``.
+    """
+    now = timezone.now()
+    claimable = Notification.objects.filter(
+        Q(status=Notification.StatusChoices.PENDING)
+        & (Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+        | Q(
+            status=Notification.StatusChoices.SENDING,
+            claimed_at__lt=now - timedelta(seconds=lease),
+        )
+    ).order_by("id")
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            claimable = claimable.select_for_update(skip_locked=True)
+        batch = list(claimable.values("id", "chat_id", "text", "attempts")[:batch_size])
+        Notification.objects.filter(id__in=[row["id"] for row in batch]).update(
+            status=Notification.StatusChoices.SENDING, claimed_at=now
+        )
+    return batch
+
+
+def drain_outbox(batch_size=500, transport=None, rate_limiter=None):
+    """Deliver one batch of pending notifications.
+
+    Messages for the same chat are coalesced, and every send waits on the
+    global and per-chat token buckets. A failed send stops its chat for
+    this batch: the notifications not sent yet are retried after an
+    exponential backoff, up to ``NOTIFICATION_MAX_ATTEMPTS`` sends, and
+    those already delivered in earlier messages are not. Returns delivery
+    counters.
+    """
+    transport = transport or get_transport()
+    rate_limiter = rate_limiter or get_rate_limiter()
+    max_attempts = getattr(settings, "NOTIFICATION_MAX_ATTEMPTS", 5)
+    lease = getattr(settings, "NOTIFICATION_CLAIM_LEASE", 300)
+
+    batch = _claim_batch(batch_size, lease)
+    by_chat = defaultdict(list)
+    attempts = {}
+    for row in batch:
+        by_chat[row["chat_id"]].append((row["id"], row["text"]))
+        attempts[row["id"]] = row["attempts"]
+
+    messages = 0
+    sent_ids = []
+    failed_ids = []
+    for chat_id, rows in by_chat.items():
+        chunks = coalesce_rows(rows)
+        for index, (message, ids) in enumerate(chunks):
+            try:
+                rate_limiter.acquire(chat_id)
+                transport.send(chat_id, message)
+            except Exception:
+                failed_ids.extend(row_id for _, ids in chunks[index:] for row_id in ids)
+                break
+            messages += 1
+            sent_ids.extend(ids)
+
+    now = timezone.now()
+    Notification.objects.filter(id__in=sent_ids).update(
+        status=Notification.StatusChoices.SENT,
+        sent_at=now,
+        attempts=F("attempts") + 1,
+    )
+    # One update per attempt count, as that sets the backoff
+    retries = defaultdict(list)
+    for row_id in failed_ids:
+        retries[attempts[row_id] + 1].append(row_id)
+    for tried, ids in retries.items():
+        Notification.objects.filter(id__in=ids).update(
+            status=Case(
+                When(
+                    attempts__gte=max_attempts - 1,
+                    then=Value(Notification.StatusChoices.FAILED),
+                ),
+                default=Value(Notification.StatusChoices.PENDING),
+            ),
+            attempts=F("attempts") + 1,
+            next_attempt_at=now + timedelta(seconds=retry_delay(tried)),
+        )
+    return {
+        "notifications": len(sent_ids),
+        "messages": messages,
+        "failed": len(failed_ids),
+    }
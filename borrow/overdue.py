@@ -0,0 +1,126 @@
+"""The overdue scan split into primary-key ranges for large tables.
+
+``check_overdue_borrowings`` only reads what became overdue since its last
+run; a count of everything overdue reads all of it, which in one task
+outgrows the Celery time limit on a table of millions. Here
+``start_scan`` splits the ids of the overdue borrowings into ranges of
+``OVERDUE_SHARD_SIZE``, ``scan_shard`` counts one range by due date a chunk
+at a time, and ``finish_scan`` adds the counts up into one summary
+notification. ``borrow.tasks.scan_overdue_borrowings`` runs the shards as a
+Celery chord.
+
+Each shard saves a checkpoint (``OverdueScanShard``) after every chunk: a
+shard that is run again - redelivered after its worker died, or by running
+the scan again the same day - carries on from its last chunk. A day's scan
+keeps the ranges it started with and queues its summary once.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from borrow.models import ACTIVE, Borrowing, OverdueScan, OverdueScanShard
+from borrow.notifications import (
+    chunk_digest,
+    enqueue_notification,
+    enqueue_notifications,
+)
+
+
+def overdue_on(scan_date):
+    """Borrowings still out that were due on or before ``scan_date``."""
+    return Borrowing.objects.filter(
+        ACTIVE, expected_return_date__lt=scan_date + timedelta(days=1)
+    )
+
+
+def plan_shards(first_id, last_id, shard_size):
+    """``(start, stop)`` id ranges covering ``first_id`` to ``last_id``."""
+    return [
+        (start, min(start + shard_size, last_id + 1))
+        for start in range(first_id, last_id + 1, shard_size)
+    ]
+
+
+def start_scan(scan_date, shard_size=None):
+    """The day's ``OverdueScan`` and its shards, created on the first call."""
+    if shard_size is None:
+        shard_size = getattr(settings, "OVERDUE_SHARD_SIZE", 100_000)
+    with transaction.atomic():
+        scan, created = OverdueScan.objects.get_or_create(scan_date=scan_date)
+        if created:
+            bounds = overdue_on(scan_date).aggregate(first=Min("id"), last=Max("id"))
+            if bounds["first"] is not None:
+                OverdueScanShard.objects.bulk_create(
+                    OverdueScanShard(scan=scan, start_id=start, stop_id=stop)
+                    for start, stop in plan_shards(
+                        bounds["first"], bounds["last"], shard_size
+                    )
+                )
+    return scan, list(scan.shards.order_by("start_id"))
+
+
+def _overdue_chunk(shard, after, chunk_size):
+    return list(
+        overdue_on(shard.scan.scan_date)
+        .filter(id__gt=after, id__lt=shard.stop_id)
+        .order_by("id")
+        .values_list("id", "expected_return_date")[:chunk_size]
+    )
+
+
+def scan_shard(shard, chunk_size=None):
+    """Count the shard's overdue borrowings by due date from its checkpoint.
+
+    Returns the counts for the whole range, including chunks counted by an
+    earlier run.
+    """
+    if shard.finished_at is not None:
+        return shard.overdue_by_due
+    if chunk_size is None:
+        chunk_size = getattr(settings, "OVERDUE_SCAN_CHUNK_SIZE", 2000)
+    counts = Counter(shard.overdue_by_due)
+    after = shard.start_id - 1 if shard.last_id is None else shard.last_id
+    while rows := _overdue_chunk(shard, after, chunk_size):
+        counts.update(due.isoformat() for _, due in rows)
+        after = rows[-1][0]
+        OverdueScanShard.objects.filter(pk=shard.pk).update(
+            last_id=after, overdue_by_due=dict(counts), updated_at=timezone.now()
+        )
+    shard.last_id, shard.overdue_by_due = after, dict(counts)
+    shard.finished_at = timezone.now()
+    shard.save(update_fields=["last_id", "overdue_by_due", "finished_at", "updated_at"])
+    return shard.overdue_by_due
+
+
+def summary_messages(scan_date, counts):
+    total = sum(counts.values())
+    return chunk_digest(
+        f"Borrowings overdue on {scan_date}: {total}",
+        (f"- due {due}: {counts[due]}" for due in sorted(counts)),
+    )
+
+
+def finish_scan(scan, results):
+    """Queue the summary of the shards' ``results`` unless already queued.
+
+    Returns the number of overdue borrowings.
+    """
+    counts = Counter()
+    for result in results:
+        counts.update(result)
+    total = sum(counts.values())
+    with transaction.atomic():
+        finished = OverdueScan.objects.filter(
+            pk=scan.pk, finished_at__isnull=True
+        ).update(finished_at=timezone.now(), overdue=total)
+        if finished:
+            if total:
+                enqueue_notifications(summary_messages(scan.scan_date, counts))
+            else:
+                enqueue_notification("No borrowings overdue today!")
+    return total
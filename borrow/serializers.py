@@ -1,13 +1,20 @@
 from django.utils import timezone
 from rest_framework import serializers
 
+from book.models import Book
 from book.serializers import BookSerializer
-from borrow.models import Borrowing
+from borrow.exports import BORROWING_EXPORT_STATUSES
+from borrow.models import BorrowerState, Borrowing
+from library_service.expand import ExpandableFieldsMixin
+from library_service.exports import ExportParamsSerializer
+from user.models import User
+from user.serializers import UserSummarySerializer
 
+# Largest batch accepted by the bulk create/return endpoints
+BULK_MAX_ITEMS = 1000
 
-class BorrowingDetailSerializer(serializers.ModelSerializer):
-    book = BookSerializer()
 
+class BorrowingDetailSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Borrowing
         fields = [
@@ -18,6 +25,8 @@ class BorrowingDetailSerializer(serializers.ModelSerializer):
             "expected_return_date",
             "actual_return_date",
         ]
+        expandable_fields = {"book": BookSerializer, "user": UserSummarySerializer}
+        default_expand = ("book",)
 
 
 class BorrowingCreateSerializer(serializers.ModelSerializer):
@@ -28,17 +37,12 @@ class BorrowingCreateSerializer(serializers.ModelSerializer):
         model = Borrowing
         fields = ["user", "book", "borrow_date", "expected_return_date"]
 
-    def validate(self, attrs):
-        request = self.context.get("request")
-        if request and hasattr(request, "user"):
-            user = request.user
-            if Borrowing.objects.filter(
-                user=user, actual_return_date__isnull=True
-            ).exists():
-                raise serializers.ValidationError(
-                    "You already have an active borrowing."
-                )
-        return attrs
+
+class BorrowingAsyncCreateSerializer(serializers.Serializer):
+    """Input of the async create view; the book is looked up by the view."""
+
+    book = serializers.IntegerField()
+    expected_return_date = serializers.DateField()
 
 
 class BorrowingReturnSerializer(serializers.ModelSerializer):
@@ -47,7 +51,7 @@ class BorrowingReturnSerializer(serializers.ModelSerializer):
         fields = ["actual_return_date"]
 
 
-class BorrowingListSerializer(serializers.ModelSerializer):
+class BorrowingListSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Borrowing
         fields = [
@@ -58,3 +62,63 @@ class BorrowingListSerializer(serializers.ModelSerializer):
             "expected_return_date",
             "actual_return_date",
         ]
+        expandable_fields = {"book": BookSerializer, "user": UserSummarySerializer}
+
+
+class BorrowingBulkItemSerializer(serializers.Serializer):
+    user = serializers.IntegerField()
+    book = serializers.IntegerField()
+    expected_return_date = serializers.DateField()
+
+
+class BorrowingBulkCreateSerializer(serializers.Serializer):
+    borrowings = BorrowingBulkItemSerializer(
+        many=True, allow_empty=False, max_length=BULK_MAX_ITEMS
+    )
+
+    def validate_borrowings(self, items):
+        """Resolve users and books with one query each, not one per item."""
+        user_ids = [item["user"] for item in items]
+        users = User.objects.in_bulk(user_ids)
+        books = Book.objects.in_bulk({item["book"] for item in items})
+
+        errors = []
+        if len(set(user_ids)) != len(user_ids):
+            errors.append("Each user can appear only once per batch.")
+        missing_users = sorted(set(user_ids) - set(users))
+        if missing_users:
+            errors.append(f"Unknown users: {missing_users}.")
+        missing_books = sorted({item["book"] for item in items} - set(books))
+        if missing_books:
+            errors.append(f"Unknown books: {missing_books}.")
+        active = sorted(
+            BorrowerState.objects.filter(
+                pk__in=user_ids, active_borrowing__isnull=False
+            ).values_list("pk", flat=True)
+        )
+        if active:
+            errors.append(f"Users with an active borrowing: {active}.")
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        return [
+            {
+                "user": users[item["user"]],
+                "book": books[item["book"]],
+                "expected_return_date": item["expected_return_date"],
+            }
+            for item in items
+        ]
+
+
+class BorrowingBulkReturnSerializer(serializers.Serializer):
+    borrowings = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=BULK_MAX_ITEMS
+    )
+
+    def validate_borrowings(self, ids):
+        return sorted(set(ids))
+
+
+class BorrowingExportSerializer(ExportParamsSerializer):
+    status = serializers.ChoiceField(choices=BORROWING_EXPORT_STATUSES, required=False)
@@ -0,0 +1,104 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from book.cache import bump_catalog_version
+from book.models import Book
+from borrow.models import Borrowing
+from borrow.state import borrowings_returned
+
+
+class BookOutOfStock(Exception):
+    pass
+
+
+class ActiveBorrowingExists(Exception):
+    """The user still has a borrowing out (``borrowing_one_active_per_user``)."""
+
+
+def reserve_book(book_id):
+    """Take one copy of a book out of inventory.
+
+    The decrement is a single conditional ``UPDATE ... WHERE inventory > 0``,
+    so concurrent borrowers can neither lose updates nor oversell. Where the
+    backend supports it the row is also locked first, serializing borrowers
+    of the same book for the rest of the enclosing transaction.
+    """
+    with transaction.atomic():
+        books = Book.objects.filter(pk=book_id)
+        if connection.features.has_select_for_update:
+            list(books.select_for_update().values_list("pk", flat=True))
+        reserved = books.filter(inventory__gt=0).update(inventory=F("inventory") - 1)
+    if not reserved:
+        raise BookOutOfStock(book_id)
+    bump_catalog_version()
+
+
+def release_book(book_id):
+    """Put one copy of a book back into inventory."""
+    Book.objects.filter(pk=book_id).update(inventory=F("inventory") + 1)
+    bump_catalog_version()
+
+
+def reserve_books(counts):
+    """Take ``counts[book_id]`` copies of each book out of inventory.
+
+    One conditional ``UPDATE`` per book. Raises ``BookOutOfStock`` for the
+    first book without enough copies; callers run this inside their own
+    transaction so the copies already taken are put back by the rollback.
+    """
+    with transaction.atomic():
+        books = Book.objects.filter(pk__in=counts)
+        if connection.features.has_select_for_update:
+            list(books.select_for_update().values_list("pk", flat=True))
+        for book_id, count in sorted(counts.items()):
+            reserved = Book.objects.filter(pk=book_id, inventory__gte=count).update(
+                inventory=F("inventory") - count
+            )
+            if not reserved:
+                raise BookOutOfStock(book_id)
+    bump_catalog_version()
+
+
+def release_books(counts):
+    """Put ``counts[book_id]`` copies of each book back into inventory."""
+    for book_id, count in sorted(counts.items()):
+        Book.objects.filter(pk=book_id).update(inventory=F("inventory") + count)
+    bump_catalog_version()
+
+
+def create_borrowing(user, book, expected_return_date):
+    """Reserve a copy of ``book`` and record the borrowing in one transaction.
+
+    The one-active-borrowing rule is enforced by a partial unique index
+    rather than a lookup beforehand, which concurrent requests could both
+    pass. The insert comes first, so a rejected borrower never locks the book.
+    """
+    with transaction.atomic():
+        try:
+            borrowing = Borrowing.objects.create(
+                user=user, book=book, expected_return_date=expected_return_date
+            )
+        except IntegrityError:
+            # Raised out of the block, which rolls the transaction back
+            raise ActiveBorrowingExists(user.pk)
+        # Saving it made it the active borrowing of the user (borrow.signals)
+        reserve_book(book.pk)
+    return borrowing
+
+
+def return_borrowing(borrowing, today):
+    """Stamp the return date and put the copy back in one transaction.
+
+    Only the call that flips the return date releases the book; returns
+    ``False`` when the borrowing had already been returned.
+    """
+    with transaction.atomic():
+        returned = Borrowing.objects.filter(
+            pk=borrowing.pk, actual_return_date__isnull=True
+        ).update(actual_return_date=today)
+        if not returned:
+            return False
+        release_book(borrowing.book_id)
+        borrowings_returned([borrowing.pk])
+    borrowing.actual_return_date = today
+    return True
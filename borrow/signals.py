@@ -0,0 +1,55 @@
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from book.models import Book
+from borrow.models import Borrowing
+from borrow.state import (
+    UNPAID_STATUSES,
+    borrowings_opened,
+    borrowings_returned,
+    payments_closed,
+)
+from payment.models import Payment
+
+
+@receiver(post_save, sender=Borrowing)
+def update_borrower_state(sender, instance, **kwargs):
+    # Bulk borrows and returns skip save() and update the states themselves
+    if instance.actual_return_date is None:
+        borrowings_opened([instance])
+    else:
+        borrowings_returned([instance.pk])
+
+
+def _deleted_model(origin):
+    """The model whose delete() cascaded, for an instance or a queryset."""
+    return getattr(origin, "model", type(origin))
+
+
+def _close_unpaid(payments):
+    payments_closed(
+        payments.filter(status__in=UNPAID_STATUSES).select_related("borrowing")
+    )
+
+
+# Each delete uncounts the unpaid payments once, from the row it started at,
+# rather than once per cascaded payment. A deleted user takes its state row
+# with it. The borrowing, once deleted, is cleared from the state by its
+# SET_NULL foreign key.
+
+
+@receiver(pre_delete, sender=Book)
+def uncount_payments_of_deleted_book(sender, instance, **kwargs):
+    _close_unpaid(Payment.objects.filter(borrowing__book=instance))
+
+
+@receiver(pre_delete, sender=Borrowing)
+def uncount_payments_of_deleted_borrowing(sender, instance, origin=None, **kwargs):
+    if _deleted_model(origin) is Borrowing:
+        _close_unpaid(Payment.objects.filter(borrowing=instance))
+
+
+@receiver(pre_delete, sender=Payment)
+def uncount_deleted_payment(sender, instance, origin=None, **kwargs):
+    if _deleted_model(origin) is sender and instance.status in UNPAID_STATUSES:
+        payments_closed([instance])
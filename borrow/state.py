@@ -0,0 +1,173 @@
+"""Maintenance of the denormalized ``BorrowerState`` rows.
+
+The borrow, return and payment flows call these helpers inside the
+transaction that changes the source rows, so a state row never disagrees
+with a committed borrowing or payment. Every helper is an upsert and at
+most one ``UPDATE ... SET x = x + n`` however many users a batch touches;
+nothing is read first. ``borrow.signals`` covers the paths outside those
+flows: borrowings saved one at a time and payments deleted, also when a
+book, borrowing or user delete cascades to them.
+
+``compute_states`` derives the rows from ``Borrowing`` and ``Payment``. The
+``repair_borrower_state`` command compares it with what is stored and the
+migration that added the table uses it to backfill.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import (
+    Case,
+    Count,
+    DecimalField,
+    F,
+    IntegerField,
+    Q,
+    Sum,
+    Value,
+    When,
+)
+
+from borrow.models import BorrowerState
+
+# Values of Payment.StatusChoices / TypeChoices, usable with historical models
+UNPAID_STATUSES = ("PENDING_SESSION", "SESSION_FAILED", "PENDING")
+FINE = "FINE"
+
+
+def borrowings_opened(borrowings):
+    """Record each borrowing as the active one of its user."""
+    BorrowerState.objects.bulk_create(
+        [
+            BorrowerState(user_id=borrowing.user_id, active_borrowing_id=borrowing.pk)
+            for borrowing in borrowings
+        ],
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=["active_borrowing"],
+    )
+
+
+def borrowings_returned(borrowing_ids):
+    """Clear the states whose active borrowing is among ``borrowing_ids``."""
+    BorrowerState.objects.filter(active_borrowing__in=borrowing_ids).update(
+        active_borrowing=None
+    )
+
+
+def _apply_payments(payments, sign):
+    deltas = defaultdict(lambda: [0, Decimal(0)])
+    for payment in payments:
+        delta = deltas[payment.borrowing.user_id]
+        delta[0] += sign
+        if payment.type == FINE:
+            delta[1] += sign * Decimal(str(payment.money_to_pay))
+    if not deltas:
+        return
+    if sign > 0:
+        # Users with nothing out or owed yet have no row to update
+        BorrowerState.objects.bulk_create(
+            [BorrowerState(user_id=user_id) for user_id in deltas],
+            ignore_conflicts=True,
+        )
+    # One UPDATE for the whole batch, with a CASE picking each user's delta
+    BorrowerState.objects.filter(pk__in=deltas).update(
+        pending_payments=F("pending_payments")
+        + Case(
+            *(
+                When(pk=user_id, then=Value(count))
+                for user_id, (count, _) in deltas.items()
+            ),
+            output_field=IntegerField(),
+        ),
+        open_fines=F("open_fines")
+        + Case(
+            *(
+                When(pk=user_id, then=Value(fines))
+                for user_id, (_, fines) in deltas.items()
+            ),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ),
+    )
+
+
+def payments_opened(payments):
+    """Count new unpaid payments; each needs its ``borrowing`` loaded."""
+    _apply_payments(payments, 1)
+
+
+def payments_closed(payments):
+    """Uncount payments that were paid or discarded while unpaid."""
+    _apply_payments(payments, -1)
+
+
+def compute_states(user_ids, borrowing_model=None, payment_model=None):
+    """``{user_id: (active_borrowing_id, open_fines, pending_payments)}``.
+
+    Only users with an active borrowing or an unpaid payment are included.
+    The models can be swapped for historical ones in migrations.
+    """
+    if borrowing_model is None:
+        from borrow.models import Borrowing as borrowing_model
+    if payment_model is None:
+        from payment.models import Payment as payment_model
+
+    states = defaultdict(lambda: [None, Decimal(0), 0])
+    for user_id, borrowing_id in borrowing_model.objects.filter(
+        user_id__in=user_ids, actual_return_date__isnull=True
+    ).values_list("user_id", "id"):
+        states[user_id][0] = borrowing_id
+    for user_id, fines, pending in (
+        payment_model.objects.filter(
+            borrowing__user_id__in=user_ids, status__in=UNPAID_STATUSES
+        )
+        .order_by()
+        .values("borrowing__user_id")
+        .annotate(
+            fines=Sum("money_to_pay", filter=Q(type=FINE)),
+            pending=Count("id"),
+        )
+        .values_list("borrowing__user_id", "fines", "pending")
+    ):
+        states[user_id][1] = fines or Decimal(0)
+        states[user_id][2] = pending
+    return {user_id: tuple(state) for user_id, state in states.items()}
+
+
+def repair_states(user_ids, dry_run=False):
+    """Rewrite the stored states of ``user_ids`` that differ from the source.
+
+    Call it inside a transaction: the stored rows are locked before the
+    source is read, so flows updating them wait rather than being lost.
+    Returns the ids of the users whose state was wrong.
+    """
+    stored = {
+        state.pk: (state.active_borrowing_id, state.open_fines, state.pending_payments)
+        for state in BorrowerState.objects.filter(pk__in=user_ids).select_for_update()
+    }
+    expected = compute_states(user_ids)
+    empty = (None, Decimal(0), 0)
+    wrong = sorted(
+        user_id
+        for user_id in set(expected) | set(stored)
+        if expected.get(user_id, empty) != stored.get(user_id, empty)
+    )
+    if wrong and not dry_run:
+        states = []
+        for user_id in wrong:
+            active, fines, pending = expected.get(user_id, empty)
+            states.append(
+                BorrowerState(
+                    user_id=user_id,
+                    active_borrowing_id=active,
+                    open_fines=fines,
+                    pending_payments=pending,
+                )
+            )
+        BorrowerState.objects.bulk_create(
+            states,
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["active_borrowing", "open_fines", "pending_payments"],
+        )
+    return wrong
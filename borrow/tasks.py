@@ -1,31 +1,141 @@
-from celery import shared_task
+import time
+from itertools import groupby
+
+from celery import chord, shared_task
 from datetime import date, timedelta
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .models import ACTIVE, Borrowing, OverdueScan, OverdueScanShard
+from .notifications import (
+    chunk_digest,
+    drain_outbox,
+    enqueue_notification,
+    enqueue_notifications,
+)
+from .overdue import finish_scan, scan_shard, start_scan
+
+
+def overdue_digests(rows, group_by="day"):
+    """Build digest messages from ``(date, title, email)`` rows.
 
-from .models import Borrowing
-from .telegram_utils import send_telegram_message
+    ``rows`` must already be ordered by the grouping key; they are consumed
+    lazily, so memory stays bounded regardless of how many are overdue.
+    """
+    if group_by == "book":
+        for title, group in groupby(rows, key=lambda row: row[1]):
+            yield from chunk_digest(
+                f"Overdue: {title}",
+                (f"- {email} (due {due})" for due, _, email in group),
+            )
+    else:
+        for due, group in groupby(rows, key=lambda row: row[0]):
+            yield from chunk_digest(
+                f"Borrowings overdue since {due}:",
+                (f"- {title} — {email}" for _, title, email in group),
+            )
 
 
 @shared_task
 def check_overdue_borrowings():
+    """Report the borrowings that became overdue since the last run.
+
+    Each borrowing is reported once. A run reads the due-date buckets of
+    ``borrowing_unnotified_due_idx`` up to today, queues the digests and
+    stamps ``overdue_notified_at`` in one transaction; its work follows the
+    day's changes, not the size of the table. Because the rows themselves
+    are stamped, a borrowing given a past due date after a run is still
+    reported by the next one.
+    """
     today = date.today()
     tomorrow = today + timedelta(days=1)
+    group_by = getattr(settings, "OVERDUE_DIGEST_GROUP_BY", "day")
+    chunk_size = getattr(settings, "OVERDUE_SCAN_CHUNK_SIZE", 2000)
 
-    overdue_borrowings = Borrowing.objects.filter(
-        expected_return_date__lt=tomorrow, actual_return_date__isnull=True
+    ordering = (
+        ("book__title", "book_id", "expected_return_date", "id")
+        if group_by == "book"
+        else ("expected_return_date", "id")
+    )
+    overdue = Borrowing.objects.filter(ACTIVE, expected_return_date__lt=tomorrow)
+    # One streamed query; the joins are projected instead of loaded per row
+    rows = (
+        overdue.filter(overdue_notified_at__isnull=True)
+        .order_by(*ordering)
+        .values_list("id", "expected_return_date", "book__title", "user__email")
+        .iterator(chunk_size=chunk_size)
     )
 
-    if overdue_borrowings.exists():
-        for borrowing in overdue_borrowings:
-            message = (
-                f"Borrowing overdue:\n"
-                f"Book: {borrowing.book.title}\n"
-                f"User: {borrowing.user.email}\n"
-                f"Expected Return Date: {borrowing.expected_return_date}"
-            )
-            result = send_telegram_message(message)
-            if not result["success"]:
-                print(
-                    f"Failed to send message for borrowing {borrowing.id}: {result['message']}"
-                )
-    else:
-        send_telegram_message("No borrowings overdue today!")
+    reported = []
+
+    def recorded(rows):
+        for pk, due, title, email in rows:
+            reported.append(pk)
+            yield due, title, email
+
+    with transaction.atomic():
+        messages = enqueue_notifications(overdue_digests(recorded(rows), group_by))
+        now = timezone.now()
+        for offset in range(0, len(reported), chunk_size):
+            Borrowing.objects.filter(
+                pk__in=reported[offset : offset + chunk_size]
+            ).update(overdue_notified_at=now)
+        if not reported and not overdue.exists():
+            enqueue_notification("No borrowings overdue today!")
+    return {"overdue": len(reported), "messages": messages}
+
+
+@shared_task
+def scan_overdue_borrowings():
+    """Count every overdue borrowing in a chord of primary-key range shards.
+
+    For tables too large for one task; sends one summary of the counts by
+    due date, whether reported before or not. Running it again the same
+    day resumes the shards that did not finish.
+    """
+    scan, shards = start_scan(date.today())
+    if scan.finished_at is None and shards:
+        # Finished shards return their saved counts straight away
+        chord(scan_overdue_shard.si(shard.pk) for shard in shards)(
+            finish_overdue_scan.s(scan.pk)
+        )
+    elif scan.finished_at is None:
+        finish_overdue_scan([], scan.pk)
+    return {"scan": scan.pk, "shards": len(shards)}
+
+
+# A shard whose worker died is delivered again and resumes from its
+# checkpoint
+@shared_task(
+    acks_late=True,
+    reject_on_worker_lost=True,
+    autoretry_for=(DatabaseError,),
+    retry_backoff=2,
+    max_retries=5,
+)
+def scan_overdue_shard(shard_id):
+    shard = OverdueScanShard.objects.select_related("scan").get(pk=shard_id)
+    return scan_shard(shard)
+
+
+@shared_task
+def finish_overdue_scan(results, scan_id):
+    total = finish_scan(OverdueScan.objects.get(pk=scan_id), results)
+    return {"overdue": total, "shards": len(results)}
+
+
+@shared_task
+def send_pending_notifications():
+    """Drain the notification outbox in batches for up to a time budget."""
+    budget = getattr(settings, "NOTIFICATION_DRAIN_SECONDS", 50)
+    deadline = time.monotonic() + budget
+    totals = {"notifications": 0, "messages": 0, "failed": 0}
+    while time.monotonic() < deadline:
+        stats = drain_outbox()
+        for key, value in stats.items():
+            totals[key] += value
+        # Empty, or only failures that now wait for their backoff
+        if not stats["notifications"]:
+            break
+    return totals
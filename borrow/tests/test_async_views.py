@@ -0,0 +1,169 @@
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book.models import Book
+from borrow.models import Borrowing, Notification
+from library_service.asyncapi import AsyncAPIView
+from payment.models import Payment
+from payment.stripe_client import get_stripe_client, reset_stripe_client
+from user.models import User
+
+CREATE_URL = reverse("borrowing:borrowing-create-async")
+
+
+def return_url(borrowing):
+    return reverse("borrowing:borrowing-return-async", args=[borrowing.id])
+
+
+@override_settings(STRIPE_CLIENT={"BACKEND": "payment.stripe_client.FakeStripeClient"})
+@patch.object(AsyncAPIView, "throttle_classes", ())
+class AsyncBorrowingViewsTest(TestCase):
+    def setUp(self):
+        reset_stripe_client(setting="STRIPE_CLIENT")
+        self.user = User.objects.create_user(email="reader@example.com")
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=1,
+            daily_fee="1.50",
+        )
+        self.headers = {"authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    def post(self, url, data=None, **kwargs):
+        return self.async_client.post(
+            url,
+            data or {},
+            content_type="application/json",
+            headers=kwargs.pop("headers", self.headers),
+        )
+
+    def payload(self, book=None):
+        return {
+            "book": (book or self.book).id,
+            "expected_return_date": (date.today() + timedelta(days=2)).isoformat(),
+        }
+
+    async def test_create_borrowing(self):
+        response = await self.post(CREATE_URL, self.payload())
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["book"], self.book.id)
+        self.assertEqual(response.json()["user"], self.user.id)
+        book = await Book.objects.aget(pk=self.book.pk)
+        self.assertEqual(book.inventory, 0)
+        payment = await Payment.objects.aget(borrowing__user=self.user)
+        self.assertEqual(payment.status, Payment.StatusChoices.PENDING)
+        self.assertEqual(payment.money_to_pay, 3)
+        self.assertTrue(payment.session_url)
+        self.assertEqual(await Notification.objects.acount(), 1)
+
+    async def test_create_is_exempt_from_csrf_checks(self):
+        self.async_client = AsyncClient(enforce_csrf_checks=True)
+
+        response = await self.post(CREATE_URL, self.payload())
+
+        self.assertEqual(response.status_code, 201)
+
+    async def test_create_requires_authentication(self):
+        response = await self.post(CREATE_URL, self.payload(), headers={})
+
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response)
+
+    async def test_create_rejects_second_active_borrowing(self):
+        await self.post(CREATE_URL, self.payload())
+        response = await self.post(CREATE_URL, self.payload())
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {"non_field_errors": ["You already have an active borrowing."]},
+        )
+
+    async def test_create_validates_input(self):
+        response = await self.post(CREATE_URL, {"book": 0})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("expected_return_date", response.json())
+
+        response = await self.post(
+            CREATE_URL, {**self.payload(), "book": self.book.id + 100}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("book", response.json())
+
+    async def test_create_out_of_stock(self):
+        self.book.inventory = 0
+        await self.book.asave()
+
+        response = await self.post(CREATE_URL, self.payload())
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), ["The book is currently out of stock."])
+        self.assertFalse(await Borrowing.objects.aexists())
+
+    async def test_stripe_failure_rolls_back_borrowing(self):
+        get_stripe_client().failures = 1
+
+        response = await self.post(CREATE_URL, self.payload())
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(await Borrowing.objects.aexists())
+        self.assertFalse(await Payment.objects.aexists())
+        book = await Book.objects.aget(pk=self.book.pk)
+        self.assertEqual(book.inventory, 1)
+
+    async def test_return_borrowing(self):
+        borrowing = await Borrowing.objects.acreate(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=2),
+        )
+
+        response = await self.post(return_url(borrowing))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"message": "Book returned successfully."})
+        book = await Book.objects.aget(pk=self.book.pk)
+        self.assertEqual(book.inventory, 2)
+
+        # Readers only see their active borrowings
+        response = await self.post(return_url(borrowing))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_return_overdue_borrowing_charges_fine(self):
+        borrowing = await Borrowing.objects.acreate(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today() - timedelta(days=3),
+        )
+
+        response = await self.post(return_url(borrowing))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("A fine of 6.00 USD", response.json()["message"])
+        fine = await Payment.objects.aget(borrowing=borrowing)
+        self.assertEqual(fine.type, Payment.TypeChoices.FINE)
+        self.assertEqual(fine.status, Payment.StatusChoices.PENDING)
+
+    async def test_return_borrowing_of_another_user(self):
+        other = await User.objects.acreate(email="other@example.com")
+        borrowing = await Borrowing.objects.acreate(
+            user=other,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=2),
+        )
+
+        response = await self.post(return_url(borrowing))
+
+        self.assertEqual(response.status_code, 404)
+
+    async def test_method_not_allowed(self):
+        response = await self.async_client.get(CREATE_URL, headers=self.headers)
+
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,188 @@
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from book.models import Book
+from borrow.models import Borrowing, Notification
+from payment.models import Payment
+from payment.stripe_client import reset_stripe_client
+from user.models import User
+
+BULK_URL = reverse("borrowing:borrowing-bulk-create")
+BULK_RETURN_URL = reverse("borrowing:borrowing-bulk-return")
+
+
+@override_settings(STRIPE_CLIENT={"BACKEND": "payment.stripe_client.FakeStripeClient"})
+class BulkBorrowingTest(APITestCase):
+    def setUp(self):
+        reset_stripe_client(setting="STRIPE_CLIENT")
+        self.admin = User.objects.create_user(
+            email="admin@example.com", password="password123", is_staff=True
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.readers = [
+            User.objects.create_user(email=f"reader{i}@example.com") for i in range(4)
+        ]
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                author="Author",
+                cover=Book.CoverChoices.HARD,
+                inventory=2,
+                daily_fee="1.00",
+            )
+            for i in range(2)
+        ]
+        self.today = timezone.now().date()
+
+    def borrow(self, readers, books, days=3):
+        return [
+            Borrowing.objects.create(
+                user=reader,
+                book=book,
+                expected_return_date=self.today + timezone.timedelta(days=days),
+            )
+            for reader, book in zip(readers, books)
+        ]
+
+    def test_bulk_create(self):
+        payload = {
+            "borrowings": [
+                {
+                    "user": reader.id,
+                    "book": self.books[i % 2].id,
+                    "expected_return_date": self.today + timezone.timedelta(days=4),
+                }
+                for i, reader in enumerate(self.readers[:3])
+            ]
+        }
+        # Run the dispatched session tasks inline
+        with patch("celery.canvas.group.apply_async", lambda group: group.apply()):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(
+            sorted(Book.objects.values_list("inventory", flat=True)), [0, 1]
+        )
+        payments = Payment.objects.all()
+        self.assertEqual(len(payments), 3)
+        for payment in payments:
+            self.assertEqual(payment.status, Payment.StatusChoices.PENDING)
+            self.assertEqual(payment.money_to_pay, 4)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_bulk_create_is_all_or_nothing(self):
+        payload = {
+            "borrowings": [
+                {
+                    "user": reader.id,
+                    "book": self.books[0].id,
+                    "expected_return_date": self.today,
+                }
+                for reader in self.readers[:3]
+            ]
+        }
+        response = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Borrowing.objects.exists())
+        self.assertFalse(Payment.objects.exists())
+        self.books[0].refresh_from_db()
+        self.assertEqual(self.books[0].inventory, 2)
+
+    def test_bulk_create_rejects_users_with_active_borrowings(self):
+        self.borrow(self.readers[:1], self.books[:1])
+        payload = {
+            "borrowings": [
+                {
+                    "user": self.readers[0].id,
+                    "book": self.books[1].id,
+                    "expected_return_date": self.today,
+                }
+            ]
+        }
+        response = self.client.post(BULK_URL, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_is_staff_only(self):
+        self.client.force_authenticate(user=self.readers[0])
+        response = self.client.post(BULK_URL, {"borrowings": []}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_return(self):
+        on_time = self.borrow(self.readers[:2], self.books)
+        overdue = self.borrow(self.readers[2:], self.books, days=-3)
+        ids = [borrowing.id for borrowing in on_time + overdue]
+
+        with patch("celery.canvas.group.apply_async") as dispatch:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    BULK_RETURN_URL, {"borrowings": ids}, format="json"
+                )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["returned"], 4)
+        self.assertEqual(
+            sorted(fine["borrowing"] for fine in response.data["fines"]),
+            [borrowing.id for borrowing in overdue],
+        )
+        self.assertEqual(response.data["fines"][0]["amount"], "6.00")
+        dispatch.assert_called_once()
+        self.assertFalse(
+            Borrowing.objects.filter(actual_return_date__isnull=True).exists()
+        )
+        self.assertEqual(list(Book.objects.values_list("inventory", flat=True)), [4, 4])
+
+    def test_bulk_return_query_count_does_not_grow(self):
+        def queries_for(readers):
+            ids = [
+                borrowing.id
+                for borrowing in self.borrow(readers, self.books * len(readers))
+            ]
+            with patch("celery.canvas.group.apply_async"):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.post(
+                        BULK_RETURN_URL, {"borrowings": ids}, format="json"
+                    )
+            return len(queries)
+
+        more_readers = [
+            User.objects.create_user(email=f"extra{i}@example.com") for i in range(8)
+        ]
+        self.assertEqual(queries_for(self.readers[:2]), queries_for(more_readers))
+
+    def test_bulk_return_is_all_or_nothing(self):
+        first, second = self.borrow(self.readers[:2], self.books)
+        Borrowing.objects.filter(pk=second.pk).update(actual_return_date=self.today)
+
+        response = self.client.post(
+            BULK_RETURN_URL, {"borrowings": [first.id, second.id]}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        first.refresh_from_db()
+        self.assertIsNone(first.actual_return_date)
+
+    def test_readers_can_only_return_their_own(self):
+        (own,), (other,) = self.borrow(self.readers[:1], self.books), self.borrow(
+            self.readers[1:2], self.books
+        )
+        self.client.force_authenticate(user=self.readers[0])
+
+        response = self.client.post(
+            BULK_RETURN_URL, {"borrowings": [own.id, other.id]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            BULK_RETURN_URL, {"borrowings": [own.id]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
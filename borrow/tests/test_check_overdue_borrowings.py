@@ -1,8 +1,10 @@
-from django.test import TestCase
-from unittest.mock import patch
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from datetime import date, timedelta
 from celery.result import EagerResult
-from borrow.models import Borrowing, Book
+from borrow.models import Borrowing, Book, Notification
+from borrow.notifications import MAX_MESSAGE_LENGTH
 from user.models import User
 from borrow.tasks import check_overdue_borrowings
 
@@ -26,24 +28,32 @@ class CeleryTasksTest(TestCase):
             expected_return_date=date.today() - timedelta(days=1),  # Overdue
         )
 
-    @patch("borrow.tasks.send_telegram_message")
-    def test_check_overdue_borrowings(self, mock_send_telegram_message):
-        """Test that overdue borrowings are detected and notifications are sent."""
-        mock_send_telegram_message.return_value = {"success": True}
+    def add_overdue(self, count, days_overdue=1, book=None):
+        users = User.objects.bulk_create(
+            User(email=f"reader{days_overdue}-{i}@example.com") for i in range(count)
+        )
+        for user in users:
+            Borrowing.objects.create(
+                user=user,
+                book=book or self.book,
+                expected_return_date=date.today() - timedelta(days=days_overdue),
+            )
 
+    def test_check_overdue_borrowings(self):
+        """Test that overdue borrowings are detected and notifications are sent."""
         result = check_overdue_borrowings.apply()
         self.assertIsInstance(
             result, EagerResult
         )  # Check that the task ran synchronously
 
-        self.assertTrue(mock_send_telegram_message.called)
-        self.assertIn(
-            "Borrowing overdue:\nBook: Test Book\nUser: user@example.com\nExpected Return Date:",
-            mock_send_telegram_message.call_args[0][0],
+        self.assertEqual(result.get(), {"overdue": 1, "messages": 1})
+        self.assertEqual(
+            Notification.objects.get().text,
+            f"Borrowings overdue since {self.borrowing.expected_return_date}:\n"
+            f"- Test Book — user@example.com",
         )
 
-    @patch("borrow.tasks.send_telegram_message")
-    def test_no_overdue_borrowings(self, mock_send_telegram_message):
+    def test_no_overdue_borrowings(self):
         """Test that no notifications are sent when there are no overdue borrowings."""
         # Change the expected return date to a future date
         self.borrowing.expected_return_date = date.today() + timedelta(days=1)
@@ -55,4 +65,89 @@ class CeleryTasksTest(TestCase):
         )  # Check that the task ran synchronously
 
         # Check that the 'no overdue borrowings' message was sent
-        mock_send_telegram_message.assert_called_with("No borrowings overdue today!")
+        self.assertEqual(
+            list(Notification.objects.values_list("text", flat=True)),
+            ["No borrowings overdue today!"],
+        )
+
+    def test_one_digest_per_day(self):
+        self.add_overdue(3, days_overdue=2)
+        self.add_overdue(2, days_overdue=1)
+
+        result = check_overdue_borrowings.apply().get()
+
+        self.assertEqual(result, {"overdue": 6, "messages": 2})
+        older, newer = Notification.objects.order_by("id")
+        self.assertTrue(
+            older.text.startswith(
+                f"Borrowings overdue since {date.today() - timedelta(days=2)}:"
+            )
+        )
+        self.assertEqual(older.text.count("\n- "), 3)
+        self.assertEqual(newer.text.count("\n- "), 3)
+
+    @override_settings(OVERDUE_DIGEST_GROUP_BY="book")
+    def test_one_digest_per_book(self):
+        other = Book.objects.create(
+            title="Other Book",
+            author="Author",
+            cover=Book.CoverChoices.SOFT,
+            inventory=5,
+            daily_fee=1.00,
+        )
+        self.add_overdue(2, days_overdue=3, book=other)
+
+        check_overdue_borrowings.apply()
+
+        texts = list(Notification.objects.order_by("id").values_list("text", flat=True))
+        self.assertEqual(len(texts), 2)
+        self.assertTrue(texts[0].startswith("Overdue: Other Book\n"))
+        self.assertTrue(texts[1].startswith("Overdue: Test Book\n- user@example.com"))
+
+    def test_long_digests_are_split(self):
+        self.add_overdue(150)
+
+        result = check_overdue_borrowings.apply().get()
+
+        texts = list(Notification.objects.order_by("id").values_list("text", flat=True))
+        self.assertEqual(result["messages"], len(texts))
+        self.assertGreater(len(texts), 1)
+        self.assertTrue(all(len(text) <= MAX_MESSAGE_LENGTH for text in texts))
+        self.assertIn("(continued)", texts[1])
+        self.assertEqual(sum(text.count("\n- ") for text in texts), 151)
+
+    def test_query_count_does_not_grow_with_overdue_rows(self):
+        with CaptureQueriesContext(connection) as few:
+            check_overdue_borrowings.apply()
+        self.add_overdue(40)
+        with CaptureQueriesContext(connection) as many:
+            check_overdue_borrowings.apply()
+        self.assertEqual(len(few), len(many))
+
+    def test_each_borrowing_is_reported_once(self):
+        check_overdue_borrowings.apply()
+        self.borrowing.refresh_from_db()
+        self.assertIsNotNone(self.borrowing.overdue_notified_at)
+
+        result = check_overdue_borrowings.apply().get()
+
+        # Still overdue but already reported: nothing is queued
+        self.assertEqual(result, {"overdue": 0, "messages": 0})
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_only_newly_overdue_borrowings_are_read(self):
+        self.add_overdue(30, days_overdue=5)
+        check_overdue_borrowings.apply()
+        self.add_overdue(2, days_overdue=1)
+        # Given a past due date after the last run
+        self.add_overdue(1, days_overdue=9)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = check_overdue_borrowings.apply().get()
+
+        self.assertEqual(result, {"overdue": 3, "messages": 2})
+        scan = next(q["sql"] for q in queries if "overdue_notified_at" in q["sql"])
+        self.assertIn('"overdue_notified_at" IS NULL', scan)
+        older, newer = Notification.objects.order_by("id")[2:]
+        self.assertEqual(older.text.count("\n- "), 1)
+        self.assertEqual(newer.text.count("\n- "), 2)
@@ -0,0 +1,106 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from book.models import Book
+from borrow.models import Borrowing
+from payment.models import Payment
+from user.models import User
+
+
+class ExpandFieldsTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@example.com", password="password123", is_staff=True
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.book = Book.objects.create(
+            title="Expanded Book",
+            author="Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=3,
+            daily_fee=1.00,
+        )
+        self.borrowing = Borrowing.objects.create(
+            user=self.admin,
+            book=self.book,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=3),
+        )
+        Payment.objects.create(
+            borrowing=self.borrowing, session_id="cs_expand", money_to_pay=3
+        )
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        return response, [query["sql"] for query in queries.captured_queries]
+
+    def test_default_payloads_are_unchanged(self):
+        response, _ = self.get(reverse("borrowing:borrowing-list"))
+        self.assertEqual(response.data[0]["book"], self.book.id)
+        self.assertEqual(response.data[0]["user"], self.admin.id)
+
+        url = reverse("borrowing:borrowing-detail", args=[self.borrowing.id])
+        response, queries = self.get(url)
+        self.assertEqual(response.data["book"]["title"], "Expanded Book")
+        self.assertEqual(len(queries), 1)
+
+    def test_expand_and_fields_select_only_requested_columns(self):
+        response, queries = self.get(
+            reverse("borrowing:borrowing-list"),
+            expand="book,user",
+            fields="id,book.title,user",
+        )
+
+        self.assertEqual(
+            response.data,
+            [
+                {
+                    "id": self.borrowing.id,
+                    "book": {"title": "Expanded Book"},
+                    "user": {"id": self.admin.id, "email": "admin@example.com"},
+                }
+            ],
+        )
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"book_book"."title"', queries[0])
+        self.assertNotIn('"book_book"."author"', queries[0])
+        self.assertNotIn('"user_user"."password"', queries[0])
+
+    def test_fields_without_expand_skips_joins(self):
+        response, queries = self.get(reverse("borrowing:borrowing-list"), fields="id")
+
+        self.assertEqual(response.data, [{"id": self.borrowing.id}])
+        self.assertNotIn("JOIN", queries[0])
+        self.assertNotIn("expected_return_date", queries[0])
+
+    def test_nested_expand_on_payments(self):
+        response, queries = self.get(
+            reverse("payments:payments-list"),
+            expand="borrowing.book",
+            fields="id,borrowing.id,borrowing.book.title",
+        )
+
+        self.assertEqual(
+            response.data[0]["borrowing"],
+            {"id": self.borrowing.id, "book": {"title": "Expanded Book"}},
+        )
+        self.assertEqual(len(queries), 1)
+
+    def test_unknown_names_are_rejected(self):
+        url = reverse("payments:payments-list")
+        self.assertEqual(
+            self.get(url, expand="user")[0].status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.assertEqual(
+            self.get(url, fields="nope")[0].status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.assertEqual(
+            self.get(url, fields="borrowing.id")[0].status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
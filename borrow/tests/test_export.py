@@ -0,0 +1,149 @@
+import csv
+import io
+import json
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book.models import Book
+from borrow.models import Borrowing
+from user.models import User
+
+EXPORT_URL = reverse("borrowing:borrowing-export")
+
+
+class BorrowingExportTest(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(email="staff@example.com", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                author="Test Author",
+                cover=Book.CoverChoices.HARD,
+                inventory=5,
+                daily_fee="1.00",
+            )
+            for i in range(2)
+        ]
+        self.today = date.today()
+        self.borrowings = [
+            Borrowing(
+                user=User.objects.create_user(email=f"reader{i}@example.com"),
+                book=self.books[i % 2],
+                borrow_date=self.today - timedelta(days=i),
+                expected_return_date=self.today + timedelta(days=1 - i),
+                actual_return_date=self.today if i == 0 else None,
+            )
+            for i in range(5)
+        ]
+        Borrowing.objects.bulk_create(self.borrowings)
+
+    def export(self, **params):
+        response = self.client.get(EXPORT_URL, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response, content = self.export()
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn('filename="borrowings.csv"', response["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(
+            [int(row["id"]) for row in rows], [b.id for b in self.borrowings]
+        )
+        self.assertEqual(rows[0]["user_email"], "reader0@example.com")
+        self.assertEqual(rows[0]["book_title"], "Book 0")
+        self.assertEqual(rows[0]["actual_return_date"], self.today.isoformat())
+        self.assertEqual(rows[1]["actual_return_date"], "")
+
+    def test_ndjson(self):
+        response, content = self.export(export_format="ndjson")
+        self.assertEqual(
+            response["Content-Type"], "application/x-ndjson; charset=utf-8"
+        )
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(
+            rows[1]["borrow_date"], (self.today - timedelta(days=1)).isoformat()
+        )
+        self.assertIsNone(rows[1]["actual_return_date"])
+
+    def test_filters(self):
+        def ids(**params):
+            _, content = self.export(export_format="ndjson", **params)
+            return [json.loads(line)["id"] for line in content.splitlines()]
+
+        expected = [b.id for b in self.borrowings]
+        self.assertEqual(ids(book=self.books[1].id), expected[1::2])
+        self.assertEqual(ids(status="returned"), expected[:1])
+        self.assertEqual(ids(status="active"), expected[1:])
+        self.assertEqual(ids(status="overdue"), expected[2:])
+        self.assertEqual(
+            ids(
+                date_from=self.today - timedelta(days=3),
+                date_to=self.today - timedelta(days=1),
+            ),
+            expected[1:4],
+        )
+
+    def test_empty_csv_has_header(self):
+        _, content = self.export(
+            status="overdue", book=self.books[0].id, date_from=self.today
+        )
+        self.assertEqual(
+            content,
+            "id,user_id,user_email,book_id,book_title,borrow_date,"
+            "expected_return_date,actual_return_date\r\n",
+        )
+
+    def test_rejects_bad_params(self):
+        for params in (
+            {"export_format": "xml"},
+            {"status": "lost"},
+            {"date_from": self.today, "date_to": self.today - timedelta(days=1)},
+        ):
+            response = self.client.get(EXPORT_URL, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(User.objects.create_user(email="me@example.com"))
+        response = self.client.get(EXPORT_URL)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_streams_in_chunks(self):
+        response = self.client.get(EXPORT_URL, {"export_format": "ndjson"})
+        with patch("django.db.models.query.QuerySet._fetch_all") as fetch_all:
+            chunks = list(response.streaming_content)
+        # Rows come from the cursor in chunks, never from a loaded queryset
+        fetch_all.assert_not_called()
+        self.assertEqual([chunk.count(b"\n") for chunk in chunks], [2, 2, 1])
+
+    async def test_async_iterator_under_asgi(self):
+        response = await self.async_client.get(
+            EXPORT_URL,
+            headers={"authorization": f"Bearer {AccessToken.for_user(self.staff)}"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.decode().splitlines()), 6)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command(
+            "export_borrowings", "--format", "ndjson", "--status", "active", stdout=out
+        )
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [row["id"] for row in rows], [b.id for b in self.borrowings[1:]]
+        )
@@ -0,0 +1,118 @@
+from datetime import date, timedelta
+from unittest import skipUnless
+
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book.models import Book
+from borrow.models import Borrowing
+from borrow.services import ActiveBorrowingExists, create_borrowing
+from user.models import User
+
+EXPLAIN_VENDORS = ("sqlite", "postgresql")
+
+
+@skipUnless(connection.vendor in EXPLAIN_VENDORS, "EXPLAIN output is vendor specific")
+class BorrowingIndexPlanTest(TestCase):
+    """The hot borrowing lookups are answered from an index, not a table scan."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="reader@example.com")
+        if connection.vendor == "postgresql":
+            # The test tables are tiny; make the planner show its index choice
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, *names):
+        plan = queryset.explain()
+        self.assertTrue(
+            any(name in plan for name in names),
+            f"None of {names} in the plan:\n{plan}",
+        )
+        self.assertNotIn("SCAN borrow_borrowing", plan)
+        return plan
+
+    def test_active_borrowing_of_user(self):
+        self.assertUsesIndex(
+            Borrowing.objects.filter(user=self.user, actual_return_date__isnull=True),
+            "borrowing_one_active_per_user",
+            "borrowing_user_return_idx",
+        )
+
+    def test_history_of_user(self):
+        self.assertUsesIndex(
+            Borrowing.objects.filter(user=self.user, actual_return_date__isnull=False),
+            "borrowing_user_return_idx",
+        )
+
+    def test_overdue_scan_reads_the_partial_index_in_order(self):
+        plan = self.assertUsesIndex(
+            Borrowing.objects.filter(
+                expected_return_date__lt=date.today(), actual_return_date__isnull=True
+            )
+            .order_by("expected_return_date", "id")
+            .values_list("expected_return_date", "book__title", "user__email"),
+            "borrowing_active_due_idx",
+        )
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class OneActiveBorrowingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="reader@example.com")
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=5,
+            daily_fee="1.50",
+        )
+        self.due = date.today() + timedelta(days=3)
+
+    def test_second_active_borrowing_is_rejected(self):
+        Borrowing.objects.create(
+            user=self.user, book=self.book, expected_return_date=self.due
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Borrowing.objects.create(
+                user=self.user, book=self.book, expected_return_date=self.due
+            )
+
+    def test_returned_borrowings_do_not_count(self):
+        for _ in range(2):
+            Borrowing.objects.create(
+                user=self.user,
+                book=self.book,
+                expected_return_date=self.due,
+                actual_return_date=date.today(),
+            )
+        Borrowing.objects.create(
+            user=self.user, book=self.book, expected_return_date=self.due
+        )
+        self.assertEqual(self.user.borrowings.count(), 3)
+
+    def test_create_borrowing_leaves_inventory_alone_when_rejected(self):
+        create_borrowing(self.user, self.book, self.due)
+        with self.assertRaises(ActiveBorrowingExists):
+            create_borrowing(self.user, self.book, self.due)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 4)
+        self.assertEqual(self.user.borrowings.count(), 1)
+
+    def test_create_endpoint_reports_active_borrowing(self):
+        Borrowing.objects.create(
+            user=self.user, book=self.book, expected_return_date=self.due
+        )
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(
+            reverse("borrowing:borrowing-list"),
+            {"book": self.book.id, "expected_return_date": self.due.isoformat()},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("already have an active borrowing", response.data[0])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 5)
@@ -0,0 +1,129 @@
+import threading
+import time
+
+from django.db import OperationalError, connections
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from book.models import Book
+from borrow.models import Borrowing
+from borrow.services import BookOutOfStock, release_book, reserve_book
+from user.models import User
+
+
+class ReserveBookTest(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Hot Book",
+            author="Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=1,
+            daily_fee=1.00,
+        )
+
+    def test_reserve_and_release(self):
+        reserve_book(self.book.pk)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+        with self.assertRaises(BookOutOfStock):
+            reserve_book(self.book.pk)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+        release_book(self.book.pk)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+
+
+class ReturnBookTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@example.com", password="password123", is_staff=True
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.book = Book.objects.create(
+            title="Returned Book",
+            author="Author",
+            cover=Book.CoverChoices.SOFT,
+            inventory=0,
+            daily_fee=1.00,
+        )
+        self.borrowing = Borrowing.objects.create(
+            user=self.admin,
+            book=self.book,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=3),
+        )
+
+    def test_second_return_does_not_restock(self):
+        url = reverse("borrowing:borrowing-return-book", args=[self.borrowing.id])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+
+
+class ConcurrentReservationTest(TransactionTestCase):
+    """Many workers race to borrow the same book at once."""
+
+    workers = 16
+    inventory = 5
+
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Hot Book",
+            author="Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=self.inventory,
+            daily_fee=1.00,
+        )
+
+    def race(self):
+        barrier = threading.Barrier(self.workers)
+        outcomes = []
+        lock = threading.Lock()
+
+        def worker():
+            barrier.wait()
+            try:
+                while True:
+                    try:
+                        reserve_book(self.book.pk)
+                        outcome = "reserved"
+                    except BookOutOfStock:
+                        outcome = "out of stock"
+                    except OperationalError:
+                        # The in-memory SQLite test database reports table
+                        # lock conflicts instead of waiting for them.
+                        time.sleep(0.001)
+                        continue
+                    break
+                with lock:
+                    outcomes.append(outcome)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes, time.perf_counter() - started
+
+    def test_no_lost_updates_or_overselling(self):
+        outcomes, elapsed = self.race()
+
+        self.assertEqual(len(outcomes), self.workers)
+        self.assertEqual(outcomes.count("reserved"), self.inventory)
+        self.assertEqual(outcomes.count("out of stock"), self.workers - self.inventory)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+        # Every attempt resolves promptly: nobody waits on a stuck lock.
+        self.assertLess(elapsed, 10)
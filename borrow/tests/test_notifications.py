@@ -0,0 +1,223 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from book.models import Book
+from borrow.models import Notification
+from borrow.notifications import (
+    MAX_MESSAGE_LENGTH,
+    FakeBotTransport,
+    RateLimiter,
+    TokenBucket,
+    coalesce,
+    drain_outbox,
+    enqueue_notification,
+    get_transport,
+    retry_delay,
+)
+from borrow.tasks import send_pending_notifications
+from user.models import User
+
+
+class FailingTransport:
+    def __init__(self, succeed=0):
+        self.succeed = succeed
+        self.sent = []
+
+    def send(self, chat_id, text):
+        if len(self.sent) >= self.succeed:
+            raise ConnectionError("Telegram is down")
+        self.sent.append((chat_id, text))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+
+class TokenBucketTest(TestCase):
+    def test_waits_for_tokens_once_burst_is_spent(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock, sleep=clock.sleep)
+        bucket.acquire()
+        bucket.acquire()
+        self.assertEqual(clock.slept, 0)
+        bucket.acquire()
+        self.assertAlmostEqual(clock.slept, 0.5)
+        clock.now += 10
+        bucket.acquire()
+        self.assertAlmostEqual(clock.slept, 0.5)
+
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.transport = FakeBotTransport()
+        self.rate_limiter = RateLimiter(
+            global_per_second=1000, per_chat_per_second=1000
+        )
+
+    def drain(self, transport=None):
+        return drain_outbox(
+            transport=transport or self.transport, rate_limiter=self.rate_limiter
+        )
+
+    @override_settings(TELEGRAM_CHAT_ID="42")
+    def test_enqueue_defaults_to_the_configured_chat(self):
+        notification = enqueue_notification("hello")
+        self.assertEqual(notification.chat_id, "42")
+        self.assertEqual(notification.status, Notification.StatusChoices.PENDING)
+
+    def test_messages_for_the_same_chat_are_coalesced(self):
+        for text in ("one", "two", "three"):
+            enqueue_notification(text, chat_id="a")
+        enqueue_notification("other", chat_id="b")
+
+        stats = self.drain()
+
+        self.assertEqual(stats, {"notifications": 4, "messages": 2, "failed": 0})
+        self.assertEqual(
+            sorted(self.transport.sent), [("a", "one\n\ntwo\n\nthree"), ("b", "other")]
+        )
+        self.assertFalse(
+            Notification.objects.exclude(
+                status=Notification.StatusChoices.SENT
+            ).exists()
+        )
+        self.assertEqual(self.drain()["notifications"], 0)
+
+    def test_coalesce_respects_telegram_length_limit(self):
+        text = "x" * 3000
+        chunks = coalesce([text, text, "short"])
+        self.assertEqual(chunks, [text, f"{text}\n\nshort"])
+        self.assertTrue(all(len(chunk) <= MAX_MESSAGE_LENGTH for chunk in chunks))
+
+    @override_settings(NOTIFICATION_MAX_ATTEMPTS=2, NOTIFICATION_RETRY_BACKOFF=30)
+    def test_failed_deliveries_are_retried_then_given_up(self):
+        notification = enqueue_notification("hello", chat_id="a")
+
+        self.assertEqual(self.drain(FailingTransport())["failed"], 1)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, Notification.StatusChoices.PENDING)
+        self.assertEqual(notification.attempts, 1)
+        self.assertAlmostEqual(
+            (notification.next_attempt_at - timezone.now()).total_seconds(),
+            30,
+            delta=5,
+        )
+        # Not retried before the backoff runs out
+        self.assertEqual(self.drain(FailingTransport())["failed"], 0)
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        self.drain(FailingTransport())
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, Notification.StatusChoices.FAILED)
+        self.assertEqual(self.drain()["notifications"], 0)
+
+    def test_backoff_doubles_up_to_the_maximum(self):
+        with override_settings(
+            NOTIFICATION_RETRY_BACKOFF=30, NOTIFICATION_RETRY_BACKOFF_MAX=100
+        ):
+            self.assertEqual(
+                [retry_delay(attempts) for attempts in (1, 2, 3, 4)], [30, 60, 100, 100]
+            )
+
+    def test_messages_sent_before_a_failure_are_not_resent(self):
+        text = "x" * 3000
+        first = enqueue_notification(text, chat_id="a")
+        second = enqueue_notification(text, chat_id="a")
+        transport = FailingTransport(succeed=1)
+
+        stats = self.drain(transport)
+
+        self.assertEqual(stats, {"notifications": 1, "messages": 1, "failed": 1})
+        self.assertEqual(transport.sent, [("a", text)])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, Notification.StatusChoices.SENT)
+        self.assertEqual(second.status, Notification.StatusChoices.PENDING)
+
+    def test_stale_claims_are_taken_over(self):
+        notification = enqueue_notification("hello", chat_id="a")
+        Notification.objects.filter(pk=notification.pk).update(
+            status=Notification.StatusChoices.SENDING,
+            claimed_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(self.drain()["notifications"], 1)
+
+    def test_fresh_claims_are_left_alone(self):
+        notification = enqueue_notification("hello", chat_id="a")
+        Notification.objects.filter(pk=notification.pk).update(
+            status=Notification.StatusChoices.SENDING, claimed_at=timezone.now()
+        )
+        self.assertEqual(self.drain()["notifications"], 0)
+
+    @override_settings(
+        NOTIFICATION_TRANSPORT={"BACKEND": "borrow.notifications.FakeBotTransport"},
+        NOTIFICATION_RATE_LIMITS={
+            "global_per_second": 1000,
+            "per_chat_per_second": 1000,
+        },
+    )
+    def test_task_drains_the_outbox(self):
+        for i in range(3):
+            enqueue_notification(f"message {i}", chat_id="a")
+        result = send_pending_notifications.apply()
+        self.assertEqual(result.get()["notifications"], 3)
+        self.assertEqual(len(get_transport().sent), 1)
+
+    @override_settings(NOTIFICATION_RETRY_BACKOFF=0)
+    def test_task_stops_when_a_batch_only_fails(self):
+        enqueue_notification("hello", chat_id="a")
+        with patch(
+            "borrow.tasks.drain_outbox",
+            wraps=lambda: drain_outbox(
+                transport=FailingTransport(), rate_limiter=self.rate_limiter
+            ),
+        ) as drain:
+            result = send_pending_notifications.apply().get()
+        drain.assert_called_once()
+        self.assertEqual(result["failed"], 1)
+        self.assertEqual(Notification.objects.get().attempts, 1)
+
+
+class BorrowingNotificationTest(APITestCase):
+    @patch("borrow.notifications.TelegramBotTransport.send")
+    @patch("borrow.views.request_payment_session")
+    def test_borrowing_queues_notification_without_calling_bot(
+        self, mock_payment_session, mock_send
+    ):
+        user = User.objects.create_user(email="user@example.com", password="pass12345")
+        book = Book.objects.create(
+            title="Queued Book",
+            author="Author",
+            cover=Book.CoverChoices.SOFT,
+            inventory=1,
+            daily_fee=1.00,
+        )
+        self.client.force_authenticate(user=user)
+
+        response = self.client.post(
+            reverse("borrowing:borrowing-list"),
+            {
+                "book": book.id,
+                "expected_return_date": timezone.now().date() + timedelta(days=2),
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(mock_send.called)
+        notification = Notification.objects.get()
+        self.assertIn("Book: Queued Book", notification.text)
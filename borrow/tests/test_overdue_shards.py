@@ -0,0 +1,103 @@
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from book.models import Book
+from borrow import overdue
+from borrow.models import Borrowing, Notification, OverdueScan, OverdueScanShard
+from borrow.overdue import plan_shards
+from borrow.tasks import scan_overdue_borrowings
+from user.models import User
+
+
+@override_settings(
+    CELERY_TASK_ALWAYS_EAGER=True, OVERDUE_SHARD_SIZE=4, OVERDUE_SCAN_CHUNK_SIZE=2
+)
+class ShardedOverdueScanTest(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=50,
+            daily_fee="1.50",
+        )
+        self.today = date.today()
+        # Ten borrowings: 3 returned, 2 not due yet and 5 overdue
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                user=User.objects.create_user(email=f"reader{i}@example.com"),
+                book=self.book,
+                borrow_date=self.today - timedelta(days=30),
+                expected_return_date=self.today + timedelta(days=[-2, -1, 1][i % 3]),
+                actual_return_date=self.today if i in (0, 4, 8) else None,
+            )
+            for i in range(10)
+        )
+        self.ids = list(Borrowing.objects.order_by("id").values_list("id", flat=True))
+
+    def summary(self):
+        return list(Notification.objects.values_list("text", flat=True))
+
+    def test_plan_shards(self):
+        self.assertEqual(plan_shards(5, 14, 4), [(5, 9), (9, 13), (13, 15)])
+        self.assertEqual(plan_shards(7, 7, 4), [(7, 8)])
+
+    def test_one_summary_from_all_shards(self):
+        result = scan_overdue_borrowings.apply().get()
+
+        # Overdue ids span 1..9 of the ten: three shards of four ids
+        self.assertEqual(result["shards"], 3)
+        scan = OverdueScan.objects.get()
+        self.assertEqual(scan.overdue, 5)
+        self.assertIsNotNone(scan.finished_at)
+        self.assertFalse(scan.shards.filter(finished_at__isnull=True).exists())
+        self.assertEqual(
+            self.summary(),
+            [
+                f"Borrowings overdue on {self.today}: 5\n"
+                f"- due {self.today - timedelta(days=2)}: 3\n"
+                f"- due {self.today - timedelta(days=1)}: 2"
+            ],
+        )
+
+    def test_crashed_shard_resumes_from_checkpoint(self):
+        chunks = []
+        overdue_chunk = overdue._overdue_chunk
+
+        def crash_after_first_chunk(shard, after, chunk_size):
+            if chunks and shard.start_id == self.ids[1]:
+                raise SystemExit("worker lost")
+            chunks.append(after)
+            return overdue_chunk(shard, after, chunk_size)
+
+        with patch("borrow.overdue._overdue_chunk", crash_after_first_chunk):
+            with self.assertRaises(SystemExit):
+                scan_overdue_borrowings.apply()
+        shard = OverdueScanShard.objects.get(start_id=self.ids[1])
+        self.assertEqual(shard.last_id, self.ids[3])
+        self.assertEqual(sum(shard.overdue_by_due.values()), 2)
+        self.assertEqual(self.summary(), [])
+
+        with patch("borrow.overdue._overdue_chunk", side_effect=overdue_chunk) as read:
+            scan_overdue_borrowings.apply()
+        # The first shard carries on after its checkpoint
+        self.assertEqual(read.call_args_list[0].args[1], self.ids[3])
+        self.assertEqual(OverdueScan.objects.get().overdue, 5)
+        self.assertEqual(len(self.summary()), 1)
+
+    def test_rerun_does_not_resend_summary(self):
+        scan_overdue_borrowings.apply()
+        with patch("borrow.overdue._overdue_chunk") as read:
+            scan_overdue_borrowings.apply()
+        read.assert_not_called()
+        self.assertEqual(len(self.summary()), 1)
+
+    def test_nothing_overdue(self):
+        Borrowing.objects.update(actual_return_date=self.today)
+
+        result = scan_overdue_borrowings.apply().get()
+
+        self.assertEqual(result["shards"], 0)
+        self.assertEqual(self.summary(), ["No borrowings overdue today!"])
@@ -0,0 +1,277 @@
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from book.models import Book
+from borrow.models import BorrowerState, Borrowing
+from borrow.state import compute_states, payments_closed
+from payment.models import Payment
+from payment.service import open_payment
+from payment.stripe_client import reset_stripe_client
+from user.models import User
+
+
+@override_settings(STRIPE_CLIENT={"BACKEND": "payment.stripe_client.FakeStripeClient"})
+class BorrowerStateFlowTest(APITestCase):
+    def setUp(self):
+        reset_stripe_client(setting="STRIPE_CLIENT")
+        self.user = User.objects.create_user(email="reader@example.com")
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=5,
+            daily_fee="1.00",
+        )
+        self.today = timezone.now().date()
+
+    def state(self):
+        return BorrowerState.objects.get(pk=self.user.pk)
+
+    def assertStateMatchesSource(self):
+        state = self.state()
+        self.assertEqual(
+            (state.active_borrowing_id, state.open_fines, state.pending_payments),
+            compute_states([self.user.pk]).get(self.user.pk, (None, Decimal(0), 0)),
+        )
+
+    def test_borrow_and_overdue_return(self):
+        response = self.client.post(
+            reverse("borrowing:borrowing-list"),
+            {
+                "book": self.book.id,
+                "expected_return_date": self.today + timezone.timedelta(days=2),
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        borrowing = Borrowing.objects.get()
+        self.assertEqual(self.state().active_borrowing_id, borrowing.id)
+        self.assertEqual(self.state().pending_payments, 1)
+        self.assertStateMatchesSource()
+
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            expected_return_date=self.today - timezone.timedelta(days=3)
+        )
+        response = self.client.post(
+            reverse("borrowing:borrowing-return-book", args=[borrowing.id])
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        state = self.state()
+        self.assertIsNone(state.active_borrowing_id)
+        self.assertEqual(state.pending_payments, 2)
+        self.assertEqual(state.open_fines, Decimal("6.00"))
+        self.assertStateMatchesSource()
+
+    def test_bulk_flows(self):
+        staff = User.objects.create_user(email="staff@example.com", is_staff=True)
+        self.client.force_authenticate(user=staff)
+        payload = {
+            "borrowings": [
+                {
+                    "user": self.user.id,
+                    "book": self.book.id,
+                    "expected_return_date": self.today - timezone.timedelta(days=1),
+                }
+            ]
+        }
+        with patch("celery.canvas.group.apply_async"):
+            created = self.client.post(
+                reverse("borrowing:borrowing-bulk-create"), payload, format="json"
+            )
+            self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.state().active_borrowing_id, created.data[0]["id"])
+
+            # The state row alone rejects a second borrowing
+            again = self.client.post(
+                reverse("borrowing:borrowing-bulk-create"), payload, format="json"
+            )
+            self.assertEqual(again.status_code, status.HTTP_400_BAD_REQUEST)
+
+            returned = self.client.post(
+                reverse("borrowing:borrowing-bulk-return"),
+                {"borrowings": [created.data[0]["id"]]},
+                format="json",
+            )
+        self.assertEqual(returned.status_code, status.HTTP_200_OK)
+        self.assertIsNone(self.state().active_borrowing_id)
+        self.assertEqual(self.state().open_fines, Decimal("2.00"))
+        self.assertStateMatchesSource()
+
+    def open_fine(self, borrowing, amount="4.50"):
+        return open_payment(borrowing, Decimal(amount), Payment.TypeChoices.FINE)
+
+    def test_fine_for_user_without_state(self):
+        (borrowing,) = Borrowing.objects.bulk_create(
+            [
+                Borrowing(
+                    user=self.user,
+                    book=self.book,
+                    borrow_date=self.today,
+                    expected_return_date=self.today,
+                    actual_return_date=self.today,
+                )
+            ]
+        )
+        self.assertFalse(BorrowerState.objects.exists())
+
+        self.open_fine(borrowing)
+
+        self.assertEqual(self.state().open_fines, Decimal("4.50"))
+        self.assertEqual(self.state().pending_payments, 1)
+        self.assertStateMatchesSource()
+
+    def test_borrowing_saved_outside_the_flows(self):
+        borrowing = Borrowing.objects.create(
+            user=self.user, book=self.book, expected_return_date=self.today
+        )
+        self.assertEqual(self.state().active_borrowing_id, borrowing.id)
+
+        borrowing.actual_return_date = self.today
+        borrowing.save()
+        self.assertIsNone(self.state().active_borrowing_id)
+
+    def test_deletes_uncount_unpaid_payments(self):
+        other_book = Book.objects.create(
+            title="Other Book",
+            author="Other Author",
+            cover=Book.CoverChoices.SOFT,
+            inventory=5,
+            daily_fee="1.00",
+        )
+        returned = Borrowing.objects.create(
+            user=self.user,
+            book=other_book,
+            expected_return_date=self.today,
+            actual_return_date=self.today,
+        )
+        active = Borrowing.objects.create(
+            user=self.user, book=self.book, expected_return_date=self.today
+        )
+        discarded = self.open_fine(returned, "1.00")
+        self.open_fine(returned, "2.00")
+        self.open_fine(active)
+        paid = self.open_fine(active, "8.00")
+        Payment.objects.filter(pk=paid.pk).update(status=Payment.StatusChoices.PAID)
+        payments_closed([paid])
+        self.assertEqual(self.state().pending_payments, 3)
+
+        discarded.delete()
+        self.assertEqual(self.state().open_fines, Decimal("6.50"))
+        self.assertStateMatchesSource()
+
+        # A borrowing deleted on its own, and one taken with its book
+        active.delete()
+        self.assertIsNone(self.state().active_borrowing_id)
+        self.assertEqual(self.state().open_fines, Decimal("2.00"))
+        self.assertStateMatchesSource()
+        other_book.delete()
+        self.assertEqual(self.state().open_fines, Decimal("0.00"))
+        self.assertEqual(self.state().pending_payments, 0)
+        self.assertStateMatchesSource()
+
+    def test_profile_shows_state(self):
+        response = self.client.get(reverse("user:manage"))
+        self.assertEqual(
+            response.data["borrowing_state"],
+            {"active_borrowing": None, "open_fines": "0.00", "pending_payments": 0},
+        )
+
+        borrowing = Borrowing.objects.create(
+            user=self.user, book=self.book, expected_return_date=self.today
+        )
+        BorrowerState.objects.filter(pk=self.user.pk).update(
+            open_fines="4.50", pending_payments=2
+        )
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("user:manage"))
+        self.assertEqual(
+            response.data["borrowing_state"],
+            {
+                "active_borrowing": borrowing.id,
+                "open_fines": "4.50",
+                "pending_payments": 2,
+            },
+        )
+
+
+class RepairBorrowerStateCommandTest(APITestCase):
+    def setUp(self):
+        self.readers = [
+            User.objects.create_user(email=f"reader{i}@example.com") for i in range(3)
+        ]
+        book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=5,
+            daily_fee="1.00",
+        )
+        today = timezone.now().date()
+        # Rows written behind the state's back: bulk_create sends no signals
+        self.active, returned = Borrowing.objects.bulk_create(
+            [
+                Borrowing(
+                    user=self.readers[0],
+                    book=book,
+                    borrow_date=today,
+                    expected_return_date=today,
+                ),
+                Borrowing(
+                    user=self.readers[1],
+                    book=book,
+                    borrow_date=today,
+                    expected_return_date=today,
+                    actual_return_date=today,
+                ),
+            ]
+        )
+        Payment.objects.bulk_create(
+            [
+                Payment(
+                    borrowing=returned,
+                    type=Payment.TypeChoices.FINE,
+                    money_to_pay="3.00",
+                )
+            ]
+        )
+        # A stale row for a user with nothing left
+        BorrowerState.objects.create(user=self.readers[2], pending_payments=4)
+
+    def repair(self, *args):
+        out = StringIO()
+        call_command("repair_borrower_state", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_changes_nothing(self):
+        output = self.repair("--dry-run")
+        self.assertIn("Would repair 3", output)
+        self.assertEqual(BorrowerState.objects.count(), 1)
+
+    def test_repair(self):
+        output = self.repair("--batch-size", "2")
+        self.assertIn("Checked 3 users. Repaired 3", output)
+        states = {
+            state.pk: (
+                state.active_borrowing_id,
+                state.open_fines,
+                state.pending_payments,
+            )
+            for state in BorrowerState.objects.all()
+        }
+        self.assertEqual(
+            states,
+            {
+                self.readers[0].pk: (self.active.pk, Decimal("0.00"), 0),
+                self.readers[1].pk: (None, Decimal("3.00"), 1),
+                self.readers[2].pk: (None, Decimal("0.00"), 0),
+            },
+        )
+        self.assertIn("Repaired 0.", self.repair())
@@ -1,12 +1,27 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from borrow.views import BorrowingViewSet
+from borrow.views import (
+    BorrowingCreateAsyncView,
+    BorrowingReturnAsyncView,
+    BorrowingViewSet,
+)
 
 app_name = "borrowing"
 
 router = routers.DefaultRouter()
 router.register("", BorrowingViewSet, basename="borrowing")
 urlpatterns = [
+    # Async variants of create and return_book, for ASGI deployments
+    path(
+        "async/",
+        BorrowingCreateAsyncView.as_view(),
+        name="borrowing-create-async",
+    ),
+    path(
+        "async/<int:pk>/return/",
+        BorrowingReturnAsyncView.as_view(),
+        name="borrowing-return-async",
+    ),
     path("", include(router.urls)),
 ]
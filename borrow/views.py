@@ -1,27 +1,68 @@
+from collections import Counter
+
+import stripe
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from rest_framework.exceptions import ValidationError
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
 
+from book.models import Book
+from borrow.exports import BORROWING_EXPORT_COLUMNS, borrowings_for_export
 from borrow.models import Borrowing
 from borrow.serializers import (
+    BorrowingAsyncCreateSerializer,
+    BorrowingBulkCreateSerializer,
+    BorrowingBulkReturnSerializer,
     BorrowingCreateSerializer,
+    BorrowingExportSerializer,
     BorrowingReturnSerializer,
     BorrowingListSerializer,
     BorrowingDetailSerializer,
 )
-from borrow.telegram_utils import send_telegram_message
+from borrow.notifications import (
+    aenqueue_notification,
+    enqueue_notification,
+    enqueue_notifications,
+)
+from borrow.services import (
+    ActiveBorrowingExists,
+    BookOutOfStock,
+    create_borrowing,
+    release_book,
+    release_books,
+    reserve_books,
+    return_borrowing,
+)
+from borrow.state import borrowings_opened, borrowings_returned
+from library_service.asyncapi import AsyncAPIView
+from library_service.expand import ExpandableQuerysetMixin
+from library_service.exports import export_response
+from library_service.values import ValuesListMixin
 from payment.models import Payment
-from payment.service import calculate_fine, create_payment_session
-from payment.views import CreatePaymentSessionView
+from payment.fees import amount_due_for, annotate_fees
+from payment.service import (
+    arequest_payment_session,
+    calculate_fine,
+    calculate_total_price,
+    request_payment_session,
+    schedule_payment_sessions,
+)
+from payment.views import CreatePaymentSessionAsyncView
 
 
-class BorrowingViewSet(viewsets.ModelViewSet):
+class BorrowingViewSet(ExpandableQuerysetMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Borrowing.objects.all()
     permission_classes = [IsAuthenticated]
+    throttle_scope = "borrowing"
+
+    def use_values_list(self):
+        expand, fields = self.get_expansion()
+        return not expand and not fields
 
     def get_serializer_class(self):
         if self.action == "create":
@@ -30,6 +71,10 @@ class BorrowingViewSet(viewsets.ModelViewSet):
             return BorrowingReturnSerializer
         elif self.action == "retrieve":
             return BorrowingDetailSerializer
+        elif self.action == "bulk_create":
+            return BorrowingBulkCreateSerializer
+        elif self.action == "bulk_return":
+            return BorrowingBulkReturnSerializer
         return BorrowingListSerializer
 
     def filter_queryset(self, queryset):
@@ -45,33 +90,33 @@ class BorrowingViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         user = self.request.user
-        active_borrowings = Borrowing.objects.filter(
-            user=user, actual_return_date__isnull=True
-        )
-
-        if active_borrowings.exists():
+        book = serializer.validated_data["book"]
+        try:
+            instance = serializer.instance = create_borrowing(
+                user, book, serializer.validated_data["expected_return_date"]
+            )
+        except ActiveBorrowingExists:
             raise ValidationError(
                 "You already have an active borrowing. Please return the current book before borrowing a new one."
             )
-        book = serializer.validated_data["book"]
-        if book.inventory <= 0:
+        except BookOutOfStock:
             raise ValidationError("The book is currently out of stock.")
 
-        book.inventory -= 1
-        book.save()
-
-        instance = serializer.save(user=user)
         message = f"New borrowing created:\nUser: {instance.user.id}\nUser: {instance.user.email}\nBook: {instance.book.title}"
-        result = send_telegram_message(message)
-        if not result["success"]:
-            print(f"Failed to send Telegram message: {result['message']}")
-
-        payment_view = CreatePaymentSessionView.as_view()
-        request = self.request._request
-        response = payment_view(request, pk=instance.id)
+        enqueue_notification(message)
 
-        if response.status_code != 200:
+        # Through the service, not the view: the "payments" throttle scope
+        # must not reject (and roll back) a borrowing that already succeeded
+        try:
+            request_payment_session(
+                borrowing=instance,
+                amount=calculate_total_price(instance),
+                payment_type=Payment.TypeChoices.PAYMENT,
+                request=self.request,
+            )
+        except stripe.error.StripeError:
             instance.delete()
+            release_book(book.pk)
             raise ValidationError("Failed to create Stripe payment session.")
         return instance
 
@@ -79,18 +124,13 @@ class BorrowingViewSet(viewsets.ModelViewSet):
     def return_book(self, request, pk=None):
         borrowing = self.get_object()
 
-        # Set the actual return date
-        borrowing.actual_return_date = timezone.now().date()
-        borrowing.save()
-
-        # Update the book inventory
-        borrowing.book.inventory += 1
-        borrowing.book.save()
+        if not return_borrowing(borrowing, timezone.now().date()):
+            raise ValidationError("This book has already been returned.")
 
         # Calculate fine if the book is overdue
         fine = calculate_fine(borrowing)
         if fine > 0:
-            create_payment_session(
+            request_payment_session(
                 borrowing=borrowing,
                 amount=fine,
                 payment_type=Payment.TypeChoices.FINE,
@@ -108,3 +148,215 @@ class BorrowingViewSet(viewsets.ModelViewSet):
         return Response(
             {"message": "Book returned successfully."}, status=status.HTTP_200_OK
         )
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk",
+        permission_classes=[IsAdminUser],
+    )
+    def bulk_create(self, request):
+        """Create many borrowings in one transaction (staff only).
+
+        Inventory is reserved with one update per book, borrowings and
+        their payments are inserted with ``bulk_create`` and the Stripe
+        sessions are opened in the background.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data["borrowings"]
+        today = timezone.now().date()
+
+        with transaction.atomic():
+            try:
+                reserve_books(Counter(item["book"].pk for item in items))
+            except BookOutOfStock as error:
+                raise ValidationError(
+                    f"Book {error.args[0]} does not have enough copies in stock."
+                )
+            try:
+                borrowings = Borrowing.objects.bulk_create(
+                    Borrowing(borrow_date=today, **item) for item in items
+                )
+            except IntegrityError:
+                # A borrowing created since the serializer checked; leaving
+                # the block with an error rolls the reservations back
+                raise ValidationError("Some users already have an active borrowing.")
+            borrowings_opened(borrowings)
+            schedule_payment_sessions(
+                [(borrowing, amount_due_for(borrowing)) for borrowing in borrowings],
+                payment_type=Payment.TypeChoices.PAYMENT,
+                request=request,
+            )
+            enqueue_notifications(
+                f"New borrowing created:\nUser: {borrowing.user.id}\n"
+                f"User: {borrowing.user.email}\nBook: {borrowing.book.title}"
+                for borrowing in borrowings
+            )
+
+        return Response(
+            BorrowingListSerializer(borrowings, many=True).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=False, methods=["post"], url_path="bulk-return")
+    def bulk_return(self, request):
+        """Return many borrowings in one transaction; all or nothing.
+
+        Every listed borrowing must be active and visible to the caller.
+        Fines for the overdue ones are computed in SQL and their payment
+        sessions are created in one batch.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["borrowings"]
+        today = timezone.now().date()
+
+        with transaction.atomic():
+            # The same date for every row: one conditional UPDATE both
+            # stamps the returns and guards against double returns.
+            returned = (
+                self.filter_queryset(self.get_queryset())
+                .filter(pk__in=ids, actual_return_date__isnull=True)
+                .update(actual_return_date=today)
+            )
+            if returned != len(ids):
+                raise ValidationError(
+                    "Some borrowings do not exist or have already been returned."
+                )
+            borrowings_returned(ids)
+
+            borrowings = list(
+                annotate_fees(
+                    Borrowing.objects.filter(pk__in=ids).select_related("book"), today
+                )
+            )
+            release_books(Counter(borrowing.book_id for borrowing in borrowings))
+            payments = schedule_payment_sessions(
+                [
+                    (borrowing, borrowing.fine)
+                    for borrowing in borrowings
+                    if borrowing.fine > 0
+                ],
+                payment_type=Payment.TypeChoices.FINE,
+                request=request,
+            )
+
+        return Response(
+            {
+                "returned": returned,
+                "fines": [
+                    {
+                        "borrowing": payment.borrowing_id,
+                        "payment": payment.id,
+                        "amount": f"{payment.money_to_pay:.2f}",
+                    }
+                    for payment in payments
+                ],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """Stream borrowings as CSV or NDJSON (staff only).
+
+        Filters: ``date_from`` and ``date_to`` (borrow date), ``book`` and
+        ``status`` (active, returned or overdue).
+        """
+        params = BorrowingExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        export_format = params.validated_data.pop("export_format")
+        return export_response(
+            request,
+            borrowings_for_export(**params.validated_data),
+            BORROWING_EXPORT_COLUMNS,
+            export_format,
+            filename="borrowings",
+        )
+
+
+class BorrowingCreateAsyncView(AsyncAPIView):
+    """``BorrowingViewSet.create`` for ASGI.
+
+    The request holds no thread while Stripe opens the checkout session, so
+    one worker can keep many borrowings in flight.
+    """
+
+    throttle_scope = "borrowing"
+
+    async def post(self, request):
+        serializer = BorrowingAsyncCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        book_id = serializer.validated_data["book"]
+        user = request.user
+
+        book = await Book.objects.filter(pk=book_id).afirst()
+        if book is None:
+            raise ValidationError(
+                {"book": [f'Invalid pk "{book_id}" - object does not exist.']}
+            )
+        try:
+            instance = await sync_to_async(create_borrowing)(
+                user, book, serializer.validated_data["expected_return_date"]
+            )
+        except ActiveBorrowingExists:
+            raise ValidationError(
+                {"non_field_errors": ["You already have an active borrowing."]}
+            )
+        except BookOutOfStock:
+            raise ValidationError("The book is currently out of stock.")
+
+        await aenqueue_notification(
+            f"New borrowing created:\nUser: {user.id}\nUser: {user.email}\nBook: {book.title}"
+        )
+
+        response = await CreatePaymentSessionAsyncView().session_response(
+            request, instance
+        )
+        if response.status_code not in (status.HTTP_200_OK, status.HTTP_202_ACCEPTED):
+            await instance.adelete()
+            await sync_to_async(release_book)(book.pk)
+            raise ValidationError("Failed to create Stripe payment session.")
+
+        return self.respond(
+            BorrowingCreateSerializer(instance).data, status=status.HTTP_201_CREATED
+        )
+
+
+class BorrowingReturnAsyncView(AsyncAPIView):
+    """``BorrowingViewSet.return_book`` for ASGI."""
+
+    throttle_scope = "borrowing"
+
+    async def post(self, request, pk):
+        borrowings = Borrowing.objects.select_related("book")
+        if not request.user.is_staff:
+            # As filter_queryset: readers only see their active borrowings
+            borrowings = borrowings.filter(
+                user=request.user, actual_return_date__isnull=True
+            )
+        borrowing = await borrowings.filter(pk=pk).afirst()
+        if borrowing is None:
+            raise NotFound()
+
+        returned = await sync_to_async(return_borrowing)(
+            borrowing, timezone.now().date()
+        )
+        if not returned:
+            raise ValidationError("This book has already been returned.")
+
+        fine = calculate_fine(borrowing)
+        if fine > 0:
+            await arequest_payment_session(
+                borrowing=borrowing,
+                amount=fine,
+                payment_type=Payment.TypeChoices.FINE,
+                request=request,
+            )
+            return self.respond(
+                {
+                    "message": f"A fine of {fine} USD has been applied. Please pay using the provided session."
+                }
+            )
+        return self.respond({"message": "Book returned successfully."})
@@ -0,0 +1,162 @@
+"""Async views for endpoints that wait on the network.
+
+DRF's ``APIView`` is synchronous, so under ASGI every request still holds a
+worker thread until it finishes, including the time spent waiting on Stripe.
+``AsyncAPIView`` is a plain Django async view that reuses the parts of DRF
+that never block: JWT validation, serializers for field validation, the
+renderer and the exception types. The database is reached through the async
+ORM, and a request that is waiting on the network only holds a coroutine.
+Multi-statement writes that need a transaction still run in a thread with
+``sync_to_async``, as the async ORM has no ``atomic()``.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpResponse
+from django.utils.translation import gettext_lazy as _
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from library_service.renderers import FastJSONRenderer
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` with the user loaded through the async ORM."""
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            user = await self.user_model.objects.aget(
+                **{jwt_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if jwt_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                jwt_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+        return user
+
+
+class AsyncAPIView(View):
+    """
+    Async counterpart of an authenticated ``APIView`` that accepts JSON.
+
+    Handlers are ``async def`` methods named after the HTTP method. They get
+    the request with ``user`` set and the parsed body in ``request.data``,
+    return ``self.respond(data, status)`` and may raise DRF exceptions. Views
+    with no ``authentication_class`` are open to anonymous users.
+    """
+
+    http_method_names = ["post"]
+    authentication_class = AsyncJWTAuthentication
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = None
+    renderer_class = FastJSONRenderer
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token-authenticated like APIView, so not subject to CSRF checks
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        method = request.method.lower()
+        handler = None
+        if method in self.http_method_names:
+            handler = getattr(self, method, None)
+        try:
+            if handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            await self.authenticate(request)
+            # Throttles talk to the cache, which may be on the network
+            await sync_to_async(self.check_throttles)(request)
+            request.data = self.parse(request)
+            return await handler(request, *args, **kwargs)
+        except Http404:
+            return self.handle_exception(exceptions.NotFound())
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    async def authenticate(self, request):
+        if self.authentication_class is None:
+            request.user, request.auth = AnonymousUser(), None
+            return
+        result = await self.authentication_class().aauthenticate(request)
+        if result is None:
+            raise exceptions.NotAuthenticated()
+        request.user, request.auth = result
+
+    def check_throttles(self, request):
+        waits = [
+            throttle.wait()
+            for throttle in (cls() for cls in self.throttle_classes)
+            if not throttle.allow_request(request, self)
+        ]
+        if waits:
+            raise exceptions.Throttled(max(wait or 0 for wait in waits))
+
+    def parse(self, request):
+        if not request.body:
+            return {}
+        if request.content_type != "application/json":
+            raise exceptions.UnsupportedMediaType(request.content_type)
+        try:
+            return json.loads(request.body)
+        except ValueError as exc:
+            raise exceptions.ParseError(f"JSON parse error - {exc}")
+
+    def respond(self, data, status=status.HTTP_200_OK, headers=None):
+        return HttpResponse(
+            self.renderer_class().render(data),
+            content_type="application/json",
+            status=status,
+            headers=headers,
+        )
+
+    def handle_exception(self, exc):
+        headers = {}
+        if isinstance(
+            exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+        ):
+            # As APIView does for authenticators with a challenge
+            authentication_class = self.authentication_class or AsyncJWTAuthentication
+            headers["WWW-Authenticate"] = authentication_class().authenticate_header(
+                None
+            )
+        if getattr(exc, "wait", None):
+            headers["Retry-After"] = str(int(exc.wait))
+
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {"detail": exc.detail}
+        return self.respond(data, exc.status_code, headers)
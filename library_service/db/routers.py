@@ -0,0 +1,76 @@
+"""Read-replica routing for safe requests.
+
+``ReplicaReadMixin`` marks the handling of GET/HEAD/OPTIONS requests on a
+viewset; while that flag is set ``ReplicaRouter`` sends reads to one of the
+``DATABASE_REPLICAS`` aliases. Everything else - writes, reads issued by
+unsafe requests, reads inside ``atomic`` blocks and reads in a
+``primary_reads`` block - stays on the primary, so a request never reads rows
+older than those it has just written.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+def reading_from_replica():
+    return _replica_reads.get()
+
+
+@contextmanager
+def replica_reads():
+    """Route reads made inside the block to a replica when one is configured."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Keep reads made inside the block on the primary, even in a replica block."""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, "DATABASE_REPLICAS", ())
+        if (
+            not replicas
+            or not reading_from_replica()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """Serve a viewset's safe requests from the read replicas."""
+
+    replica_methods = ("GET", "HEAD", "OPTIONS")
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in self.replica_methods:
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,151 @@
+"""Sparse fieldsets and on-demand nesting for API responses.
+
+``?expand=book,user`` replaces the primary keys of the listed relations with
+nested objects and ``?fields=id,book.title`` limits the payload to the listed
+fields; dotted names reach into expanded relations (``expand=borrowing.book``,
+``fields=borrowing.book.title``). ``ExpandableQuerysetMixin`` turns the same
+parameters into ``select_related``/``only`` so the database is asked only for
+the joins and columns the response will contain.
+
+Serializers opt in through ``ExpandableFieldsMixin`` and two ``Meta`` options:
+``expandable_fields`` maps a relation to the serializer used when it is
+expanded and ``default_expand`` lists relations that are always nested.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+
+
+def parse_paths(value):
+    """Turn ``"id,book.title,book.author"`` into a tree of field names."""
+    tree = {}
+    for path in value.split(","):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        for part in path.split("."):
+            node = node.setdefault(part, {})
+    return tree
+
+
+def _expanded(meta, expand):
+    expandable = getattr(meta, "expandable_fields", {})
+    expanded = {name: {} for name in getattr(meta, "default_expand", ())}
+    expanded.update(expand)
+
+    unknown = sorted(set(expanded) - set(expandable))
+    if unknown:
+        raise ValidationError({"expand": f"Cannot expand: {', '.join(unknown)}."})
+    return expanded
+
+
+def _plan(serializer_class, expand, fields, prefix, related, columns):
+    meta = serializer_class.Meta
+    expanded = _expanded(meta, expand)
+
+    unknown = sorted(set(fields) - set(meta.fields))
+    if unknown:
+        raise ValidationError({"fields": f"Unknown fields: {', '.join(unknown)}."})
+
+    for name in fields or meta.fields:
+        try:
+            meta.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if name in expanded:
+            related.append(prefix + name)
+            _plan(
+                meta.expandable_fields[name],
+                expanded[name],
+                fields.get(name, {}),
+                f"{prefix}{name}__",
+                related,
+                columns,
+            )
+        else:
+            if fields.get(name):
+                path = f"{prefix}{name}".replace("__", ".")
+                raise ValidationError(
+                    {"fields": f"Expand {path} to select its fields."}
+                )
+            columns.append(prefix + name)
+
+
+def expansion_plan(serializer_class, expand, fields):
+    """
+    Validate ``expand``/``fields`` trees against ``serializer_class``.
+
+    Returns the ``select_related`` paths needed by the expanded relations and
+    the columns to pass to ``only()``, or ``None`` when every column is
+    wanted because no ``fields`` were requested.
+    """
+    related, columns = [], []
+    _plan(serializer_class, expand, fields, "", related, columns)
+    return related, (columns if fields else None)
+
+
+class ExpandableFieldsMixin:
+    """Serializer that nests ``Meta.expandable_fields`` and trims to ``fields``."""
+
+    def __init__(self, *args, expand=None, fields=None, **kwargs):
+        self._expand = expand or {}
+        self._only = fields or {}
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        for name, expand in _expanded(self.Meta, self._expand).items():
+            if self._only and name not in self._only:
+                continue
+            serializer_class = self.Meta.expandable_fields[name]
+            only = self._only.get(name, {})
+            if issubclass(serializer_class, ExpandableFieldsMixin):
+                nested = serializer_class(read_only=True, expand=expand, fields=only)
+            else:
+                nested = serializer_class(read_only=True)
+                for field_name in set(nested.fields) - set(only or nested.fields):
+                    del nested.fields[field_name]
+            fields[name] = nested
+
+        if self._only:
+            fields = {
+                name: field for name, field in fields.items() if name in self._only
+            }
+        return fields
+
+
+class ExpandableQuerysetMixin:
+    """Viewset support for ``?expand=``/``?fields=`` on ``expandable_actions``."""
+
+    expandable_actions = ("list", "retrieve")
+
+    def get_expansion(self):
+        if not hasattr(self, "_expansion"):
+            params = self.request.query_params
+            self._expansion = (
+                parse_paths(params.get("expand", "")),
+                parse_paths(params.get("fields", "")),
+            )
+        return self._expansion
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in self.expandable_actions:
+            return queryset
+
+        expand, fields = self.get_expansion()
+        related, columns = expansion_plan(self.get_serializer_class(), expand, fields)
+        if related:
+            queryset = queryset.select_related(*related)
+        if columns is not None:
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in self.expandable_actions:
+            expand, fields = self.get_expansion()
+            kwargs.setdefault("expand", expand)
+            kwargs.setdefault("fields", fields)
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,182 @@
+"""Streaming CSV and NDJSON exports of ``values_list()`` querysets.
+
+Rows are read through ``QuerySet.iterator()`` (a server-side cursor where
+the database has one) and encoded a chunk at a time, so an export holds
+one chunk of rows in memory whatever its size. ``export_response`` wraps
+the stream in a ``StreamingHttpResponse``; ``write_export`` writes it to a
+file for the management commands built on ``ExportCommand``.
+
+Under ASGI Django would drain a synchronous iterator into a list before
+sending it, so ASGI requests get an asynchronous iterator that fetches the
+next chunk in the thread that owns the request's database connection.
+"""
+
+import csv
+import datetime
+import decimal
+import io
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.management.base import BaseCommand
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speed-up
+    orjson = None
+
+CSV = "csv"
+NDJSON = "ndjson"
+EXPORT_FORMATS = (CSV, NDJSON)
+CONTENT_TYPES = {
+    CSV: "text/csv; charset=utf-8",
+    NDJSON: "application/x-ndjson; charset=utf-8",
+}
+
+
+class ExportParamsSerializer(serializers.Serializer):
+    """Query parameters shared by the export endpoints.
+
+    The format is ``export_format`` because DRF reserves ``format`` for
+    choosing a renderer.
+    """
+
+    export_format = serializers.ChoiceField(choices=EXPORT_FORMATS, default=CSV)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    book = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        date_from, date_to = attrs.get("date_from"), attrs.get("date_to")
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError(
+                {"date_to": "Must not be before date_from."}
+            )
+        return attrs
+
+
+def _default(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        # As the API renders decimals
+        return str(value)
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+
+def _dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default).decode()
+    return json.dumps(obj, default=_default, separators=(",", ":"))
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _csv_chunks(headers, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # Header of an empty export
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(headers, batches):
+    for batch in batches:
+        yield "".join(_dumps(dict(zip(headers, row))) + "\n" for row in batch)
+
+
+def export_chunks(queryset, columns, export_format, chunk_size=None):
+    """Encoded text of ``queryset``, one chunk of rows at a time.
+
+    ``columns`` is a sequence of ``(header, lookup)`` pairs; the lookups are
+    passed to ``values_list()``.
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+    headers = [header for header, _ in columns]
+    rows = queryset.values_list(*(lookup for _, lookup in columns)).iterator(
+        chunk_size=chunk_size
+    )
+    encode = _csv_chunks if export_format == CSV else _ndjson_chunks
+    return encode(headers, _batches(rows, chunk_size))
+
+
+async def _aiter_chunks(chunks):
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+def export_response(request, queryset, columns, export_format, filename):
+    # Pin the database now: routing hints such as replica reads only hold
+    # while the view runs, not while the response is being sent.
+    chunks = export_chunks(queryset.using(queryset.db), columns, export_format)
+    if isinstance(getattr(request, "_request", request), ASGIRequest):
+        chunks = _aiter_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[export_format])
+    response["Content-Disposition"] = (
+        f'attachment; filename="{filename}.{export_format}"'
+    )
+    return response
+
+
+def write_export(stream, queryset, columns, export_format):
+    """Write an export to a text ``stream``."""
+    for chunk in export_chunks(queryset, columns, export_format):
+        stream.write(chunk)
+
+
+class ExportCommand(BaseCommand):
+    """Base of the export commands.
+
+    Subclasses set ``columns`` and build the queryset from the parsed
+    options in ``get_queryset``.
+    """
+
+    columns = ()
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default=CSV)
+        parser.add_argument(
+            "--output", help="File to write to instead of standard output."
+        )
+        parser.add_argument("--date-from", type=datetime.date.fromisoformat)
+        parser.add_argument("--date-to", type=datetime.date.fromisoformat)
+        parser.add_argument("--book", type=int)
+
+    def get_queryset(self, options):
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        queryset = self.get_queryset(options)
+        if options["output"] is None:
+            write_export(
+                _Unterminated(self.stdout), queryset, self.columns, options["format"]
+            )
+            return
+        with open(options["output"], "w", encoding="utf-8", newline="") as stream:
+            write_export(stream, queryset, self.columns, options["format"])
+
+
+class _Unterminated:
+    """Passes chunks to an ``OutputWrapper`` without appending newlines."""
+
+    def __init__(self, wrapper):
+        self.wrapper = wrapper
+
+    def write(self, chunk):
+        self.wrapper.write(chunk, ending="")
@@ -0,0 +1,345 @@
+"""The Redis connection shared by caching and throttling.
+
+``get_redis()`` builds the client configured by ``REDIS_CLIENT`` once per
+process; redis-py clients are thread-safe and pool their connections.
+``FakeRedis`` is an in-process stand-in with the subset of commands this
+project uses, for tests and for running without a Redis server. Lua scripts
+cannot run in it, so every script that may be sent to it registers a Python
+twin with ``FakeRedis.script``; the twin runs under the client lock and is as
+atomic as ``EVALSHA`` on a real server.
+
+``RedisCache`` is Django's Redis cache backend on top of the same client.
+"""
+
+import fnmatch
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache.backends.redis import RedisCache as DjangoRedisCache
+from django.core.cache.backends.redis import RedisCacheClient
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULT_REDIS_CLIENT = {"BACKEND": "library_service.redis_client.FakeRedis"}
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode()
+    if isinstance(value, (int, float)):
+        return repr(value).encode()
+    raise TypeError(f"Invalid input of type {type(value).__name__!r}")
+
+
+class FakeScript:
+    def __init__(self, client, implementation):
+        self.client = client
+        self.implementation = implementation
+
+    def __call__(self, keys=(), args=(), client=None):
+        client = client or self.client
+        with client._lock:
+            return self.implementation(client, list(keys), list(args))
+
+
+class FakePipeline:
+    """Queues commands and runs them in one go, like a MULTI/EXEC pipeline."""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        with self.client._lock:
+            results = [
+                command(*args, **kwargs) for command, args, kwargs in self.commands
+            ]
+        self.commands = []
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.commands = []
+
+
+class FakeRedis:
+    """In-process Redis for one process: strings, sorted sets and scripts.
+
+    ``shared`` tells callers whether other processes see the same data;
+    only tests, which run in one process, set it.
+    """
+
+    scripts = {}
+
+    def __init__(self, clock=time.monotonic, shared=False):
+        self.clock = clock
+        self.shared = shared
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        return cls(**kwargs)
+
+    @classmethod
+    def script(cls, lua):
+        """Register the Python equivalent of the ``lua`` script."""
+
+        def register(implementation):
+            cls.scripts[lua] = implementation
+            return implementation
+
+        return register
+
+    def register_script(self, lua):
+        try:
+            return FakeScript(self, self.scripts[lua])
+        except KeyError:
+            raise NotImplementedError("FakeRedis has no twin for this script")
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def _live(self, key):
+        key = _encode(key)
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= self.clock():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key
+
+    def _string(self, key):
+        value = self._data.get(self._live(key))
+        if value is not None and not isinstance(value, bytes):
+            raise TypeError(
+                "WRONGTYPE Operation against a key holding the wrong kind of value"
+            )
+        return value
+
+    def _zset(self, key):
+        value = self._data.get(self._live(key))
+        if value is not None and not isinstance(value, dict):
+            raise TypeError(
+                "WRONGTYPE Operation against a key holding the wrong kind of value"
+            )
+        return value
+
+    # Keys
+
+    def ping(self):
+        return True
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(self._live(key) in self._data for key in keys)
+
+    def delete(self, *keys):
+        with self._lock:
+            deleted = 0
+            for key in keys:
+                key = self._live(key)
+                if self._data.pop(key, None) is not None:
+                    deleted += 1
+                self._expires.pop(key, None)
+            return deleted
+
+    def expire(self, key, seconds):
+        return self.pexpire(key, int(seconds * 1000))
+
+    def pexpire(self, key, milliseconds):
+        with self._lock:
+            key = self._live(key)
+            if key not in self._data:
+                return False
+            self._expires[key] = self.clock() + milliseconds / 1000
+            return True
+
+    def persist(self, key):
+        with self._lock:
+            key = self._live(key)
+            return self._expires.pop(key, None) is not None
+
+    def pttl(self, key):
+        with self._lock:
+            key = self._live(key)
+            if key not in self._data:
+                return -2
+            if key not in self._expires:
+                return -1
+            return int((self._expires[key] - self.clock()) * 1000)
+
+    def scan_iter(self, match=None, count=None):
+        with self._lock:
+            keys = [key for key in list(self._data) if self._live(key) in self._data]
+        if match is not None:
+            pattern = _encode(match).decode()
+            keys = [key for key in keys if fnmatch.fnmatchcase(key.decode(), pattern)]
+        return iter(keys)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            return True
+
+    # Strings
+
+    def get(self, key):
+        with self._lock:
+            return self._string(key)
+
+    def mget(self, keys, *args):
+        with self._lock:
+            return [self._string(key) for key in [*keys, *args]]
+
+    def set(self, key, value, ex=None, px=None, nx=False, xx=False):
+        with self._lock:
+            key = self._live(key)
+            exists = key in self._data
+            if (nx and exists) or (xx and not exists):
+                return None
+            self._data[key] = _encode(value)
+            self._expires.pop(key, None)
+            if ex is not None:
+                self._expires[key] = self.clock() + ex
+            elif px is not None:
+                self._expires[key] = self.clock() + px / 1000
+            return True
+
+    def mset(self, mapping):
+        with self._lock:
+            for key, value in mapping.items():
+                self.set(key, value)
+            return True
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            value = int(self._string(key) or 0) + amount
+            self._data[self._live(key)] = _encode(value)
+            return value
+
+    def incrby(self, key, amount=1):
+        return self.incr(key, amount)
+
+    def decr(self, key, amount=1):
+        return self.incr(key, -amount)
+
+    # Sorted sets
+
+    def zadd(self, key, mapping):
+        with self._lock:
+            members = self._zset(key)
+            if members is None:
+                members = self._data[self._live(key)] = {}
+            added = 0
+            for member, score in mapping.items():
+                member = _encode(member)
+                added += member not in members
+                members[member] = float(score)
+            return added
+
+    def zcard(self, key):
+        with self._lock:
+            return len(self._zset(key) or {})
+
+    def zrem(self, key, *members):
+        with self._lock:
+            zset = self._zset(key) or {}
+            removed = sum(
+                zset.pop(_encode(member), None) is not None for member in members
+            )
+            self._drop_if_empty(key)
+            return removed
+
+    def zremrangebyscore(self, key, min, max):
+        with self._lock:
+            zset = self._zset(key) or {}
+            low, high = float(min), float(max)
+            doomed = [member for member, score in zset.items() if low <= score <= high]
+            for member in doomed:
+                del zset[member]
+            self._drop_if_empty(key)
+            return len(doomed)
+
+    def zrange(self, key, start, end, withscores=False):
+        with self._lock:
+            ordered = sorted(
+                (self._zset(key) or {}).items(), key=lambda item: (item[1], item[0])
+            )
+        end = len(ordered) if end == -1 else end + 1
+        selected = ordered[start:end]
+        if withscores:
+            return selected
+        return [member for member, _ in selected]
+
+    def _drop_if_empty(self, key):
+        key = _encode(key)
+        if self._data.get(key) == {}:
+            del self._data[key]
+            self._expires.pop(key, None)
+
+
+_client = None
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        config = getattr(settings, "REDIS_CLIENT", DEFAULT_REDIS_CLIENT)
+        client_class = import_string(config["BACKEND"])
+        options = dict(config.get("OPTIONS", {}))
+        url = options.pop("url", None)
+        if url:
+            _client = client_class.from_url(url, **options)
+        else:
+            _client = client_class(**options)
+    return _client
+
+
+@receiver(setting_changed)
+def reset_redis(setting, **kwargs):
+    global _client
+    if setting == "REDIS_CLIENT":
+        _client = None
+
+
+class SharedRedisCacheClient(RedisCacheClient):
+    """Django's cache client, talking to ``get_redis()`` instead of its pools."""
+
+    def get_client(self, key=None, *, write=False):
+        return get_redis()
+
+
+class RedisCache(DjangoRedisCache):
+    """Django cache on the shared Redis client.
+
+    ``clear()`` only removes this cache's keys, as the database also holds
+    throttle windows and the catalog response cache.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self._class = SharedRedisCacheClient
+
+    def clear(self):
+        client = get_redis()
+        keys = list(client.scan_iter(match=f"{self.key_prefix}:*"))
+        if keys:
+            client.delete(*keys)
+        return True
@@ -10,10 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import importlib.util
 import os
 from datetime import timedelta
 from pathlib import Path
 import sys
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -86,12 +88,59 @@ WSGI_APPLICATION = "library_service.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE=postgresql switches from SQLite to PostgreSQL configured by the
+# POSTGRES_* variables. Connections persist for DB_CONN_MAX_AGE seconds, so
+# each worker thread reuses one connection instead of opening one per
+# request. Put PgBouncer in transaction mode in front of the server to share
+# connections between processes (DB_PGBOUNCER=1 disables server-side cursors,
+# which transaction pooling breaks). POSTGRES_REPLICA_HOSTS lists read
+# replicas; see library_service.db.routers.
+
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgresql":
+    postgres = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.getenv("POSTGRES_DB", "library"),
+        "USER": os.getenv("POSTGRES_USER", "library"),
+        "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
+        "PORT": os.getenv("POSTGRES_PORT", "5432"),
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
+        "DISABLE_SERVER_SIDE_CURSORS": os.getenv("DB_PGBOUNCER") == "1",
+        "OPTIONS": {
+            "connect_timeout": int(os.getenv("POSTGRES_CONNECT_TIMEOUT", "5")),
+        },
     }
-}
+    DATABASES = {
+        "default": {**postgres, "HOST": os.getenv("POSTGRES_HOST", "localhost")}
+    }
+    replica_hosts = os.getenv("POSTGRES_REPLICA_HOSTS", "")
+    for index, host in enumerate(filter(None, replica_hosts.split(","))):
+        DATABASES[f"replica_{index}"] = {
+            **postgres,
+            "HOST": host.strip(),
+            "TEST": {"MIRROR": "default"},
+        }
+else:
+    DATABASES = {
+        "default": {
+            # Adds journal_mode, synchronous and transaction_mode options
+            "ENGINE": "library_service.db.backends.sqlite3",
+            "NAME": os.getenv("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "0")),
+            "OPTIONS": {
+                # Seconds a connection waits for a lock before failing
+                "timeout": float(os.getenv("SQLITE_BUSY_TIMEOUT", "20")),
+                "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+                "synchronous": "NORMAL",
+                "transaction_mode": "IMMEDIATE",
+            },
+        }
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["library_service.db.routers.ReplicaRouter"]
 
 
 # Password validation
@@ -112,6 +161,43 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hasher for new passwords: "scrypt", "argon2" (needs argon2-cffi) or
+# "pbkdf2". Hashes from the others still verify, and hashes from another
+# algorithm or cost are replaced when their user logs in.
+PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "scrypt")
+_PASSWORD_HASHERS = {
+    "scrypt": "user.hashers.ScryptPasswordHasher",
+    "argon2": "user.hashers.Argon2PasswordHasher",
+    "pbkdf2": "user.hashers.PBKDF2PasswordHasher",
+}
+if PASSWORD_HASHER not in _PASSWORD_HASHERS:
+    raise ImproperlyConfigured(
+        f"PASSWORD_HASHER must be one of {', '.join(_PASSWORD_HASHERS)}."
+    )
+if PASSWORD_HASHER == "argon2" and importlib.util.find_spec("argon2") is None:
+    raise ImproperlyConfigured('PASSWORD_HASHER "argon2" needs argon2-cffi.')
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS.pop(PASSWORD_HASHER),
+    *_PASSWORD_HASHERS.values(),
+]
+# Django's defaults; lower them to trade hash strength for logins per core
+PASSWORD_HASHER_COST = {
+    "scrypt": {
+        "work_factor": int(os.getenv("SCRYPT_WORK_FACTOR", str(2**14))),
+        "block_size": int(os.getenv("SCRYPT_BLOCK_SIZE", "8")),
+        "parallelism": int(os.getenv("SCRYPT_PARALLELISM", "1")),
+    },
+    "argon2": {
+        "time_cost": int(os.getenv("ARGON2_TIME_COST", "2")),
+        "memory_cost": int(os.getenv("ARGON2_MEMORY_COST", "102400")),
+        "parallelism": int(os.getenv("ARGON2_PARALLELISM", "8")),
+    },
+    "pbkdf2": {"iterations": int(os.getenv("PBKDF2_ITERATIONS", "870000"))},
+}
+# Threads hashing for the async register and token views; defaults to one
+# per CPU
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or None
+
 
 AUTH_USER_MODEL = "user.User"
 
@@ -143,11 +229,25 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": [
+        # orjson-backed when installed, byte-compatible with JSONRenderer
+        "library_service.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    # Sliding windows in the shared Redis; views with a throttle_scope are
+    # limited per endpoint on top of the per-client rates
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "library_service.throttling.AnonSlidingWindowThrottle",
+        "library_service.throttling.UserSlidingWindowThrottle",
+        "library_service.throttling.ScopedSlidingWindowThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"anon": "100/day", "user": "100/day"},
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": os.getenv("THROTTLE_ANON", "100/day"),
+        "user": os.getenv("THROTTLE_USER", "100/day"),
+        "books": os.getenv("THROTTLE_BOOKS", "600/minute"),
+        "borrowing": os.getenv("THROTTLE_BORROWING", "120/minute"),
+        "payments": os.getenv("THROTTLE_PAYMENTS", "120/minute"),
+    },
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
@@ -170,6 +270,50 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=2),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": False,
+    # Adds the claims user.authentication.ClaimsJWTAuthentication reads
+    "TOKEN_OBTAIN_SERIALIZER": "user.serializers.ClaimsTokenObtainPairSerializer",
+}
+
+# Seconds a validated token is reused by ClaimsJWTAuthentication in one
+# process; a revoked token can be honoured this long elsewhere. 0 disables.
+JWT_CLAIMS_CACHE_TTL = int(os.getenv("JWT_CLAIMS_CACHE_TTL", "30"))
+
+# "manage.py test" and the benchmarks (which set DJANGO_TESTING=1)
+TESTING = sys.argv[1:2] == ["test"] or os.getenv("DJANGO_TESTING") == "1"
+
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+
+# Redis shared by the cache, the throttles and anything else that needs
+# cross-process state: REDIS_URL, or the Celery broker's server. Tests get
+# an in-process FakeRedis unless REDIS_URL is set; it shares nothing
+# between processes, so it is never the default elsewhere.
+if os.getenv("REDIS_URL") or not TESTING:
+    REDIS_CLIENT = {
+        "BACKEND": "redis.Redis",
+        "OPTIONS": {
+            "url": os.getenv("REDIS_URL", CELERY_BROKER_URL),
+            # Throttling fails open, so give up quickly on a dead server
+            "socket_timeout": 0.5,
+            "socket_connect_timeout": 0.5,
+            "health_check_interval": 30,
+        },
+    }
+else:
+    REDIS_CLIENT = {"BACKEND": "library_service.redis_client.FakeRedis"}
+
+CACHES = {
+    "default": {
+        "BACKEND": "library_service.redis_client.RedisCache",
+        "KEY_PREFIX": "cache",
+    }
+}
+
+# Versioned cache for BookViewSet reads, in the shared Redis so a write in
+# one process invalidates every worker. "book.cache.LocMemLRUBackend"
+# keeps it in memory instead, for a single process only.
+BOOK_RESPONSE_CACHE = {
+    "BACKEND": "book.cache.RedisBackend",
+    "TIMEOUT": 300,
 }
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -179,8 +323,19 @@ STRIPE_PUBLISHABLE_KEY = os.getenv("PUBLISHABLE_KEY")
 STRIPE_SECRET_KEY = os.getenv("SECRET_KEY")
 STRIPE_WEBHOOK_KEY = os.getenv("WEBHOOK_KEY")
 
+# "async" commits borrowings right away and opens Stripe sessions in Celery
+PAYMENT_SESSION_MODE = os.getenv("PAYMENT_SESSION_MODE", "sync")
+STRIPE_CLIENT = {"BACKEND": "payment.stripe_client.StripeClient"}
+
+# Fine per overdue day: (days - GRACE_DAYS) * (PER_DAY + daily_fee * multiplier)
+FINE_POLICY = {
+    "PER_DAY": os.getenv("FINE_PER_DAY", "2.00"),
+    "DAILY_FEE_MULTIPLIER": os.getenv("FINE_DAILY_FEE_MULTIPLIER", "0"),
+    "GRACE_DAYS": int(os.getenv("FINE_GRACE_DAYS", "0")),
+    "MAX_FINE": os.getenv("FINE_MAX") or None,
+}
+
 
-CELERY_BROKER_URL = "redis://localhost:6379/0"
 CELERY_RESULT_BACKEND = "redis://localhost:6379/0"
 CELERY_TIMEZONE = "Europe/Kiev"
 CELERY_TASK_TRACK_STARTED = True
@@ -188,3 +343,18 @@ CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
+CELERY_BEAT_SCHEDULE = {
+    "send-pending-notifications": {
+        "task": "borrow.tasks.send_pending_notifications",
+        "schedule": 10.0,
+    },
+    "process-stripe-events": {
+        "task": "payment.tasks.process_stripe_events",
+        "schedule": 5.0,
+    },
+}
+
+# Telegram messages are queued in borrow.Notification and delivered by
+# borrow.tasks.send_pending_notifications.
+NOTIFICATION_TRANSPORT = {"BACKEND": "borrow.notifications.TelegramBotTransport"}
+NOTIFICATION_RATE_LIMITS = {"global_per_second": 30, "per_chat_per_second": 1}
@@ -0,0 +1,150 @@
+"""Helpers for query-count regression tests.
+
+An ``Endpoint`` describes one API call; ``QueryCountHarness`` drives a list
+of them with real JWT authentication, recording the number of SQL
+statements and the time spent in SQL for each one, and compares the counts
+with a checked-in JSON baseline. Set ``UPDATE_QUERY_BASELINE=1`` to rewrite
+the baseline after an intentional change.
+
+``signed_stripe_event`` builds webhook requests that pass Stripe signature
+verification, for webhook tests and load scripts.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from django.db import connection
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    sql_time: float = 0.0
+    statements: list = field(default_factory=list)
+
+
+@contextmanager
+def capture_queries(using=connection):
+    stats = QueryStats()
+
+    def wrapper(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats.count += 1
+            stats.sql_time += time.perf_counter() - started
+            stats.statements.append(sql)
+
+    with using.execute_wrapper(wrapper):
+        yield stats
+
+
+@dataclass
+class Endpoint:
+    """One API call; ``path`` and ``data`` get the seeded fixtures."""
+
+    name: str
+    method: str
+    path: Callable
+    user: Optional[str] = "reader"
+    data: Optional[Callable] = None
+    expected_status: int = 200
+    # Read endpoints whose query count must not depend on the data volume
+    constant: bool = True
+
+
+class QueryCountHarness:
+    def __init__(self, baseline_path):
+        self.baseline_path = baseline_path
+        self.update = os.environ.get("UPDATE_QUERY_BASELINE") == "1"
+        self.baseline = {}
+        if os.path.exists(baseline_path):
+            with open(baseline_path) as baseline_file:
+                self.baseline = json.load(baseline_file)
+        self.results = {}
+
+    def client_for(self, user):
+        client = APIClient()
+        if user is not None:
+            client.credentials(
+                HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}"
+            )
+        return client
+
+    def call(self, endpoint, fixtures):
+        client = self.client_for(fixtures["users"].get(endpoint.user))
+        data = endpoint.data(fixtures) if endpoint.data else None
+        with capture_queries() as stats:
+            response = getattr(client, endpoint.method)(
+                endpoint.path(fixtures), data, format="json"
+            )
+        if response.status_code != endpoint.expected_status:
+            raise AssertionError(
+                f"{endpoint.name}: expected {endpoint.expected_status}, "
+                f"got {response.status_code}: {response.content[:500]!r}"
+            )
+        return stats
+
+    def record(self, endpoint, scale, stats):
+        self.results.setdefault(endpoint.name, {})[scale] = stats
+
+    def baseline_failures(self):
+        """Endpoints whose largest-scale count exceeds the baseline."""
+        failures = []
+        for name, by_scale in sorted(self.results.items()):
+            count = by_scale[max(by_scale)].count
+            allowed = self.baseline.get(name)
+            if allowed is None and not self.update:
+                failures.append(f"{name}: no baseline (measured {count} queries)")
+            elif allowed is not None and count > allowed:
+                failures.append(f"{name}: {count} queries, baseline allows {allowed}")
+        return failures
+
+    def growth_failures(self, endpoints):
+        failures = []
+        for endpoint in endpoints:
+            by_scale = self.results.get(endpoint.name, {})
+            if not endpoint.constant or len(by_scale) < 2:
+                continue
+            counts = {scale: stats.count for scale, stats in sorted(by_scale.items())}
+            if len(set(counts.values())) > 1:
+                failures.append(f"{endpoint.name}: query count grows {counts}")
+        return failures
+
+    def write_baseline(self):
+        baseline = {
+            name: by_scale[max(by_scale)].count
+            for name, by_scale in sorted(self.results.items())
+        }
+        with open(self.baseline_path, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+
+    def report(self):
+        lines = []
+        for name, by_scale in sorted(self.results.items()):
+            cells = ", ".join(
+                f"{scale} rows: {stats.count} queries / {stats.sql_time * 1000:.1f} ms"
+                for scale, stats in sorted(by_scale.items())
+            )
+            lines.append(f"{name}: {cells}")
+        return "\n".join(lines)
+
+
+def signed_stripe_event(event, secret, timestamp=None):
+    """Return ``(payload, signature_header)`` for posting ``event`` to the webhook."""
+    payload = json.dumps(event).encode()
+    timestamp = int(time.time() if timestamp is None else timestamp)
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256
+    ).hexdigest()
+    return payload, f"t={timestamp},v1={signature}"
@@ -0,0 +1,153 @@
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections, transaction
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework.views import APIView
+
+from book.cache import get_response_cache
+from book.models import Book
+from library_service.db.backends.sqlite3.base import DatabaseWrapper
+from library_service.db.routers import (
+    ReplicaRouter,
+    primary_reads,
+    reading_from_replica,
+    replica_reads,
+)
+from user.models import User
+
+CUSTOM_SQLITE = connection.settings_dict["ENGINE"] == (
+    "library_service.db.backends.sqlite3"
+)
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    @override_settings(DATABASE_REPLICAS=["replica_0"])
+    def test_reads_go_to_replica_only_inside_replica_reads(self):
+        self.assertIsNone(self.router.db_for_read(Book))
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Book), "replica_0")
+        self.assertIsNone(self.router.db_for_read(Book))
+        self.assertEqual(self.router.db_for_write(Book), "default")
+
+    @override_settings(DATABASE_REPLICAS=["replica_0"])
+    def test_reads_inside_atomic_block_stay_on_primary(self):
+        with replica_reads(), patch.object(
+            connections["default"], "in_atomic_block", True
+        ):
+            self.assertIsNone(self.router.db_for_read(Book))
+
+    @override_settings(DATABASE_REPLICAS=["replica_0"])
+    def test_primary_reads_override_replica_reads(self):
+        with replica_reads():
+            with primary_reads():
+                self.assertIsNone(self.router.db_for_read(Book))
+            self.assertEqual(self.router.db_for_read(Book), "replica_0")
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        with replica_reads():
+            self.assertIsNone(self.router.db_for_read(Book))
+
+    def test_only_primary_is_migrated(self):
+        self.assertTrue(self.router.allow_migrate("default", "book"))
+        self.assertFalse(self.router.allow_migrate("replica_0", "book"))
+
+
+@patch.object(APIView, "throttle_classes", ())
+class ReplicaReadViewTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@example.com", password="pass12345", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+
+    def route_flags(self, method, url, data=None):
+        flags = []
+
+        def db_for_read(router, model, **hints):
+            flags.append(reading_from_replica())
+
+        with patch.object(ReplicaRouter, "db_for_read", autospec=True) as read:
+            read.side_effect = db_for_read
+            response = getattr(self.client, method)(url, data)
+        return response, flags
+
+    def test_book_list_cache_miss_reads_from_primary(self):
+        get_response_cache().backend.clear()
+        response, flags = self.route_flags("get", reverse("books:book-list"))
+
+        # Stored under the current catalog version, so never from a replica
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(flags)
+        self.assertFalse(any(flags))
+
+    def test_book_create_stays_on_primary(self):
+        response, flags = self.route_flags(
+            "post",
+            reverse("books:book-list"),
+            {
+                "title": "Book",
+                "author": "Author",
+                "cover": "HARD",
+                "inventory": 1,
+                "daily_fee": "1.00",
+            },
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(any(flags))
+
+    def test_payment_list_reads_from_replica(self):
+        response, flags = self.route_flags("get", reverse("payments:payments-list"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(flags))
+
+
+@skipUnless(CUSTOM_SQLITE, "SQLite backend with WAL options")
+class SQLiteBackendTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_connection_pragmas(self):
+        options = connection.settings_dict["OPTIONS"]
+        self.assertEqual(self.pragma("busy_timeout"), options["timeout"] * 1000)
+        # 1 is NORMAL
+        self.assertEqual(self.pragma("synchronous"), 1)
+
+    def test_rejects_unknown_pragma_values(self):
+        wrapper = DatabaseWrapper(
+            {
+                **connection.settings_dict,
+                "OPTIONS": {"journal_mode": "fast"},
+            },
+            alias="invalid",
+        )
+
+        with self.assertRaisesMessage(ImproperlyConfigured, "journal_mode"):
+            wrapper.get_new_connection(wrapper.get_connection_params())
+
+
+@skipUnless(CUSTOM_SQLITE, "SQLite backend with WAL options")
+class SQLiteTransactionModeTest(TransactionTestCase):
+    def test_atomic_takes_write_lock_up_front(self):
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                Book.objects.exists()
+
+        self.assertEqual(queries.captured_queries[0]["sql"], "BEGIN IMMEDIATE")
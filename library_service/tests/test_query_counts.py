@@ -0,0 +1,318 @@
+import os
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.views import APIView
+
+from book.cache import get_response_cache
+from book.models import Book
+from borrow.models import Borrowing
+from library_service.testing import Endpoint, QueryCountHarness
+from payment.models import Payment
+from user.models import User
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "query_baseline.json")
+
+# Every read endpoint is measured at each scale; its query count must not
+# change between them, up to a thousand books, borrowings and payments.
+SCALES = (3, 30, 1000)
+
+READ_ENDPOINTS = [
+    Endpoint("books:list", "get", lambda f: reverse("books:book-list")),
+    Endpoint(
+        "books:list:search",
+        "get",
+        lambda f: reverse("books:book-list") + "?search=novel&in_stock=1",
+    ),
+    Endpoint("books:facets", "get", lambda f: reverse("books:book-facets")),
+    Endpoint(
+        "books:detail",
+        "get",
+        lambda f: reverse("books:book-detail", args=[f["book"].id]),
+    ),
+    Endpoint("borrowing:list", "get", lambda f: reverse("borrowing:borrowing-list")),
+    Endpoint(
+        "borrowing:list:staff",
+        "get",
+        lambda f: reverse("borrowing:borrowing-list"),
+        user="staff",
+    ),
+    Endpoint(
+        "borrowing:detail",
+        "get",
+        lambda f: reverse("borrowing:borrowing-detail", args=[f["active"].id]),
+    ),
+    Endpoint(
+        "borrowing:list:expand",
+        "get",
+        lambda f: reverse("borrowing:borrowing-list")
+        + "?expand=book,user&fields=id,book.title,user.email",
+        user="staff",
+    ),
+    Endpoint("payments:list", "get", lambda f: reverse("payments:payments-list")),
+    Endpoint(
+        "payments:list:expand",
+        "get",
+        lambda f: reverse("payments:payments-list")
+        + "?expand=borrowing.book&fields=id,status,borrowing.book.title",
+        user="staff",
+    ),
+    Endpoint(
+        "payments:list:staff",
+        "get",
+        lambda f: reverse("payments:payments-list"),
+        user="staff",
+    ),
+    Endpoint(
+        "payments:detail",
+        "get",
+        lambda f: reverse("payments:payments-detail", args=[f["payment"].id]),
+    ),
+    Endpoint(
+        "payments:outstanding",
+        "get",
+        lambda f: reverse("payments:payments-outstanding"),
+        user="staff",
+    ),
+    Endpoint(
+        "payments:success",
+        "get",
+        lambda f: reverse("payments:payment_success")
+        + f"?session_id={f['payment'].session_id}",
+    ),
+    Endpoint("user:me", "get", lambda f: reverse("user:manage")),
+]
+
+# Writes run once, after the reads, at the largest scale.
+WRITE_ENDPOINTS = [
+    Endpoint(
+        "books:create",
+        "post",
+        lambda f: reverse("books:book-list"),
+        user="staff",
+        data=lambda f: {
+            "title": "New Book",
+            "author": "Someone",
+            "cover": "HARD",
+            "inventory": 3,
+            "daily_fee": "1.25",
+        },
+        expected_status=status.HTTP_201_CREATED,
+    ),
+    Endpoint(
+        "books:update",
+        "patch",
+        lambda f: reverse("books:book-detail", args=[f["book"].id]),
+        user="staff",
+        data=lambda f: {"inventory": 9},
+    ),
+    Endpoint(
+        "borrowing:create",
+        "post",
+        lambda f: reverse("borrowing:borrowing-list"),
+        user="newcomer",
+        data=lambda f: {
+            "book": f["book"].id,
+            "expected_return_date": str(date.today() + timedelta(days=5)),
+        },
+        expected_status=status.HTTP_201_CREATED,
+    ),
+    Endpoint(
+        "borrowing:return",
+        "post",
+        lambda f: reverse("borrowing:borrowing-return-book", args=[f["active"].id]),
+    ),
+    Endpoint(
+        "borrowing:bulk-create",
+        "post",
+        lambda f: reverse("borrowing:borrowing-bulk-create"),
+        user="staff",
+        data=lambda f: {
+            "borrowings": [
+                {
+                    "user": user_id,
+                    "book": book_id,
+                    "expected_return_date": str(date.today() + timedelta(days=5)),
+                }
+                for user_id, book_id in zip(
+                    User.objects.filter(email__startswith="borrower")
+                    .order_by("id")
+                    .values_list("id", flat=True)[:5],
+                    Book.objects.order_by("id").values_list("id", flat=True)[:5],
+                )
+            ]
+        },
+        expected_status=status.HTTP_201_CREATED,
+    ),
+    Endpoint(
+        "borrowing:bulk-return",
+        "post",
+        lambda f: reverse("borrowing:borrowing-bulk-return"),
+        user="staff",
+        data=lambda f: {
+            "borrowings": list(
+                Borrowing.objects.filter(
+                    user__email__startswith="borrower", actual_return_date__isnull=True
+                ).values_list("id", flat=True)
+            )
+        },
+    ),
+    Endpoint(
+        "payments:cancel",
+        "post",
+        lambda f: reverse("payments:payment_cancel"),
+        data=lambda f: {"session_id": f["payment"].session_id},
+    ),
+    Endpoint(
+        "payments:webhook",
+        "post",
+        lambda f: reverse("payments:stripe-webhook"),
+        user=None,
+        data=lambda f: {"id": "evt_harness"},
+    ),
+    Endpoint(
+        "user:register",
+        "post",
+        lambda f: reverse("user:create"),
+        user=None,
+        data=lambda f: {"email": "fresh@example.com", "password": "freshpass123"},
+        expected_status=status.HTTP_201_CREATED,
+    ),
+    Endpoint(
+        "user:token",
+        "post",
+        lambda f: reverse("user:token_obtain_pair"),
+        user=None,
+        data=lambda f: {"email": "reader@example.com", "password": "password123"},
+    ),
+    Endpoint(
+        "user:update",
+        "patch",
+        lambda f: reverse("user:manage"),
+        data=lambda f: {"first_name": "Renamed"},
+    ),
+    Endpoint(
+        "books:delete",
+        "delete",
+        lambda f: reverse("books:book-detail", args=[f["book"].id]),
+        user="staff",
+        expected_status=status.HTTP_204_NO_CONTENT,
+    ),
+]
+
+
+@override_settings(
+    STRIPE_CLIENT={"BACKEND": "payment.stripe_client.FakeStripeClient"},
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+@patch.object(APIView, "throttle_classes", ())
+class EndpointQueryCountTest(TestCase):
+    """Query counts per endpoint must be flat and within the baseline."""
+
+    def seed(self):
+        users = {
+            "reader": User.objects.create_user(
+                email="reader@example.com", password="password123"
+            ),
+            "staff": User.objects.create_user(
+                email="staff@example.com", password="password123", is_staff=True
+            ),
+            "newcomer": User.objects.create_user(
+                email="newcomer@example.com", password="password123"
+            ),
+        }
+        self.fixtures = {"users": users, "scale": 0}
+
+    def grow(self, scale):
+        """Add books, borrowings and payments until there are ``scale`` of each."""
+        fixtures = self.fixtures
+        reader = fixtures["users"]["reader"]
+        # Bulk inserts keep the largest scale quick to seed
+        new = range(fixtures["scale"], scale)
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Novel {i}",
+                author=f"Author {i}",
+                cover=Book.CoverChoices.SOFT,
+                inventory=5,
+                daily_fee=1.00,
+            )
+            for i in new
+        )
+        borrowers = User.objects.bulk_create(
+            User(email=f"borrower{i}@example.com", password="!") for i in new
+        )
+        pairs = [
+            (i, book, user)
+            for i, book, borrower in zip(new, books, borrowers)
+            for user in (reader, borrower)
+        ]
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(
+                user=user,
+                book=book,
+                borrow_date=date.today() - timedelta(days=10),
+                expected_return_date=date.today() - timedelta(days=3),
+                actual_return_date=date.today(),
+            )
+            for _, book, user in pairs
+        )
+        Payment.objects.bulk_create(
+            Payment(
+                borrowing=borrowing,
+                session_url=f"https://checkout.stripe.test/{user.id}/{i}",
+                session_id=f"cs_{user.id}_{i}",
+                money_to_pay=5,
+            )
+            for (i, _, user), borrowing in zip(pairs, borrowings)
+        )
+        if books:
+            fixtures.setdefault("book", books[0])
+            fixtures.setdefault(
+                "payment", Payment.objects.filter(borrowing__user=reader).first()
+            )
+        if "active" not in fixtures:
+            fixtures["active"] = Borrowing.objects.create(
+                user=reader,
+                book=fixtures["book"],
+                expected_return_date=date.today() + timedelta(days=3),
+            )
+        fixtures["scale"] = scale
+
+    def test_query_counts(self):
+        harness = QueryCountHarness(BASELINE_PATH)
+        self.seed()
+
+        # Warm per-process caches (FTS5 probe, content types) so they do not
+        # count against the first scale.
+        self.grow(SCALES[0])
+        for endpoint in READ_ENDPOINTS:
+            harness.call(endpoint, self.fixtures)
+
+        for scale in SCALES:
+            self.grow(scale)
+            for endpoint in READ_ENDPOINTS:
+                get_response_cache().backend.clear()
+                harness.record(endpoint, scale, harness.call(endpoint, self.fixtures))
+
+        with patch("stripe.Webhook.construct_event") as construct_event:
+            construct_event.return_value = {
+                "id": "evt_harness",
+                "type": "checkout.session.completed",
+                "data": {"object": {"id": self.fixtures["payment"].session_id}},
+            }
+            for endpoint in WRITE_ENDPOINTS:
+                harness.record(
+                    endpoint, SCALES[-1], harness.call(endpoint, self.fixtures)
+                )
+
+        if harness.update:
+            harness.write_baseline()
+        failures = harness.growth_failures(READ_ENDPOINTS)
+        failures += harness.baseline_failures()
+        self.assertFalse(
+            failures, "\n".join(failures) + "\n\nMeasured:\n" + harness.report()
+        )
@@ -0,0 +1,237 @@
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book.cache import RedisBackend
+from book.models import Book
+from borrow.models import Borrowing
+from library_service.redis_client import FakeRedis, get_redis
+from library_service.throttling import (
+    AnonSlidingWindowThrottle,
+    ScopedSlidingWindowThrottle,
+    sliding_window,
+)
+from payment.models import Payment
+from payment.stripe_client import reset_stripe_client
+from user.models import User
+
+
+def throttle_rates(**rates):
+    return override_settings(
+        REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {
+                **settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"],
+                **rates,
+            },
+        }
+    )
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedisTest(SimpleTestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.redis = FakeRedis(clock=self.clock)
+
+    def test_strings_and_expiry(self):
+        self.redis.set("a", "1", ex=10)
+        self.assertEqual(self.redis.get("a"), b"1")
+        self.assertEqual(self.redis.incr("a"), 2)
+        self.assertIsNone(self.redis.set("a", "x", nx=True))
+        self.assertEqual(self.redis.pttl("a"), 10000)
+
+        self.clock.now += 10
+        self.assertIsNone(self.redis.get("a"))
+        self.assertEqual(self.redis.pttl("a"), -2)
+
+    def test_sorted_sets(self):
+        self.redis.zadd("z", {"b": 2, "a": 1, "c": 3})
+        self.assertEqual(self.redis.zrange("z", 0, 0, withscores=True), [(b"a", 1.0)])
+        self.assertEqual(self.redis.zremrangebyscore("z", "-inf", 2), 2)
+        self.assertEqual(self.redis.zrange("z", 0, -1), [b"c"])
+        self.redis.zrem("z", "c")
+        self.assertEqual(self.redis.exists("z"), 0)
+
+    def test_pipeline_and_scan(self):
+        with self.redis.pipeline() as pipe:
+            pipe.set("cache:1", "a").set("cache:2", "b").set("other", "c")
+            self.assertEqual(pipe.execute(), [True, True, True])
+        self.assertEqual(
+            sorted(self.redis.scan_iter(match="cache:*")), [b"cache:1", b"cache:2"]
+        )
+
+    def test_unknown_script_is_rejected(self):
+        with self.assertRaises(NotImplementedError):
+            self.redis.register_script("return 1")
+
+
+class SharedRedisCacheTest(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+
+    def test_django_cache_uses_shared_client(self):
+        cache.set("answer", 42)
+        self.assertEqual(cache.get("answer"), 42)
+        self.assertTrue(any(b"answer" in key for key in get_redis().scan_iter()))
+
+    def test_clear_keeps_other_keys(self):
+        cache.set("answer", 42)
+        get_redis().set("throttle:user:1", "x")
+        cache.clear()
+        self.assertIsNone(cache.get("answer"))
+        self.assertEqual(get_redis().get("throttle:user:1"), b"x")
+
+    def test_book_cache_defaults_to_shared_client(self):
+        self.assertIs(RedisBackend().client, get_redis())
+
+    @override_settings(
+        REDIS_CLIENT={
+            "BACKEND": "library_service.redis_client.FakeRedis",
+            "OPTIONS": {"url": "redis://cache.internal:6379/0"},
+        }
+    )
+    def test_client_rebuilt_on_setting_change(self):
+        client = get_redis()
+        self.assertIsInstance(client, FakeRedis)
+        self.assertIs(get_redis(), client)
+
+
+class SlidingWindowTest(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+
+    def test_limit_within_window(self):
+        self.assertEqual(sliding_window(self.redis, "k", 0, 1000, 2), (True, 0))
+        self.assertEqual(sliding_window(self.redis, "k", 400, 1000, 2), (True, 0))
+        self.assertEqual(sliding_window(self.redis, "k", 900, 1000, 2), (False, 100))
+        self.assertEqual(self.redis.zcard("k"), 2)
+
+    def test_window_slides(self):
+        sliding_window(self.redis, "k", 0, 1000, 2)
+        sliding_window(self.redis, "k", 400, 1000, 2)
+        # The first request has left the window, the second has not
+        self.assertEqual(sliding_window(self.redis, "k", 1000, 1000, 2), (True, 0))
+        self.assertEqual(sliding_window(self.redis, "k", 1100, 1000, 2), (False, 300))
+
+
+@throttle_rates(anon="2/minute")
+class SlidingWindowThrottleTest(SimpleTestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.request = self.anonymous_request("10.0.0.1")
+
+    def anonymous_request(self, address):
+        request = APIRequestFactory().get("/", REMOTE_ADDR=address)
+        request.user = AnonymousUser()
+        return request
+
+    def throttle(self, now):
+        throttle = AnonSlidingWindowThrottle()
+        throttle.timer = lambda: now
+        return throttle
+
+    def test_allows_rate_then_waits_for_oldest(self):
+        self.assertTrue(self.throttle(100).allow_request(self.request, None))
+        self.assertTrue(self.throttle(130).allow_request(self.request, None))
+        throttle = self.throttle(150)
+        self.assertFalse(throttle.allow_request(self.request, None))
+        self.assertEqual(throttle.wait(), 10)
+        self.assertTrue(self.throttle(160).allow_request(self.request, None))
+
+    def test_clients_are_counted_separately(self):
+        other = self.anonymous_request("10.0.0.2")
+        for _ in range(2):
+            self.throttle(100).allow_request(self.request, None)
+        self.assertTrue(self.throttle(100).allow_request(other, None))
+
+    def test_fails_open_when_redis_is_down(self):
+        with patch(
+            "library_service.throttling.sliding_window",
+            side_effect=RedisConnectionError,
+        ):
+            for _ in range(5):
+                self.assertTrue(self.throttle(100).allow_request(self.request, None))
+
+    def test_views_without_scope_are_not_limited(self):
+        view = type("View", (), {"throttle_scope": None})()
+        self.assertTrue(ScopedSlidingWindowThrottle().allow_request(self.request, view))
+
+
+class EndpointScopeTest(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="reader@example.com", password="password123"
+        )
+        self.client.force_authenticate(self.user)
+
+    @throttle_rates(user="100/minute", books="2/minute")
+    def test_scopes_are_limited_independently(self):
+        books = reverse("books:book-list")
+        for _ in range(2):
+            self.assertEqual(self.client.get(books).status_code, status.HTTP_200_OK)
+        response = self.client.get(books)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", response)
+
+        response = self.client.get(reverse("borrowing:borrowing-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @throttle_rates(user="100/minute", payments="1/minute")
+    @override_settings(
+        STRIPE_CLIENT={"BACKEND": "payment.stripe_client.FakeStripeClient"}
+    )
+    def test_borrowing_is_not_limited_by_the_payments_scope(self):
+        reset_stripe_client(setting="STRIPE_CLIENT")
+        book = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            cover=Book.CoverChoices.HARD,
+            inventory=5,
+            daily_fee="1.00",
+        )
+        for _ in range(2):
+            response = self.client.post(
+                reverse("borrowing:borrowing-list"),
+                {
+                    "book": book.id,
+                    "expected_return_date": date.today() + timedelta(days=2),
+                },
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            borrowing = Borrowing.objects.get(actual_return_date__isnull=True)
+            self.client.post(
+                reverse("borrowing:borrowing-return-book", args=[borrowing.id])
+            )
+        self.assertEqual(Payment.objects.count(), 2)
+
+    @throttle_rates(user="100/minute", borrowing="1/minute")
+    async def test_async_views_share_the_scope(self):
+        url = reverse("borrowing:borrowing-create-async")
+        headers = {"authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        first = await self.async_client.post(
+            url, {}, content_type="application/json", headers=headers
+        )
+        second = await self.async_client.post(
+            url, {}, content_type="application/json", headers=headers
+        )
+        self.assertNotEqual(first.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
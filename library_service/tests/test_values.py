@@ -0,0 +1,111 @@
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from book.models import Book
+from book.serializers import BookSerializer
+from borrow.models import Borrowing
+from borrow.serializers import BorrowingDetailSerializer, BorrowingListSerializer
+from library_service.renderers import FastJSONRenderer
+from library_service.values import values_serializer
+from payment.models import Payment
+from payment.serializers import PaymentSerializer
+from user.models import User
+
+
+class ValuesSerializerTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email="reader@example.com")
+        self.books = [
+            Book.objects.create(
+                title='Ünïcødé \u2028 "quoted" </script>',
+                author="Author\n\t",
+                cover=Book.CoverChoices.HARD,
+                inventory=0,
+                daily_fee="0.5",
+            ),
+            Book.objects.create(
+                title="Plain",
+                author="Author",
+                cover=Book.CoverChoices.SOFT,
+                inventory=1200,
+                daily_fee="123.78",
+            ),
+        ]
+        for book in self.books:
+            # Only the last one is still out: one active borrowing per user
+            borrowing = Borrowing.objects.create(
+                user=user,
+                book=book,
+                expected_return_date=date.today() + timedelta(days=3),
+                actual_return_date=None if book == self.books[-1] else date.today(),
+            )
+            Payment.objects.create(
+                borrowing=borrowing,
+                session_url="https://checkout.stripe.com/c/pay/cs_1",
+                session_id="",
+                money_to_pay="7.1",
+            )
+
+    def assertSameBytes(self, model, serializer_class):
+        queryset = model.objects.order_by("id")
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        compiled = values_serializer(serializer_class)
+        rows = compiled.many(compiled.values(queryset))
+
+        self.assertEqual(FastJSONRenderer().render(rows), expected)
+        self.assertEqual(JSONRenderer().render(rows), expected)
+
+    def test_output_matches_model_serializers(self):
+        self.assertSameBytes(Book, BookSerializer)
+        self.assertSameBytes(Borrowing, BorrowingListSerializer)
+        self.assertSameBytes(Payment, PaymentSerializer)
+
+    def test_nested_serializers_are_rejected(self):
+        with self.assertRaises(TypeError):
+            values_serializer(BorrowingDetailSerializer).mappers
+
+
+class FastJSONRendererTest(TestCase):
+    def test_matches_json_renderer(self):
+        data = {
+            "text": "line\u2028separator\u2029é\x01",
+            "date": date(2024, 2, 29),
+            1: [True, None, 3],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_falls_back_without_orjson(self):
+        with patch("library_service.renderers.orjson", None):
+            self.assertEqual(FastJSONRenderer().render({"a": 1}), b'{"a":1}')
+
+    def test_indent_uses_stdlib(self):
+        self.assertEqual(
+            FastJSONRenderer().render({"a": 1}, "application/json; indent=2"),
+            b'{\n  "a": 1\n}',
+        )
+
+
+class ValuesListEndpointTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="reader@example.com")
+        self.client.force_authenticate(user=self.user)
+        Book.objects.create(
+            title="Listed",
+            author="Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=2,
+            daily_fee="1.50",
+        )
+
+    def test_book_list_is_served_from_values(self):
+        with patch.object(
+            BookSerializer, "to_representation", side_effect=AssertionError
+        ):
+            response = self.client.get(reverse("books:book-list"))
+
+        self.assertEqual(response.data["results"][0]["daily_fee"], "1.50")
@@ -0,0 +1,126 @@
+"""Sliding-window rate limits kept in the shared Redis.
+
+DRF's throttles keep each client's request history in the default cache
+with a read-modify-write, so concurrent requests race and every process
+with its own cache counts separately. Here each window is a sorted set of
+request timestamps and the whole check - drop expired entries, count, add -
+is one Lua script, atomic on the server and shared by every worker.
+
+Rates are read from ``REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]`` per request,
+so ``override_settings`` applies to them. When Redis cannot be reached the
+request is let through: an outage of the limiter should not take down the
+API.
+"""
+
+import secrets
+
+from redis.exceptions import RedisError
+from rest_framework.settings import api_settings
+from rest_framework.throttling import (
+    AnonRateThrottle,
+    ScopedRateThrottle,
+    SimpleRateThrottle,
+    UserRateThrottle,
+)
+
+from library_service.redis_client import FakeRedis, get_redis
+
+# KEYS[1]: sorted set of request timestamps (ms) of one client and scope
+# ARGV: now (ms), window (ms), limit, unique member for this request
+# Returns {1, 0} when allowed, {0, ms until the oldest entry expires} if not
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - window)
+if redis.call("ZCARD", KEYS[1]) < limit then
+    redis.call("ZADD", KEYS[1], now, ARGV[4])
+    redis.call("PEXPIRE", KEYS[1], window)
+    return {1, 0}
+end
+local oldest = redis.call("ZRANGE", KEYS[1], 0, 0, "WITHSCORES")
+return {0, tonumber(oldest[2]) + window - now}
+"""
+
+
+@FakeRedis.script(SLIDING_WINDOW_SCRIPT)
+def _sliding_window(client, keys, args):
+    now, window, limit = (int(arg) for arg in args[:3])
+    client.zremrangebyscore(keys[0], "-inf", now - window)
+    if client.zcard(keys[0]) < limit:
+        client.zadd(keys[0], {args[3]: now})
+        client.pexpire(keys[0], window)
+        return [1, 0]
+    oldest = client.zrange(keys[0], 0, 0, withscores=True)
+    return [0, int(oldest[0][1]) + window - now]
+
+
+_scripts = {}
+
+
+def sliding_window(client, key, now_ms, window_ms, limit):
+    """Record a request in ``key`` if fewer than ``limit`` fall in the window.
+
+    Returns whether the request is allowed and, if not, the milliseconds
+    until the oldest request leaves the window.
+    """
+    try:
+        script = _scripts[type(client)]
+    except KeyError:
+        # The Script object caches the SHA and falls back to EVAL on NOSCRIPT
+        script = _scripts.setdefault(
+            type(client), client.register_script(SLIDING_WINDOW_SCRIPT)
+        )
+    allowed, retry_after_ms = script(
+        keys=[key],
+        args=[now_ms, window_ms, limit, f"{now_ms}:{secrets.token_hex(4)}"],
+        client=client,
+    )
+    return bool(allowed), int(retry_after_ms)
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """``SimpleRateThrottle`` with its history in a Redis sorted set."""
+
+    cache_format = "throttle:%(scope)s:%(ident)s"
+    retry_after = None
+
+    @property
+    def THROTTLE_RATES(self):
+        return api_settings.DEFAULT_THROTTLE_RATES
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        try:
+            allowed, retry_after_ms = sliding_window(
+                get_redis(),
+                self.key,
+                int(self.now * 1000),
+                self.duration * 1000,
+                self.num_requests,
+            )
+        except RedisError:
+            return True
+        self.retry_after = retry_after_ms / 1000
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class AnonSlidingWindowThrottle(AnonRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class UserSlidingWindowThrottle(UserRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class ScopedSlidingWindowThrottle(ScopedRateThrottle, SlidingWindowRateThrottle):
+    """Per-endpoint limits for views that set ``throttle_scope``."""
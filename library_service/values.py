@@ -0,0 +1,157 @@
+"""Read-only serialization straight from ``values()`` rows.
+
+Instantiating a ``ModelSerializer`` per object and walking its fields is the
+bulk of the CPU time on large list responses. ``ValuesSerializer`` inspects a
+serializer's fields once and compiles each into a ``(name, column, convert)``
+mapper, so a page of rows becomes a list of dicts with one dict lookup and at
+most one conversion per field. The output is identical to the serializer's
+``.data``; serializers with fields that cannot be read from a single column
+(nested serializers, method fields, dotted sources) are rejected when the
+mappers are compiled.
+
+``ValuesListMixin`` switches a viewset's ``list`` action to this path.
+"""
+
+import datetime
+import decimal
+from functools import cached_property
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Fields whose database value already is the representation DRF emits
+_PASSTHROUGH = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+)
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(
+        field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING
+    )
+    if (
+        not coerce_to_string
+        or field.localize
+        or field.normalize_output
+        or field.decimal_places is None
+    ):
+        return field.to_representation
+
+    # DecimalField.quantize() rebuilds the exponent and context per value
+    exponent = decimal.Decimal(".1") ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return "{:f}".format(
+            value.quantize(exponent, rounding=rounding, context=context)
+        )
+
+    return convert
+
+
+def _converter(field):
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        if field.pk_field is not None:
+            return field.pk_field.to_representation
+        return None
+    if isinstance(field, serializers.DateField) and not isinstance(
+        field, serializers.DateTimeField
+    ):
+        output_format = getattr(field, "format", api_settings.DATE_FORMAT)
+        if output_format is None:
+            return None
+        if output_format.lower() == ISO_8601:
+            return datetime.date.isoformat
+        return field.to_representation
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return field.to_representation
+    if isinstance(field, _PASSTHROUGH):
+        return None
+    raise TypeError(
+        f"{field.parent.__class__.__name__}.{field.field_name} "
+        f"({field.__class__.__name__}) cannot be read from values() rows."
+    )
+
+
+class ValuesSerializer:
+    """Compiled, read-only twin of a flat ``ModelSerializer``."""
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    @cached_property
+    def mappers(self):
+        mappers = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if "." in field.source or field.source == "*":
+                raise TypeError(
+                    f"{self.serializer_class.__name__}.{name} uses source "
+                    f"{field.source!r}, which is not a single column."
+                )
+            mappers.append((name, field.source, _converter(field)))
+        return tuple(mappers)
+
+    @property
+    def columns(self):
+        return tuple(column for _, column, _ in self.mappers)
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def to_representation(self, row):
+        data = {}
+        for name, column, convert in self.mappers:
+            value = row[column]
+            if convert is not None and value is not None:
+                value = convert(value)
+            data[name] = value
+        return data
+
+    def many(self, rows):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
+
+
+_compiled = {}
+
+
+def values_serializer(serializer_class):
+    """Return the shared ``ValuesSerializer`` for ``serializer_class``."""
+    try:
+        return _compiled[serializer_class]
+    except KeyError:
+        return _compiled.setdefault(
+            serializer_class, ValuesSerializer(serializer_class)
+        )
+
+
+class ValuesListMixin:
+    """Serve ``list`` from ``values()`` rows when ``use_values_list()`` allows."""
+
+    def use_values_list(self):
+        return True
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_values_list():
+            return super().list(request, *args, **kwargs)
+
+        serializer = values_serializer(self.get_serializer_class())
+        queryset = serializer.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.many(page))
+        return Response(serializer.many(queryset))
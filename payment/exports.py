@@ -0,0 +1,36 @@
+"""Payment export: columns and filters shared by the endpoint and command."""
+
+from .models import Payment
+
+PAYMENT_EXPORT_COLUMNS = (
+    ("id", "id"),
+    ("borrowing_id", "borrowing_id"),
+    ("user_email", "borrowing__user__email"),
+    ("book_id", "borrowing__book_id"),
+    ("borrow_date", "borrowing__borrow_date"),
+    ("type", "type"),
+    ("status", "status"),
+    ("money_to_pay", "money_to_pay"),
+    ("session_id", "session_id"),
+)
+
+
+def payments_for_export(
+    date_from=None, date_to=None, book=None, status=None, payment_type=None
+):
+    """Payments whose borrowing was made between the dates, both included.
+
+    Payments carry no date of their own; the borrowing's is the closest.
+    """
+    queryset = Payment.objects.order_by("id")
+    if date_from is not None:
+        queryset = queryset.filter(borrowing__borrow_date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(borrowing__borrow_date__lte=date_to)
+    if book is not None:
+        queryset = queryset.filter(borrowing__book_id=book)
+    if status is not None:
+        queryset = queryset.filter(status=status)
+    if payment_type is not None:
+        queryset = queryset.filter(type=payment_type)
+    return queryset
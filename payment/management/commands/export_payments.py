@@ -0,0 +1,22 @@
+from library_service.exports import ExportCommand
+from payment.exports import PAYMENT_EXPORT_COLUMNS, payments_for_export
+from payment.models import Payment
+
+
+class Command(ExportCommand):
+    help = "Stream payments as CSV or NDJSON."
+    columns = PAYMENT_EXPORT_COLUMNS
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--status", choices=Payment.StatusChoices.values)
+        parser.add_argument("--type", choices=Payment.TypeChoices.values)
+
+    def get_queryset(self, options):
+        return payments_for_export(
+            date_from=options["date_from"],
+            date_to=options["date_to"],
+            book=options["book"],
+            status=options["status"],
+            payment_type=options["type"],
+        )
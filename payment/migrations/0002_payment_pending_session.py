@@ -0,0 +1,36 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payment", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="payment",
+            name="session_id",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="session_url",
+            field=models.URLField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDING_SESSION", "Pending session"),
+                    ("PENDING", "Pending"),
+                    ("PAID", "Paid"),
+                ],
+                default="PENDING",
+                max_length=15,
+            ),
+        ),
+    ]
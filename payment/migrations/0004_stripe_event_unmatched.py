@@ -0,0 +1,26 @@
+# Generated by Django 5.0.7 on 2026-10-18 22:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payment", "0003_stripe_event_dedup"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="stripeevent",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDING", "Pending"),
+                    ("PROCESSED", "Processed"),
+                    ("UNMATCHED", "Unmatched"),
+                ],
+                default="PENDING",
+                max_length=9,
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-18 22:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payment", "0004_stripe_event_unmatched"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="payment",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDING_SESSION", "Pending session"),
+                    ("SESSION_FAILED", "Session failed"),
+                    ("PENDING", "Pending"),
+                    ("PAID", "Paid"),
+                ],
+                default="PENDING",
+                max_length=15,
+            ),
+        ),
+    ]
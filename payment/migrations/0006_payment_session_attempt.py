@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payment", "0005_payment_session_failed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="session_attempt",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
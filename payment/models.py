@@ -5,6 +5,9 @@ from django.utils.translation import gettext_lazy as _
 
 class Payment(models.Model):
     class StatusChoices(models.TextChoices):
+        PENDING_SESSION = "PENDING_SESSION", _("Pending session")
+        # Stripe kept failing; retried through the retry-session action
+        SESSION_FAILED = "SESSION_FAILED", _("Session failed")
         PENDING = "PENDING", _("Pending")
         PAID = "PAID", _("Paid")
 
@@ -16,14 +19,57 @@ class Payment(models.Model):
         Borrowing, on_delete=models.CASCADE, related_name="payments"
     )
     status = models.CharField(
-        max_length=7, choices=StatusChoices.choices, default=StatusChoices.PENDING
+        max_length=15, choices=StatusChoices.choices, default=StatusChoices.PENDING
     )
     type = models.CharField(
         max_length=7, choices=TypeChoices.choices, default=TypeChoices.PAYMENT
     )
-    session_url = models.URLField()
-    session_id = models.CharField(max_length=255)
+    session_url = models.URLField(blank=True)
+    session_id = models.CharField(max_length=255, blank=True, db_index=True)
     money_to_pay = models.DecimalField(max_digits=8, decimal_places=2)
+    # Part of the Stripe idempotency key: bumped whenever the session is
+    # given up on or retried, so Stripe does not replay the failed result
+    session_attempt = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Payments waiting for their session have no id yet
+            models.UniqueConstraint(
+                fields=["session_id"],
+                condition=~models.Q(session_id=""),
+                name="payment_unique_session_id",
+            )
+        ]
 
     def __str__(self):
         return f"{self.type} - {self.status}"
+
+
+class StripeEvent(models.Model):
+    """Webhook event accepted from Stripe, applied later by a worker.
+
+    The unique ``event_id`` makes redelivered and replayed events no-ops.
+    """
+
+    class StatusChoices(models.TextChoices):
+        PENDING = "PENDING", _("Pending")
+        PROCESSED = "PROCESSED", _("Processed")
+        # No payment has the session id yet
+        UNMATCHED = "UNMATCHED", _("Unmatched")
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    session_id = models.CharField(max_length=255, blank=True)
+    status = models.CharField(
+        max_length=9, choices=StatusChoices.choices, default=StatusChoices.PENDING
+    )
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="stripe_event_status_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
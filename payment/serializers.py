@@ -1,9 +1,12 @@
 from rest_framework import serializers
 
+from borrow.serializers import BorrowingListSerializer
+from library_service.expand import ExpandableFieldsMixin
+from library_service.exports import ExportParamsSerializer
 from payment.models import Payment
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = (
@@ -15,3 +18,11 @@ class PaymentSerializer(serializers.ModelSerializer):
             "session_id",
             "money_to_pay",
         )
+        expandable_fields = {"borrowing": BorrowingListSerializer}
+
+
+class PaymentExportSerializer(ExportParamsSerializer):
+    status = serializers.ChoiceField(
+        choices=Payment.StatusChoices.choices, required=False
+    )
+    type = serializers.ChoiceField(choices=Payment.TypeChoices.choices, required=False)
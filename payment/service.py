@@ -1,42 +1,27 @@
-from datetime import datetime
-from django.utils import timezone
-import stripe
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+import stripe
 
+from borrow.state import payments_opened
+from payment.fees import amount_due_for, fine_for
 from payment.models import Payment
-from django.urls import reverse
+from payment.stripe_client import get_stripe_client
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
 
 def calculate_total_price(borrowing):
-    borrow_date = borrowing.borrow_date
-    expected_return_date = borrowing.expected_return_date
-
-    if isinstance(borrow_date, datetime):
-        borrow_date = borrow_date.date()
-    if isinstance(expected_return_date, datetime):
-        expected_return_date = expected_return_date.date()
-
-    days_borrowed = (expected_return_date - borrow_date).days
-    daily_fee = borrowing.book.daily_fee
-
-    return days_borrowed * daily_fee
+    return amount_due_for(borrowing)
 
 
 def calculate_fine(borrowing):
-    if not borrowing.expected_return_date:
-        return 0
+    return fine_for(borrowing)
 
-    overdue_days = (timezone.now().date() - borrowing.expected_return_date).days
-    if overdue_days <= 0:
-        return 0  # No fine if not overdue
 
-    fine_per_day = 2  # This could be a configurable setting
-    return overdue_days * fine_per_day
-
-
-def create_payment_session(borrowing, amount, payment_type, request):
+def build_session_urls(request):
     success_url = (
         request.build_absolute_uri(reverse("payments:payment_success"))
         + "?session_id={CHECKOUT_SESSION_ID}"
@@ -45,33 +30,220 @@ def create_payment_session(borrowing, amount, payment_type, request):
         request.build_absolute_uri(reverse("payments:payment_cancel"))
         + "?session_id={CHECKOUT_SESSION_ID}"
     )
+    return success_url, cancel_url
+
+
+def idempotency_key(payment):
+    return f"payment-{payment.pk}-checkout-session-{payment.session_attempt}"
+
 
-    checkout_session = stripe.checkout.Session.create(
-        payment_method_types=["card"],
-        line_items=[
+def checkout_session_params(payment, success_url, cancel_url):
+    return {
+        "idempotency_key": idempotency_key(payment),
+        "payment_method_types": ["card"],
+        "line_items": [
             {
                 "price_data": {
                     "currency": "usd",
                     "product_data": {
-                        "name": f"{payment_type.title()} for Borrowing {borrowing.id}",
+                        "name": f"{payment.type.title()} for Borrowing {payment.borrowing_id}",
                     },
-                    "unit_amount": int(amount * 100),
+                    "unit_amount": int(payment.money_to_pay * 100),
                 },
                 "quantity": 1,
             }
         ],
-        mode="payment",
-        success_url=success_url,
-        cancel_url=cancel_url,
+        "mode": "payment",
+        "success_url": success_url,
+        "cancel_url": cancel_url,
+    }
+
+
+def open_checkout_session(payment, success_url, cancel_url):
+    """Create the Stripe session for a ``PENDING_SESSION`` payment.
+
+    The idempotency key is derived from the payment id and its session
+    attempt, so the task's retries after a timeout return the session
+    Stripe already created instead of a new one. Stripe replays errors for
+    a reused key too, so a new attempt after giving up gets a new key.
+    """
+    checkout_session = get_stripe_client().create_checkout_session(
+        **checkout_session_params(payment, success_url, cancel_url)
+    )
+    Payment.objects.filter(
+        pk=payment.pk, status=Payment.StatusChoices.PENDING_SESSION
+    ).update(
+        status=Payment.StatusChoices.PENDING,
+        session_url=checkout_session.url,
+        session_id=checkout_session.id,
+    )
+    payment.refresh_from_db()
+    return payment
+
+
+def open_payment(borrowing, amount, payment_type):
+    """Insert a ``PENDING_SESSION`` payment and count it as unpaid."""
+    with transaction.atomic():
+        payment = Payment.objects.create(
+            borrowing=borrowing,
+            status=Payment.StatusChoices.PENDING_SESSION,
+            type=payment_type,
+            money_to_pay=amount,
+        )
+        payments_opened([payment])
+    return payment
+
+
+def discard_payment(payment):
+    """Delete an unpaid payment whose session could not be opened.
+
+    ``borrow.signals`` uncounts it as the row is deleted.
+    """
+    payment.delete()
+
+
+def create_payment_session(borrowing, amount, payment_type, request):
+    """Create a payment and its Stripe session within the request."""
+    payment = open_payment(borrowing, amount, payment_type)
+    try:
+        return open_checkout_session(payment, *build_session_urls(request))
+    except stripe.error.StripeError:
+        discard_payment(payment)
+        raise
+
+
+def schedule_payment_session(borrowing, amount, payment_type, request):
+    """Create a ``PENDING_SESSION`` payment and open its session in Celery.
+
+    Clients poll the payment until ``session_url`` is filled in.
+    """
+    from payment.tasks import create_stripe_session
+
+    payment = open_payment(borrowing, amount, payment_type)
+    success_url, cancel_url = build_session_urls(request)
+    transaction.on_commit(
+        lambda: create_stripe_session.delay(payment.pk, success_url, cancel_url)
     )
+    return payment
+
+
+def session_failed(payment_id):
+    """Give up on the session of a ``PENDING_SESSION`` payment.
+
+    The payment is still owed; ``retry_payment_session`` tries again.
+    """
+    return Payment.objects.filter(
+        pk=payment_id, status=Payment.StatusChoices.PENDING_SESSION
+    ).update(
+        status=Payment.StatusChoices.SESSION_FAILED,
+        session_attempt=F("session_attempt") + 1,
+    )
+
+
+def retry_payment_session(payment, request):
+    """Open the session of a ``SESSION_FAILED`` payment again in Celery."""
+    from payment.tasks import create_stripe_session
+
+    success_url, cancel_url = build_session_urls(request)
+    with transaction.atomic():
+        retried = Payment.objects.filter(
+            pk=payment.pk, status=Payment.StatusChoices.SESSION_FAILED
+        ).update(
+            status=Payment.StatusChoices.PENDING_SESSION,
+            session_attempt=F("session_attempt") + 1,
+        )
+        if retried:
+            transaction.on_commit(
+                lambda: create_stripe_session.delay(payment.pk, success_url, cancel_url)
+            )
+    payment.refresh_from_db()
+    return payment
+
+
+def schedule_payment_sessions(charges, payment_type, request):
+    """Batch version of ``schedule_payment_session``.
 
-    payment = Payment.objects.create(
-        borrowing=borrowing,
+    ``charges`` is a list of ``(borrowing, amount)`` pairs. All payments are
+    inserted with one ``bulk_create`` and their sessions are opened by Celery
+    tasks dispatched together once the transaction commits; a batch never
+    waits on Stripe, whatever ``PAYMENT_SESSION_MODE`` is.
+    """
+    from celery import group
+
+    from payment.tasks import create_stripe_session
+
+    payments = Payment.objects.bulk_create(
+        Payment(
+            borrowing=borrowing,
+            status=Payment.StatusChoices.PENDING_SESSION,
+            type=payment_type,
+            money_to_pay=amount,
+        )
+        for borrowing, amount in charges
+    )
+    payments_opened(payments)
+    if payments:
+        success_url, cancel_url = build_session_urls(request)
+        signatures = group(
+            [
+                create_stripe_session.si(payment.pk, success_url, cancel_url)
+                for payment in payments
+            ]
+        )
+        transaction.on_commit(signatures.apply_async)
+    return payments
+
+
+def request_payment_session(borrowing, amount, payment_type, request):
+    """Open a payment session inline or in the background.
+
+    ``PAYMENT_SESSION_MODE = "async"`` takes the Stripe call out of the
+    request path.
+    """
+    if getattr(settings, "PAYMENT_SESSION_MODE", "sync") == "async":
+        return schedule_payment_session(borrowing, amount, payment_type, request)
+    return create_payment_session(borrowing, amount, payment_type, request)
+
+
+async def aopen_checkout_session(payment, success_url, cancel_url):
+    """Async ``open_checkout_session``; the event loop is free during the call."""
+    checkout_session = await get_stripe_client().acreate_checkout_session(
+        **checkout_session_params(payment, success_url, cancel_url)
+    )
+    await Payment.objects.filter(
+        pk=payment.pk, status=Payment.StatusChoices.PENDING_SESSION
+    ).aupdate(
         status=Payment.StatusChoices.PENDING,
-        type=payment_type,
         session_url=checkout_session.url,
         session_id=checkout_session.id,
-        money_to_pay=amount,
     )
+    await payment.arefresh_from_db()
+    return payment
+
 
+async def acreate_payment_session(borrowing, amount, payment_type, request):
+    # Short transactions in a thread; the Stripe call itself is awaited
+    payment = await sync_to_async(open_payment)(borrowing, amount, payment_type)
+    try:
+        return await aopen_checkout_session(payment, *build_session_urls(request))
+    except stripe.error.StripeError:
+        await sync_to_async(discard_payment)(payment)
+        raise
+
+
+async def aschedule_payment_session(borrowing, amount, payment_type, request):
+    from payment.tasks import create_stripe_session
+
+    payment = await sync_to_async(open_payment)(borrowing, amount, payment_type)
+    # No transaction to wait for: the payment row is already committed
+    await sync_to_async(create_stripe_session.delay)(
+        payment.pk, *build_session_urls(request)
+    )
     return payment
+
+
+async def arequest_payment_session(borrowing, amount, payment_type, request):
+    """Async ``request_payment_session``, for views served over ASGI."""
+    if getattr(settings, "PAYMENT_SESSION_MODE", "sync") == "async":
+        return await aschedule_payment_session(borrowing, amount, payment_type, request)
+    return await acreate_payment_session(borrowing, amount, payment_type, request)
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import stripe
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class StripeClient:
+    def create_checkout_session(self, idempotency_key=None, **params):
+        return stripe.checkout.Session.create(
+            idempotency_key=idempotency_key,
+            **params,
+        )
+
+    async def acreate_checkout_session(self, idempotency_key=None, **params):
+        # stripe-python sends async requests through httpx
+        return await stripe.checkout.Session.create_async(
+            idempotency_key=idempotency_key,
+            **params,
+        )
+
+
+class FakeStripeClient:
+    """Offline stand-in for Stripe, for tests and benchmarks.
+
+    ``delay`` seconds are slept per call to mimic network latency and the
+    first ``failures`` calls raise ``APIConnectionError``. Sessions are
+    remembered by idempotency key, as Stripe does.
+    """
+
+    def __init__(self, delay=0, failures=0):
+        self.delay = delay
+        self.failures = failures
+        self.calls = []
+        self.sessions = {}
+
+    def create_checkout_session(self, idempotency_key=None, **params):
+        self.calls.append(idempotency_key)
+        if self.delay:
+            time.sleep(self.delay)
+        return self._session(idempotency_key)
+
+    async def acreate_checkout_session(self, idempotency_key=None, **params):
+        self.calls.append(idempotency_key)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self._session(idempotency_key)
+
+    def _session(self, idempotency_key):
+        if self.failures > 0:
+            self.failures -= 1
+            raise stripe.error.APIConnectionError("Fake Stripe is unreachable")
+        if idempotency_key in self.sessions:
+            return self.sessions[idempotency_key]
+        session_id = f"cs_test_{len(self.sessions) + 1:08d}"
+        session = SimpleNamespace(
+            id=session_id, url=f"https://checkout.stripe.test/pay/{session_id}"
+        )
+        if idempotency_key is not None:
+            self.sessions[idempotency_key] = session
+        return session
+
+
+_client = None
+
+
+def get_stripe_client():
+    global _client
+    if _client is None:
+        config = getattr(
+            settings,
+            "STRIPE_CLIENT",
+            {"BACKEND": "payment.stripe_client.StripeClient"},
+        )
+        _client = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+    return _client
+
+
+@receiver(setting_changed)
+def reset_stripe_client(setting, **kwargs):
+    global _client
+    if setting == "STRIPE_CLIENT":
+        _client = None
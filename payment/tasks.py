@@ -0,0 +1,57 @@
+import time
+
+import stripe
+from celery import Task, shared_task
+from django.conf import settings
+
+from payment.models import Payment
+from payment.service import open_checkout_session, session_failed
+from payment.webhooks import process_events, requeue_unmatched_events
+
+TRANSIENT_STRIPE_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+    stripe.error.RateLimitError,
+)
+
+
+class StripeSessionTask(Task):
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        # Out of retries, or an error that retrying cannot fix
+        session_failed(args[0] if args else kwargs["payment_id"])
+
+
+@shared_task(
+    base=StripeSessionTask,
+    autoretry_for=TRANSIENT_STRIPE_ERRORS,
+    retry_backoff=2,
+    retry_backoff_max=300,
+    retry_jitter=True,
+    max_retries=8,
+)
+def create_stripe_session(payment_id, success_url, cancel_url):
+    payment = Payment.objects.filter(
+        pk=payment_id, status=Payment.StatusChoices.PENDING_SESSION
+    ).first()
+    if payment is None:
+        # Already opened by an earlier attempt, or the borrowing is gone
+        return None
+    payment = open_checkout_session(payment, success_url, cancel_url)
+    return payment.session_id
+
+
+@shared_task
+def process_stripe_events():
+    """Apply recorded webhook events in batches for up to a time budget."""
+    batch_size = getattr(settings, "STRIPE_EVENT_BATCH_SIZE", 1000)
+    budget = getattr(settings, "STRIPE_EVENT_DRAIN_SECONDS", 50)
+    deadline = time.monotonic() + budget
+    totals = {"events": 0, "payments": 0}
+    requeue_unmatched_events()
+    while time.monotonic() < deadline:
+        stats = process_events(batch_size)
+        for key, value in stats.items():
+            totals[key] += value
+        if stats["events"] < batch_size:
+            break
+    return totals
@@ -1,10 +1,26 @@
+import csv
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
-from payment.models import Payment
-from borrow.models import Borrowing
+from library_service.testing import signed_stripe_event
+from payment.fees import annotate_fees, outstanding_balance_report
+from payment.models import Payment, StripeEvent
+from payment.service import calculate_fine, calculate_total_price
+from borrow.models import BorrowerState, Borrowing
 from book.models import Book
+from payment.stripe_client import get_stripe_client, reset_stripe_client
+from payment.tasks import create_stripe_session, process_stripe_events
 from unittest.mock import patch
 
 User = get_user_model()
@@ -73,6 +89,7 @@ class PaymentTests(APITestCase):
     @patch("stripe.Webhook.construct_event")
     def test_payment_webhook_success(self, mock_construct_event):
         mock_construct_event.return_value = {
+            "id": "evt_1EXQWt2eZvKYlo2Cgo1lPKJY",
             "type": "checkout.session.completed",
             "data": {"object": {"id": self.payment.session_id}},
         }
@@ -88,14 +105,19 @@ class PaymentTests(APITestCase):
         response = self.client.post(
             url, data=payload, format="json", HTTP_STRIPE_SIGNATURE=sig_header
         )
-        self.payment.refresh_from_db()
-
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # The webhook only records the event; the worker applies it
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PENDING)
+        process_stripe_events.apply()
+        self.payment.refresh_from_db()
         self.assertEqual(self.payment.status, Payment.StatusChoices.PAID)
 
     @patch("stripe.Webhook.construct_event")
     def test_payment_webhook_failure(self, mock_construct_event):
         mock_construct_event.return_value = {
+            "id": "evt_1EXQWt2eZvKYlo2Cgo1lPKJY",
             "type": "checkout.session.completed",
             "data": {"object": {"id": "non_existent_session_id"}},  # does not exist ID
         }
@@ -112,4 +134,506 @@ class PaymentTests(APITestCase):
             url, data=payload, format="json", HTTP_STRIPE_SIGNATURE=sig_header
         )
 
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        # Unknown sessions are acknowledged so Stripe stops redelivering them
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(process_stripe_events.apply().get()["payments"], 0)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PENDING)
+
+    @override_settings(STRIPE_WEBHOOK_KEY="whsec_test")
+    def test_payment_webhook_rejects_bad_signature(self):
+        response = self.client.post(
+            reverse("payment:stripe-webhook"),
+            data={"id": "evt_forged"},
+            format="json",
+            HTTP_STRIPE_SIGNATURE="t=1,v1=forged",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+
+@override_settings(STRIPE_CLIENT={"BACKEND": "payment.stripe_client.FakeStripeClient"})
+class PaymentSessionTests(APITestCase):
+
+    def setUp(self):
+        reset_stripe_client(setting="STRIPE_CLIENT")
+        self.user = User.objects.create_user(
+            email="reader@example.com", password="password123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=5,
+            daily_fee=1.50,
+        )
+        self.borrow_payload = {
+            "book": self.book.id,
+            "expected_return_date": date.today() + timedelta(days=4),
+        }
+
+    def borrow(self):
+        return self.client.post(
+            reverse("borrowing:borrowing-list"), self.borrow_payload
+        )
+
+    def test_sync_mode_opens_session_in_request(self):
+        response = self.borrow()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        payment = Payment.objects.get(borrowing__user=self.user)
+        self.assertEqual(payment.status, Payment.StatusChoices.PENDING)
+        self.assertEqual(payment.money_to_pay, Decimal("6.00"))
+        self.assertTrue(payment.session_url.startswith("https://"))
+        self.assertEqual(
+            get_stripe_client().calls, [f"payment-{payment.id}-checkout-session-0"]
+        )
+
+    @override_settings(
+        PAYMENT_SESSION_MODE="async",
+        STRIPE_CLIENT={
+            "BACKEND": "payment.stripe_client.FakeStripeClient",
+            "OPTIONS": {"delay": 0.5},
+        },
+    )
+    def test_async_mode_does_not_wait_for_stripe(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            started = time.perf_counter()
+            response = self.borrow()
+            elapsed = time.perf_counter() - started
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(get_stripe_client().calls, [])
+
+        payment = Payment.objects.get(borrowing__user=self.user)
+        self.assertEqual(payment.status, Payment.StatusChoices.PENDING_SESSION)
+        self.assertEqual(payment.session_url, "")
+
+        detail_url = reverse("payment:payments-detail", args=[payment.id])
+        response = self.client.get(detail_url)
+        self.assertEqual(response.data["status"], Payment.StatusChoices.PENDING_SESSION)
+
+        with patch("payment.tasks.create_stripe_session.delay") as mock_delay:
+            for callback in callbacks:
+                callback()
+        args = mock_delay.call_args[0]
+        self.assertEqual(args[0], payment.id)
+        create_stripe_session.apply(args=args)
+
+        response = self.client.get(detail_url)
+        self.assertEqual(response.data["status"], Payment.StatusChoices.PENDING)
+        self.assertTrue(response.data["session_url"].startswith("https://"))
+
+    @override_settings(
+        STRIPE_CLIENT={
+            "BACKEND": "payment.stripe_client.FakeStripeClient",
+            "OPTIONS": {"failures": 2},
+        },
+    )
+    def test_task_retries_with_the_same_idempotency_key(self):
+        borrowing = Borrowing.objects.create(
+            user=self.user, book=self.book, expected_return_date=date.today()
+        )
+        payment = Payment.objects.create(
+            borrowing=borrowing,
+            status=Payment.StatusChoices.PENDING_SESSION,
+            money_to_pay=3,
+        )
+
+        result = create_stripe_session.apply(
+            args=(payment.id, "https://example.com/ok", "https://example.com/no")
+        )
+
+        payment.refresh_from_db()
+        self.assertEqual(result.get(), payment.session_id)
+        self.assertEqual(payment.status, Payment.StatusChoices.PENDING)
+        self.assertEqual(
+            get_stripe_client().calls,
+            [f"payment-{payment.id}-checkout-session-0"] * 3,
+        )
+
+    @override_settings(
+        STRIPE_CLIENT={
+            "BACKEND": "payment.stripe_client.FakeStripeClient",
+            "OPTIONS": {"failures": 9},
+        },
+    )
+    def test_session_failed_after_last_retry_can_be_retried(self):
+        borrowing = Borrowing.objects.create(
+            user=self.user, book=self.book, expected_return_date=date.today()
+        )
+        payment = Payment.objects.create(
+            borrowing=borrowing,
+            status=Payment.StatusChoices.PENDING_SESSION,
+            money_to_pay=3,
+        )
+
+        result = create_stripe_session.apply(
+            args=(payment.id, "https://example.com/ok", "https://example.com/no")
+        )
+
+        self.assertTrue(result.failed())
+        self.assertEqual(len(get_stripe_client().calls), 9)
+        detail_url = reverse("payment:payments-detail", args=[payment.id])
+        response = self.client.get(detail_url)
+        self.assertEqual(response.data["status"], Payment.StatusChoices.SESSION_FAILED)
+
+        retry_url = reverse("payment:payments-retry-session", args=[payment.id])
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(retry_url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], Payment.StatusChoices.PENDING_SESSION)
+        with patch("payment.tasks.create_stripe_session.delay") as mock_delay:
+            for callback in callbacks:
+                callback()
+        create_stripe_session.apply(args=mock_delay.call_args[0])
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.StatusChoices.PENDING)
+        # A fresh key, so Stripe does not replay the failures
+        key = f"payment-{payment.id}-checkout-session"
+        self.assertEqual(get_stripe_client().calls, [f"{key}-0"] * 9 + [f"{key}-2"])
+        response = self.client.post(retry_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_task_is_a_noop_once_session_exists(self):
+        borrowing = Borrowing.objects.create(
+            user=self.user, book=self.book, expected_return_date=date.today()
+        )
+        payment = Payment.objects.create(
+            borrowing=borrowing,
+            session_url="http://example.com/session",
+            session_id="sess_done",
+            money_to_pay=3,
+        )
+        create_stripe_session.apply(args=(payment.id, "", ""))
+        self.assertEqual(get_stripe_client().calls, [])
+
+
+class FeeEngineTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@example.com", password="password123", is_staff=True
+        )
+        self.reader = User.objects.create_user(
+            email="reader@example.com", password="password123"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=5,
+            daily_fee="1.25",
+        )
+        self.today = date.today()
+        # (user, days since borrowing, days until due, returned days ago)
+        for user, borrowed, due, returned in (
+            (self.reader, 10, -4, None),
+            (self.reader, 20, -15, 5),
+            (self.admin, 3, 7, None),
+            (self.admin, 30, -1, 1),
+        ):
+            borrowing = Borrowing.objects.create(
+                user=user,
+                book=self.book,
+                expected_return_date=self.today + timedelta(days=due),
+                actual_return_date=(
+                    None if returned is None else self.today - timedelta(days=returned)
+                ),
+            )
+            Borrowing.objects.filter(pk=borrowing.pk).update(
+                borrow_date=self.today - timedelta(days=borrowed)
+            )
+
+    def assertAnnotationsMatchWrappers(self):
+        borrowings = annotate_fees(
+            Borrowing.objects.select_related("book").order_by("id"), self.today
+        )
+        with self.assertNumQueries(1):
+            annotated = list(borrowings)
+        for row in annotated:
+            plain = Borrowing.objects.select_related("book").get(pk=row.pk)
+            self.assertEqual(row.amount_due, calculate_total_price(plain))
+            self.assertEqual(row.fine, calculate_fine(plain))
+        return annotated
+
+    def test_default_policy_matches_wrappers(self):
+        rows = self.assertAnnotationsMatchWrappers()
+        self.assertEqual([row.overdue_days for row in rows], [4, 10, 0, 0])
+        self.assertEqual([row.fine for row in rows], [8, 20, 0, 0])
+        self.assertEqual(rows[0].amount_due, Decimal("7.50"))
+
+    @override_settings(
+        FINE_POLICY={
+            "PER_DAY": "1.00",
+            "DAILY_FEE_MULTIPLIER": "2",
+            "GRACE_DAYS": 2,
+            "MAX_FINE": "20.00",
+        }
+    )
+    def test_configured_policy_matches_wrappers(self):
+        rows = self.assertAnnotationsMatchWrappers()
+        # (overdue - grace) * (1.00 + 1.25 * 2), capped at 20
+        self.assertEqual([row.fine for row in rows], [7, 20, 0, 0])
+
+    def test_outstanding_balance_report(self):
+        Payment.objects.create(
+            borrowing=Borrowing.objects.filter(user=self.admin).first(),
+            money_to_pay="3.10",
+        )
+        Payment.objects.create(
+            borrowing=Borrowing.objects.filter(user=self.reader).first(),
+            status=Payment.StatusChoices.PAID,
+            money_to_pay="100",
+        )
+        with self.assertNumQueries(5):
+            report = outstanding_balance_report(today=self.today)
+        self.assertEqual(report["totals"]["open_borrowings"], 2)
+        self.assertEqual(report["totals"]["overdue_borrowings"], 1)
+        self.assertEqual(report["totals"]["accrued_fines"], 8)
+        self.assertEqual(report["totals"]["unpaid_amount"], Decimal("3.10"))
+        self.assertEqual(
+            [(row["email"], row["balance"]) for row in report["users"]],
+            [("reader@example.com", 8), ("admin@example.com", Decimal("3.10"))],
+        )
+
+    def test_outstanding_endpoint_is_staff_only(self):
+        url = reverse("payment:payments-outstanding")
+        self.client.force_authenticate(user=self.reader)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["totals"]["accrued_fines"], "8.00")
+        self.assertEqual(response.data["users"][0]["balance"], "8.00")
+
+
+@override_settings(STRIPE_WEBHOOK_KEY="whsec_test")
+class StripeWebhookIngestionTests(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(email="reader@example.com")
+        book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=5,
+            daily_fee=1.50,
+        )
+        borrowing = Borrowing.objects.create(
+            user=user, book=book, expected_return_date=date.today()
+        )
+        self.payments = [
+            Payment.objects.create(
+                borrowing=borrowing, session_id=f"cs_{i}", money_to_pay=3
+            )
+            for i in range(5)
+        ]
+        BorrowerState.objects.filter(pk=user.pk).update(pending_payments=5)
+        self.state = BorrowerState.objects.get(pk=user.pk)
+
+    def signed_event(self, event_id, session_id, event_type):
+        return signed_stripe_event(
+            {
+                "id": event_id,
+                "object": "event",
+                "type": event_type,
+                "data": {"object": {"id": session_id}},
+            },
+            "whsec_test",
+        )
+
+    def post_event(self, event_id, session_id, event_type="checkout.session.completed"):
+        payload, signature = self.signed_event(event_id, session_id, event_type)
+        return self.client.generic(
+            "POST",
+            reverse("payment:stripe-webhook"),
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature,
+        )
+
+    def test_acknowledges_with_a_single_insert(self):
+        with self.assertNumQueries(1):
+            response = self.post_event("evt_1", "cs_0")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(StripeEvent.objects.get().session_id, "cs_0")
+
+    def test_duplicate_events_are_recorded_once(self):
+        for _ in range(3):
+            self.assertEqual(self.post_event("evt_1", "cs_0").status_code, 200)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+
+        process_stripe_events.apply()
+        # A replay after processing is still a no-op
+        self.post_event("evt_1", "cs_0")
+        self.assertFalse(
+            StripeEvent.objects.filter(
+                status=StripeEvent.StatusChoices.PENDING
+            ).exists()
+        )
+
+    def test_unhandled_event_types_are_not_stored(self):
+        self.post_event("evt_1", "cs_0", event_type="charge.refunded")
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_batch_is_applied_with_constant_queries(self):
+        for i, payment in enumerate(self.payments):
+            self.post_event(f"evt_{i}", payment.session_id)
+
+        with self.assertNumQueries(9):
+            result = process_stripe_events.apply().get()
+
+        self.assertEqual(result, {"events": 5, "payments": 5})
+        self.assertEqual(
+            set(Payment.objects.values_list("status", flat=True)),
+            {Payment.StatusChoices.PAID},
+        )
+        self.state.refresh_from_db()
+        self.assertEqual(self.state.pending_payments, 0)
+
+    def test_event_before_session_is_saved_is_applied_later(self):
+        payment = self.payments[0]
+        Payment.objects.filter(pk=payment.pk).update(
+            status=Payment.StatusChoices.PENDING_SESSION, session_id=""
+        )
+        self.post_event("evt_1", "cs_late")
+
+        self.assertEqual(process_stripe_events.apply().get()["payments"], 0)
+        self.assertEqual(
+            StripeEvent.objects.get().status, StripeEvent.StatusChoices.UNMATCHED
+        )
+        # Still unmatched: not processed again
+        self.assertEqual(process_stripe_events.apply().get()["events"], 0)
+
+        Payment.objects.filter(pk=payment.pk).update(
+            status=Payment.StatusChoices.PENDING, session_id="cs_late"
+        )
+        self.assertEqual(process_stripe_events.apply().get()["payments"], 1)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.StatusChoices.PAID)
+        self.assertEqual(
+            StripeEvent.objects.get().status, StripeEvent.StatusChoices.PROCESSED
+        )
+
+    async def test_async_webhook_records_event(self):
+        payload, signature = self.signed_event(
+            "evt_1", "cs_0", "checkout.session.completed"
+        )
+        url = reverse("payment:stripe-webhook-async")
+        for _ in range(2):
+            response = await self.async_client.post(
+                url,
+                payload,
+                content_type="application/json",
+                headers={"stripe-signature": signature},
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(await StripeEvent.objects.acount(), 1)
+
+        response = await self.async_client.post(
+            url,
+            payload,
+            content_type="application/json",
+            headers={"stripe-signature": "t=1,v1=bad"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_session_id_is_unique_once_assigned(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Payment.objects.create(
+                borrowing=self.payments[0].borrowing,
+                session_id="cs_0",
+                money_to_pay=1,
+            )
+        for _ in range(2):
+            Payment.objects.create(
+                borrowing=self.payments[0].borrowing,
+                status=Payment.StatusChoices.PENDING_SESSION,
+                money_to_pay=1,
+            )
+
+
+class PaymentExportTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@example.com", password="password123", is_staff=True
+        )
+        self.client.force_authenticate(user=self.admin)
+        books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                author="Test Author",
+                cover=Book.CoverChoices.HARD,
+                inventory=5,
+                daily_fee="1.25",
+            )
+            for i in range(2)
+        ]
+        self.payments = []
+        for i, book in enumerate(books):
+            borrowing = Borrowing.objects.create(
+                user=User.objects.create_user(email=f"reader{i}@example.com"),
+                book=book,
+                expected_return_date=date.today(),
+            )
+            for payment_type, payment_status in (
+                (Payment.TypeChoices.PAYMENT, Payment.StatusChoices.PAID),
+                (Payment.TypeChoices.FINE, Payment.StatusChoices.PENDING),
+            ):
+                self.payments.append(
+                    Payment.objects.create(
+                        borrowing=borrowing,
+                        type=payment_type,
+                        status=payment_status,
+                        money_to_pay="2.50",
+                    )
+                )
+        self.book = books[1]
+
+    def export(self, **params):
+        response = self.client.get(reverse("payment:payments-export"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        rows = [
+            json.loads(line)
+            for line in self.export(export_format="ndjson").splitlines()
+        ]
+        self.assertEqual([row["id"] for row in rows], [p.id for p in self.payments])
+        self.assertEqual(rows[0]["money_to_pay"], "2.50")
+        self.assertEqual(rows[0]["user_email"], "reader0@example.com")
+
+    def test_filters(self):
+        rows = list(
+            csv.DictReader(
+                self.export(
+                    book=self.book.id, status="PENDING", type="FINE"
+                ).splitlines()
+            )
+        )
+        self.assertEqual([int(row["id"]) for row in rows], [self.payments[3].id])
+        self.assertEqual(rows[0]["book_id"], str(self.book.id))
+
+        response = self.client.get(
+            reverse("payment:payments-export"), {"status": "LOST"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(user=self.payments[0].borrowing.user)
+        response = self.client.get(reverse("payment:payments-export"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "payments.csv")
+            call_command("export_payments", "--type", "PAYMENT", "--output", output)
+            with open(output, newline="") as stream:
+                rows = list(csv.DictReader(stream))
+        self.assertEqual(
+            [int(row["id"]) for row in rows],
+            [self.payments[0].id, self.payments[2].id],
+        )
@@ -4,6 +4,7 @@ from .views import (
     PaymentViewSet,
     PaymentSuccessView,
     stripe_webhook,
+    stripe_webhook_async,
 )
 
 app_name = "payment"
@@ -18,4 +19,9 @@ urlpatterns = router.urls + [
         name="payment_cancel",
     ),
     path("webhooks/stripe/", stripe_webhook, name="stripe-webhook"),
+    path(
+        "webhooks/stripe/async/",
+        stripe_webhook_async,
+        name="stripe-webhook-async",
+    ),
 ]
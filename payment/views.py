@@ -1,38 +1,77 @@
 from rest_framework import viewsets, status
 from rest_framework.generics import get_object_or_404
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.decorators import (
+    action,
+    api_view,
+    authentication_classes,
+    permission_classes,
+    throttle_classes,
+)
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from django.conf import settings
+from django.db import transaction
 from rest_framework.views import APIView
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 
 from borrow.models import Borrowing
+from borrow.state import payments_opened
+from library_service.asyncapi import AsyncAPIView
+from library_service.db.routers import ReplicaReadMixin
+from library_service.expand import ExpandableQuerysetMixin
+from library_service.exports import export_response
+from library_service.values import ValuesListMixin
+from .exports import PAYMENT_EXPORT_COLUMNS, payments_for_export
+from .fees import outstanding_balance_report
 from .models import Payment
-from .serializers import PaymentSerializer
+from .serializers import PaymentExportSerializer, PaymentSerializer
 
 from django.http import HttpResponse
 import stripe
 
-from .service import calculate_total_price, create_payment_session
+from .service import (
+    arequest_payment_session,
+    calculate_total_price,
+    request_payment_session,
+    retry_payment_session,
+)
+from .webhooks import arecord_event, record_event
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 endpoint_secret = settings.STRIPE_WEBHOOK_KEY
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(
+    ReplicaReadMixin,
+    ExpandableQuerysetMixin,
+    ValuesListMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = "payments"
+
+    def use_values_list(self):
+        expand, fields = self.get_expansion()
+        return not expand and not fields
 
     def get_queryset(self):
+        queryset = super().get_queryset()
         user = self.request.user
         if user.is_staff:
-            return Payment.objects.all()
-        return Payment.objects.filter(
+            return queryset
+        return queryset.filter(
             borrowing__user=user,
-            status__in=[Payment.StatusChoices.PENDING, Payment.StatusChoices.PAID],
+            status__in=[
+                Payment.StatusChoices.PENDING_SESSION,
+                Payment.StatusChoices.SESSION_FAILED,
+                Payment.StatusChoices.PENDING,
+                Payment.StatusChoices.PAID,
+            ],
         )
 
     def filter_queryset(self, queryset):
@@ -41,7 +80,61 @@ class PaymentViewSet(viewsets.ModelViewSet):
             return queryset
         return queryset.filter(
             borrowing__user=user,
-            status__in=[Payment.StatusChoices.PENDING],
+            status__in=[
+                Payment.StatusChoices.PENDING_SESSION,
+                Payment.StatusChoices.SESSION_FAILED,
+                Payment.StatusChoices.PENDING,
+            ],
+        )
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def outstanding(self, request):
+        """Outstanding balance: accrued fines and unpaid payments, top debtors."""
+        try:
+            limit = min(int(request.query_params.get("limit", 50)), 500)
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+
+        report = outstanding_balance_report(limit=limit)
+        totals = report["totals"]
+        for key in ("accrued_fines", "unpaid_amount"):
+            totals[key] = f"{totals[key]:.2f}"
+        for row in report["users"]:
+            for key in ("accrued_fines", "unpaid_amount", "balance"):
+                row[key] = f"{row[key]:.2f}"
+        return Response(report)
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """Stream payments as CSV or NDJSON (staff only).
+
+        Filters: ``date_from`` and ``date_to`` (borrow date of the
+        borrowing), ``book``, ``status`` and ``type``.
+        """
+        params = PaymentExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+        export_format = filters.pop("export_format")
+        filters["payment_type"] = filters.pop("type", None)
+        return export_response(
+            request,
+            payments_for_export(**filters),
+            PAYMENT_EXPORT_COLUMNS,
+            export_format,
+            filename="payments",
+        )
+
+    @action(detail=True, methods=["post"], url_path="retry-session")
+    def retry_session(self, request, pk=None):
+        """Open the Stripe session of a ``SESSION_FAILED`` payment again."""
+        payment = self.get_object()
+        if payment.status != Payment.StatusChoices.SESSION_FAILED:
+            raise ValidationError(
+                {"status": "Only a payment whose session failed can be retried."}
+            )
+        payment = retry_payment_session(payment, request)
+        return Response(
+            PaymentSerializer(payment).data, status=status.HTTP_202_ACCEPTED
         )
 
     @action(detail=False, methods=["post"])
@@ -56,8 +149,12 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
         try:
             payment = Payment.objects.get(session_id=session_id)
-            payment.status = Payment.StatusChoices.PENDING
-            payment.save()
+            with transaction.atomic():
+                if payment.status == Payment.StatusChoices.PAID:
+                    # Due again, so it counts as unpaid once more
+                    payments_opened([payment])
+                payment.status = Payment.StatusChoices.PENDING
+                payment.save()
             return Response(
                 {"message": "Payment was canceled"}, status=status.HTTP_200_OK
             )
@@ -68,59 +165,110 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
 
 class CreatePaymentSessionView(APIView):
+    throttle_scope = "payments"
+
     def post(self, request, pk):
-        borrowing = get_object_or_404(Borrowing, pk=pk)
+        borrowing = get_object_or_404(Borrowing.objects.select_related("book"), pk=pk)
         money_to_pay = calculate_total_price(borrowing)
 
         try:
             # Call the service function to create the payment session
-            checkout_session = create_payment_session(
+            checkout_session = request_payment_session(
                 borrowing=borrowing,
                 amount=money_to_pay,
                 payment_type=Payment.TypeChoices.PAYMENT,
                 request=request,
             )
 
+            if checkout_session.status == Payment.StatusChoices.PENDING_SESSION:
+                # The session is opened in the background; poll the payment
+                return Response(
+                    {
+                        "payment_id": checkout_session.id,
+                        "status": checkout_session.status,
+                    },
+                    status=status.HTTP_202_ACCEPTED,
+                )
             return Response({"session_id": checkout_session.id})
         except stripe.error.StripeError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class CreatePaymentSessionAsyncView(AsyncAPIView):
+    """``CreatePaymentSessionView`` for ASGI; Stripe is awaited, not waited on."""
+
+    throttle_scope = "payments"
+
+    async def post(self, request, pk):
+        borrowing = (
+            await Borrowing.objects.select_related("book").filter(pk=pk).afirst()
+        )
+        if borrowing is None:
+            raise NotFound()
+        return await self.session_response(request, borrowing)
+
+    async def session_response(self, request, borrowing):
+        try:
+            checkout_session = await arequest_payment_session(
+                borrowing=borrowing,
+                amount=calculate_total_price(borrowing),
+                payment_type=Payment.TypeChoices.PAYMENT,
+                request=request,
+            )
+        except stripe.error.StripeError as e:
+            return self.respond({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if checkout_session.status == Payment.StatusChoices.PENDING_SESSION:
+            return self.respond(
+                {"payment_id": checkout_session.id, "status": checkout_session.status},
+                status=status.HTTP_202_ACCEPTED,
+            )
+        return self.respond({"session_id": checkout_session.id})
+
+
+def verify_stripe_event(request):
+    """The event in a webhook request, or ``None`` if it is not from Stripe."""
+    try:
+        return stripe.Webhook.construct_event(
+            request.body,
+            request.META.get("HTTP_STRIPE_SIGNATURE"),
+            settings.STRIPE_WEBHOOK_KEY,
+        )
+    except (ValueError, stripe.error.SignatureVerificationError):
+        return None
+
+
 @api_view(["POST"])
+@authentication_classes([])
 @permission_classes([AllowAny])
+# Stripe delivers bursts far above the anonymous rate; signatures gate access
+@throttle_classes([])
 @csrf_exempt
 def stripe_webhook(request):
-    payload = request.body
-    sig_header = request.META.get("HTTP_STRIPE_SIGNATURE")
-    endpoint_secret = settings.STRIPE_WEBHOOK_KEY
-
-    try:
-        event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
-    except ValueError:
-        return HttpResponse(status=400)
-    except stripe.error.SignatureVerificationError:
+    event = verify_stripe_event(request)
+    if event is None:
         return HttpResponse(status=400)
 
-    # Process event
-    if event["type"] == "checkout.session.completed":
-        session = event["data"]["object"]
-        session_id = session.get("id")
-
-        try:
-            payment = Payment.objects.get(session_id=session_id)
-            payment.status = Payment.StatusChoices.PAID
-            payment.save()
+    # Acknowledge right away; payments are updated by process_stripe_events
+    record_event(event)
+    return HttpResponse(status=200)
 
-            # Return a response to Stripe to acknowledge receipt of the event
-            return HttpResponse(status=200)
 
-        except Payment.DoesNotExist:
-            return HttpResponse(status=404)
+@csrf_exempt
+@require_POST
+async def stripe_webhook_async(request):
+    """``stripe_webhook`` for ASGI; no thread is held while the event is stored."""
+    event = verify_stripe_event(request)
+    if event is None:
+        return HttpResponse(status=400)
 
+    await arecord_event(event)
     return HttpResponse(status=200)
 
 
 class PaymentSuccessView(APIView):
+    throttle_scope = "payments"
+
     def get(self, request):
         session_id = request.query_params.get("session_id")
 
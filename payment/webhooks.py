@@ -0,0 +1,120 @@
+"""Stripe webhook ingestion.
+
+The webhook view only verifies the signature and records the event with
+``record_event``; a duplicate event id is dropped by the unique constraint,
+so Stripe's redeliveries and replays are acknowledged without doing any work.
+``process_events`` runs in Celery and applies pending events in batches,
+moving all the payments of a batch with one ``UPDATE`` and adjusting the
+borrowers' ``BorrowerState`` in the same transaction.
+
+A checkout can complete before its session id is saved on the payment,
+which with ``PAYMENT_SESSION_MODE = "async"`` happens in Celery after Stripe
+answers. Such events are set aside as ``UNMATCHED`` and put back in the
+queue by ``requeue_unmatched_events`` once a payment has their session id.
+"""
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from borrow.state import payments_closed
+from payment.models import Payment, StripeEvent
+
+CHECKOUT_COMPLETED = "checkout.session.completed"
+
+# Event types that change payment state; anything else is acknowledged only
+HANDLED_EVENT_TYPES = (CHECKOUT_COMPLETED,)
+
+
+def _event_row(event):
+    session = event["data"]["object"]
+    return StripeEvent(
+        event_id=event["id"],
+        type=event["type"],
+        session_id=session.get("id") or "",
+    )
+
+
+def record_event(event):
+    """Store a verified event for processing; duplicates are ignored."""
+    if event["type"] not in HANDLED_EVENT_TYPES:
+        return
+    # A single INSERT ... ON CONFLICT DO NOTHING, without a lookup first
+    StripeEvent.objects.bulk_create([_event_row(event)], ignore_conflicts=True)
+
+
+async def arecord_event(event):
+    if event["type"] not in HANDLED_EVENT_TYPES:
+        return
+    await StripeEvent.objects.abulk_create([_event_row(event)], ignore_conflicts=True)
+
+
+def mark_payments_paid(session_ids):
+    """Move every unpaid payment of ``session_ids`` to PAID.
+
+    Runs in the caller's transaction: the payments are read and locked, moved
+    with one ``UPDATE`` and uncounted from their borrowers' state.
+    """
+    if not session_ids:
+        return 0
+    unpaid = (
+        Payment.objects.filter(session_id__in=session_ids)
+        .exclude(status=Payment.StatusChoices.PAID)
+        .select_related("borrowing")
+        .only("type", "money_to_pay", "borrowing__user")
+    )
+    if connection.features.has_select_for_update_of:
+        unpaid = unpaid.select_for_update(of=("self",))
+    payments = list(unpaid)
+    if not payments:
+        return 0
+    Payment.objects.filter(pk__in=[payment.pk for payment in payments]).update(
+        status=Payment.StatusChoices.PAID
+    )
+    payments_closed(payments)
+    return len(payments)
+
+
+def requeue_unmatched_events():
+    """Queue ``UNMATCHED`` events again once a payment has their session."""
+    return StripeEvent.objects.filter(
+        status=StripeEvent.StatusChoices.UNMATCHED,
+        session_id__in=Payment.objects.exclude(session_id="").values("session_id"),
+    ).update(status=StripeEvent.StatusChoices.PENDING)
+
+
+def process_events(batch_size=1000):
+    """Apply one batch of pending events; returns event and payment counts.
+
+    Completed checkouts whose session is on no payment yet are marked
+    ``UNMATCHED`` instead of processed.
+    """
+    with transaction.atomic():
+        pending = StripeEvent.objects.filter(
+            status=StripeEvent.StatusChoices.PENDING
+        ).order_by("id")
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        batch = list(pending.values_list("id", "type", "session_id")[:batch_size])
+        if not batch:
+            return {"events": 0, "payments": 0}
+
+        completed = {
+            session_id
+            for _, event_type, session_id in batch
+            if event_type == CHECKOUT_COMPLETED and session_id
+        }
+        paid = mark_payments_paid(completed)
+        unmatched = completed - set(
+            Payment.objects.filter(session_id__in=completed).values_list(
+                "session_id", flat=True
+            )
+        )
+        processed = [row[0] for row in batch if row[2] not in unmatched]
+        StripeEvent.objects.filter(id__in=processed).update(
+            status=StripeEvent.StatusChoices.PROCESSED, processed_at=timezone.now()
+        )
+        if unmatched:
+            StripeEvent.objects.filter(
+                id__in=[row[0] for row in batch if row[2] in unmatched]
+            ).update(status=StripeEvent.StatusChoices.UNMATCHED)
+    return {"events": len(batch), "payments": paid}
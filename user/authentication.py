@@ -0,0 +1,169 @@
+"""JWT authentication that builds the user from the token's claims.
+
+``JWTAuthentication`` loads the user row on every request, although views
+such as the catalog only look at ``is_authenticated`` and ``is_staff``.
+Access tokens issued by ``/api/user/token/`` carry ``email``, ``is_staff``
+and ``auth_time`` (when the user logged in, kept across refreshes), and
+``ClaimsJWTAuthentication`` turns them into a ``TokenUser`` without a query.
+
+Tokens outlive changes to the user, so deactivating a user or changing the
+claimed fields revokes the tokens obtained before the change: the user id
+and the time go into Redis for one access-token lifetime, and tokens whose
+``auth_time`` is older are rejected. Validated tokens can also be kept in
+an in-process cache for ``JWT_CLAIMS_CACHE_TTL`` seconds, which skips the
+signature check and the revocation lookup; a revocation then reaches other
+processes within that TTL.
+
+Tokens issued before the claims existed are authenticated from the
+database, as is every request while Redis is unreachable. Revocations only
+reach the other processes through a shared Redis server: with the
+in-process ``FakeRedis`` every token is checked against the database like
+``JWTAuthentication`` does.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from redis.exceptions import RedisError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from library_service.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REVOKED_KEY = "auth:revoked:{}"
+# Every claim ClaimsJWTAuthentication relies on
+CLAIMS = ("email", "is_staff", "auth_time")
+
+
+def revoke_user_tokens(user_id, at=None):
+    """Reject the tokens ``user_id`` obtained up to ``at`` (default now).
+
+    Called by the user signals; code that changes users with ``update()``
+    must call it itself. A Redis failure is logged rather than raised, so
+    the change to the user is still saved.
+    """
+    at = time.time() if at is None else at
+    lifetime = jwt_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+    if _token_cache is not None:
+        _token_cache.discard_user(user_id)
+    try:
+        get_redis().set(REVOKED_KEY.format(user_id), repr(at), ex=int(lifetime) + 1)
+    except RedisError:
+        logger.exception("Could not revoke the tokens of user %s", user_id)
+
+
+def revoked_since(user_id):
+    value = get_redis().get(REVOKED_KEY.format(user_id))
+    return None if value is None else float(value)
+
+
+class TokenCache:
+    """Validated tokens by their raw bytes, bounded and expiring."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, raw_token):
+        with self._lock:
+            entry = self._entries.get(raw_token)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[raw_token]
+                return None
+            self._entries.move_to_end(raw_token)
+            return entry[1]
+
+    def set(self, raw_token, result, expires_in):
+        expires_at = time.monotonic() + min(self.ttl, expires_in)
+        with self._lock:
+            self._entries[raw_token] = (expires_at, result)
+            self._entries.move_to_end(raw_token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            stale = [
+                raw_token
+                for raw_token, (expires_at, (user, token)) in self._entries.items()
+                if user.id == user_id
+            ]
+            for raw_token in stale:
+                del self._entries[raw_token]
+
+
+_token_cache = None
+
+
+def get_token_cache():
+    """The process-wide token cache, or ``None`` when the TTL is 0."""
+    global _token_cache
+    ttl = getattr(settings, "JWT_CLAIMS_CACHE_TTL", 30)
+    if _token_cache is None and ttl > 0:
+        _token_cache = TokenCache(
+            ttl, getattr(settings, "JWT_CLAIMS_CACHE_SIZE", 10_000)
+        )
+    return _token_cache
+
+
+@receiver(setting_changed)
+def reset_token_cache(setting, **kwargs):
+    global _token_cache
+    if setting in ("JWT_CLAIMS_CACHE_TTL", "JWT_CLAIMS_CACHE_SIZE", "SIMPLE_JWT"):
+        _token_cache = None
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` answering from the token claims, not the database."""
+
+    def authenticate(self, request):
+        if not getattr(get_redis(), "shared", True):
+            # Revocations would not reach the other processes
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        cache = get_token_cache()
+        if cache is not None:
+            cached = cache.get(raw_token)
+            if cached is not None:
+                return cached
+
+        validated_token = self.get_validated_token(raw_token)
+        if any(claim not in validated_token for claim in CLAIMS):
+            # Issued before the claims were added
+            return super().get_user(validated_token), validated_token
+
+        user = TokenUser(validated_token)
+        try:
+            revoked_at = revoked_since(user.id)
+        except RedisError:
+            return super().get_user(validated_token), validated_token
+        if revoked_at is not None and validated_token["auth_time"] <= revoked_at:
+            raise AuthenticationFailed(
+                _("Token has been revoked"), code="token_revoked"
+            )
+
+        result = (user, validated_token)
+        if cache is not None:
+            cache.set(raw_token, result, validated_token["exp"] - time.time())
+        return result
@@ -0,0 +1,102 @@
+"""Password hashers with their cost set in ``PASSWORD_HASHER_COST``.
+
+``PASSWORD_HASHERS`` lists these instead of Django's own classes; they use
+the same algorithm names, so stored hashes verify either way. The first
+one hashes new passwords. When a user logs in with a hash from another
+algorithm or with another cost, ``check_password`` replaces it, so changing
+the settings upgrades (or cheapens) hashes as users come back.
+
+Hashing is CPU-bound and ``hashlib`` releases the GIL while it runs, so the
+async views hash in ``get_hash_executor()``, a pool bounded to
+``PASSWORD_HASH_WORKERS`` threads: the event loop keeps serving requests
+and a burst of logins queues instead of running all at once (scrypt and
+argon2 also hold their memory cost per hash in flight).
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class CostFromSettingsMixin:
+    """Sets the hasher's cost attributes from ``PASSWORD_HASHER_COST``."""
+
+    cost_key = None
+
+    def __init__(self):
+        cost = getattr(settings, "PASSWORD_HASHER_COST", {}).get(self.cost_key, {})
+        for name, value in cost.items():
+            if not hasattr(self, name):
+                raise ImproperlyConfigured(
+                    f"{type(self).__name__} has no cost parameter {name!r}."
+                )
+            setattr(self, name, value)
+
+
+class PBKDF2PasswordHasher(CostFromSettingsMixin, hashers.PBKDF2PasswordHasher):
+    cost_key = "pbkdf2"
+
+
+class ScryptPasswordHasher(CostFromSettingsMixin, hashers.ScryptPasswordHasher):
+    cost_key = "scrypt"
+
+
+class Argon2PasswordHasher(CostFromSettingsMixin, hashers.Argon2PasswordHasher):
+    """Needs ``argon2-cffi``; without it argon2 hashes cannot be checked."""
+
+    cost_key = "argon2"
+
+
+@receiver(setting_changed)
+def reset_hashers(setting, **kwargs):
+    # Django only clears its hasher cache for PASSWORD_HASHERS
+    if setting == "PASSWORD_HASHER_COST":
+        hashers.get_hashers.cache_clear()
+        hashers.get_hashers_by_algorithm.cache_clear()
+
+
+_hash_executor = None
+
+
+def get_hash_executor():
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "PASSWORD_HASH_WORKERS", None)
+            or os.cpu_count(),
+            thread_name_prefix="password-hash",
+        )
+    return _hash_executor
+
+
+@receiver(setting_changed)
+def reset_hash_executor(setting, **kwargs):
+    global _hash_executor
+    if setting == "PASSWORD_HASH_WORKERS" and _hash_executor is not None:
+        _hash_executor.shutdown(wait=False)
+        _hash_executor = None
+
+
+def _run_in_hash_executor(func, *args):
+    return sync_to_async(func, thread_sensitive=False, executor=get_hash_executor())(
+        *args
+    )
+
+
+async def amake_password(password):
+    """``make_password`` run in the hasher thread pool."""
+    return await _run_in_hash_executor(hashers.make_password, password)
+
+
+async def averify_password(password, encoded):
+    """``verify_password`` run in the hasher thread pool.
+
+    Returns ``(is_correct, must_update)``.
+    """
+    return await _run_in_hash_executor(hashers.verify_password, password, encoded)
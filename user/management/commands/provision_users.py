@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from user.provisioning import ProvisionFormatError, provision_users
+
+
+class Command(BaseCommand):
+    help = "Create users from a CSV of emails and temporary passwords."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Processes hashing passwords; defaults to one per CPU.",
+        )
+
+    def handle(self, *args, path, batch_size, workers, verbosity, **options):
+        def progress(report):
+            if verbosity >= 1:
+                self.stdout.write(
+                    f"{report['rows']} rows: {report['created']} created, "
+                    f"{report['existing']} existing, {report['rejected']} rejected "
+                    f"({report['rows'] / max(report['seconds'], 0.001):.0f} rows/s)"
+                )
+
+        try:
+            with open(path, encoding="utf-8-sig", newline="") as stream:
+                report = provision_users(
+                    stream, progress=progress, batch_size=batch_size, workers=workers
+                )
+        except (OSError, ProvisionFormatError, UnicodeDecodeError) as error:
+            raise CommandError(error)
+
+        for error in report["errors"]:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        if report["rejected"] > len(report["errors"]):
+            self.stderr.write(
+                f"... and {report['rejected'] - len(report['errors'])} more rejected rows"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {report['created']} of {report['rows']} users "
+                f"in {report['seconds']:.1f}s."
+            )
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 22:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0002_provision_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="provisionjob",
+            name="started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -5,16 +5,21 @@ from django.contrib.auth.models import (
 from django.db import models
 from django.utils.translation import gettext as _
 
+from user.hashers import amake_password, averify_password
+
 
 class UserManager(BaseUserManager):
 
     use_in_migrations = True
 
-    def _create_user(self, email, password, **extra_fields):
+    def _build_user(self, email, **extra_fields):
         if not email:
             raise ValueError("The given email must be set")
         email = self.normalize_email(email)
-        user = self.model(email=email, **extra_fields)
+        return self.model(email=email, **extra_fields)
+
+    def _create_user(self, email, password, **extra_fields):
+        user = self._build_user(email, **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
         return user
@@ -24,6 +29,15 @@ class UserManager(BaseUserManager):
         extra_fields.setdefault("is_superuser", False)
         return self._create_user(email, password, **extra_fields)
 
+    async def acreate_user(self, email, password=None, **extra_fields):
+        """``create_user`` hashing the password in the hasher thread pool."""
+        extra_fields.setdefault("is_staff", False)
+        extra_fields.setdefault("is_superuser", False)
+        user = self._build_user(email, **extra_fields)
+        user.password = await amake_password(password)
+        await user.asave(using=self._db)
+        return user
+
     def create_superuser(self, email, password, **extra_fields):
         extra_fields.setdefault("is_staff", True)
         extra_fields.setdefault("is_superuser", True)
@@ -44,3 +58,46 @@ class User(AbstractUser):
     REQUIRED_FIELDS = []
 
     objects = UserManager()
+
+    async def acheck_password(self, raw_password):
+        """``check_password`` hashing in the hasher thread pool.
+
+        Django's version hashes on the event loop. An outdated hash is
+        replaced, as ``check_password`` does.
+        """
+        is_correct, must_update = await averify_password(raw_password, self.password)
+        if is_correct and must_update:
+            self.password = await amake_password(raw_password)
+            await self.asave(update_fields=["password"])
+        return is_correct
+
+
+class ProvisionJob(models.Model):
+    """A CSV of users uploaded to ``/api/user/provision/``.
+
+    ``user.tasks.run_provision_job`` validates it and creates the users in
+    a Celery chord, one task per chunk. ``report`` holds the validation
+    while the chunks run and the counts once they are done. The file holds
+    temporary passwords, so ``csv`` is emptied once the job has run.
+    """
+
+    class StatusChoices(models.TextChoices):
+        PENDING = "PENDING", _("Pending")
+        RUNNING = "RUNNING", _("Running")
+        DONE = "DONE", _("Done")
+        FAILED = "FAILED", _("Failed")
+
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    status = models.CharField(
+        max_length=7, choices=StatusChoices.choices, default=StatusChoices.PENDING
+    )
+    csv = models.TextField()
+    report = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Provision job {self.pk} ({self.status})"
@@ -0,0 +1,242 @@
+"""Bulk user provisioning from a CSV of emails and temporary passwords.
+
+Creating a cohort through ``create_user`` hashes and saves one user at a
+time. Here rows are read one chunk at a time; the chunk's emails are
+checked against the existing users with one query, the passwords are
+hashed in a process pool and the new users are inserted with one
+``bulk_create``. Hashing dominates, so the pool is what makes a cohort of
+50k users take minutes: the rate grows with the number of cores. That is
+too long for a request: ``/api/user/provision/`` stores the upload as a
+``ProvisionJob`` and ``user.tasks.run_provision_job`` provisions it in
+Celery. A prefork worker is daemonic and may not start a pool, so there
+``plan_provisioning`` validates the file and ``provision_lines`` creates
+one chunk of it per task, hashing in the worker's own process.
+
+The workers get the configured hasher, cost included, with each task, so
+they need no Django setup of their own. ``bulk_create`` sends no signals;
+new users have nothing for the claim revocation in ``user.signals`` to do.
+"""
+
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher
+from django.core.exceptions import ValidationError
+from django.core.validators import EmailValidator
+
+from user.serializers import UserSerializer
+
+FIELDS = ("email", "password")
+
+_EMAIL_MAX_LENGTH = get_user_model()._meta.get_field("email").max_length
+_PASSWORD_MIN_LENGTH = UserSerializer.Meta.extra_kwargs["password"]["min_length"]
+_validate_email = EmailValidator()
+
+
+class ProvisionFormatError(Exception):
+    """The file cannot be read as a CSV of users at all."""
+
+
+def validate_row(row):
+    """``(email, password, errors)`` for one input row."""
+    errors = {}
+    email = get_user_model().objects.normalize_email((row.get("email") or "").strip())
+    password = row.get("password") or ""
+    try:
+        if len(email) > _EMAIL_MAX_LENGTH:
+            raise ValidationError(
+                f"Ensure this field has no more than {_EMAIL_MAX_LENGTH} characters."
+            )
+        _validate_email(email)
+    except ValidationError as error:
+        errors["email"] = error.messages[0]
+    if len(password) < _PASSWORD_MIN_LENGTH:
+        errors["password"] = (
+            f"Ensure this field has at least {_PASSWORD_MIN_LENGTH} characters."
+        )
+    return email, password, errors
+
+
+def read_csv(stream):
+    """``(line, row)`` pairs from a text stream with a header row."""
+    reader = csv.DictReader(stream)
+    missing = set(FIELDS) - set(reader.fieldnames or ())
+    if missing:
+        raise ProvisionFormatError(f"Missing columns: {', '.join(sorted(missing))}.")
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _encode(hasher, password):
+    return hasher.encode(password, hasher.salt())
+
+
+def _hash_passwords(executor, workers, passwords):
+    encode = partial(_encode, get_hasher())
+    if executor is None:
+        return [encode(password) for password in passwords]
+    # A few tasks per worker: balanced without a round trip per password
+    chunksize = max(1, len(passwords) // (workers * 4))
+    return list(executor.map(encode, passwords, chunksize=chunksize))
+
+
+def _existing_emails(emails):
+    return set(
+        get_user_model()
+        .objects.filter(email__in=emails)
+        .values_list("email", flat=True)
+    )
+
+
+def _created(hashes):
+    """How many of the ``{email: hash}`` users were inserted by this run.
+
+    ``ignore_conflicts`` does not say which rows it skipped; a user that
+    registered in the meantime has a hash of its own.
+    """
+    return sum(
+        hashes[email] == password
+        for email, password in get_user_model()
+        .objects.filter(email__in=hashes)
+        .values_list("email", "password")
+    )
+
+
+def _accept(chunk, seen, reject):
+    """``{email: (line, password)}`` for the valid rows of ``chunk``."""
+    users = {}
+    for line, row in chunk:
+        email, password, errors = validate_row(row)
+        if not errors and email in seen:
+            errors["email"] = "Duplicate email in this file."
+        if errors:
+            reject(line, errors)
+            continue
+        seen.add(email)
+        users[email] = (line, password)
+    return users
+
+
+def _provision(users, executor=None, workers=1):
+    """Insert the ``{email: password}`` users; ``(created, existing)``."""
+    User = get_user_model()
+    existing = _existing_emails(users)
+    emails = [email for email in users if email not in existing]
+    hashes = _hash_passwords(executor, workers, [users[email] for email in emails])
+    # An email registered since the check is skipped, not an error
+    User.objects.bulk_create(
+        [
+            User(email=email, password=password)
+            for email, password in zip(emails, hashes)
+        ],
+        ignore_conflicts=True,
+    )
+    created = _created(dict(zip(emails, hashes)))
+    return created, len(existing) + len(emails) - created
+
+
+def _new_report():
+    return {
+        "rows": 0,
+        "created": 0,
+        "existing": 0,
+        "rejected": 0,
+        "errors": [],
+        "seconds": 0.0,
+    }
+
+
+def _rejecter(report, max_errors):
+    def reject(line, errors):
+        report["rejected"] += 1
+        if len(report["errors"]) < max_errors:
+            report["errors"].append({"line": line, "errors": errors})
+
+    return reject
+
+
+def provision_users(
+    stream, progress=None, batch_size=None, workers=None, max_errors=100
+):
+    """Create the users in ``stream``; returns a report dict.
+
+    Emails that already have a user are counted as ``existing`` and left
+    alone. ``workers`` processes hash the passwords, one per CPU by
+    default; with 1 or fewer they are hashed in this process.
+    ``progress`` is called with the running report after every chunk.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, "USER_PROVISION_BATCH_SIZE", 2000)
+    if workers is None:
+        workers = getattr(settings, "USER_PROVISION_WORKERS", None) or os.cpu_count()
+    report = _new_report()
+    reject = _rejecter(report, max_errors)
+
+    started = time.perf_counter()
+    seen = set()
+    rows = read_csv(stream)
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        while chunk := list(islice(rows, batch_size)):
+            users = _accept(chunk, seen, reject)
+            created, existing = _provision(
+                {email: password for email, (_, password) in users.items()},
+                executor,
+                workers,
+            )
+            report["created"] += created
+            report["existing"] += existing
+            report["rows"] += len(chunk)
+            report["seconds"] = round(time.perf_counter() - started, 3)
+            if progress is not None:
+                progress(report)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def plan_provisioning(stream, batch_size=None, max_errors=100):
+    """Validate ``stream`` without writing anything; ``(report, chunks)``.
+
+    ``chunks`` holds the line numbers of the valid rows, ``batch_size`` to
+    a chunk, for ``provision_lines``. The report counts the rows and the
+    rejected ones; ``created`` and ``existing`` are left at 0.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, "USER_PROVISION_BATCH_SIZE", 2000)
+    report = _new_report()
+    reject = _rejecter(report, max_errors)
+    seen = set()
+    lines = []
+    for line, row in read_csv(stream):
+        report["rows"] += 1
+        if _accept([(line, row)], seen, reject):
+            lines.append(line)
+    chunks = [lines[i : i + batch_size] for i in range(0, len(lines), batch_size)]
+    return report, chunks
+
+
+def provision_lines(stream, lines):
+    """Create the users on ``lines`` of ``stream``, hashing in this process.
+
+    ``lines`` comes from ``plan_provisioning`` and names valid rows only.
+    Returns ``{"created": ..., "existing": ...}``.
+    """
+    wanted, last = set(lines), max(lines)
+    users = {}
+    for line, row in read_csv(stream):
+        if line in wanted:
+            email, password, _ = validate_row(row)
+            users[email] = password
+        if line >= last:
+            break
+    created, existing = _provision(users)
+    return {"created": created, "existing": existing}
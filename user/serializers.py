@@ -1,5 +1,11 @@
+import time
+
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from borrow.models import BorrowerState
+from user.models import ProvisionJob
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -27,3 +33,65 @@ class UserSerializer(serializers.ModelSerializer):
             user.save()
 
         return user
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = get_user_model()
+        fields = ("id", "email")
+
+
+class BorrowerStateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BorrowerState
+        fields = ("active_borrowing", "open_fines", "pending_payments")
+
+
+class ManageUserSerializer(UserSerializer):
+    """The caller's profile, with what they have out and owe."""
+
+    borrowing_state = serializers.SerializerMethodField()
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ("borrowing_state",)
+
+    def get_borrowing_state(self, user):
+        # One primary-key read; users who never borrowed have no row yet
+        state = BorrowerState.objects.filter(pk=user.pk).first()
+        return BorrowerStateSerializer(state or BorrowerState(user=user)).data
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Tokens carrying the claims ``ClaimsJWTAuthentication`` reads.
+
+    Refreshed access tokens copy them, ``auth_time`` included, from the
+    refresh token.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["email"] = user.email
+        token["is_staff"] = user.is_staff
+        token["auth_time"] = time.time()
+        return token
+
+
+class TokenCredentialsSerializer(serializers.Serializer):
+    """The fields of ``ClaimsTokenObtainPairSerializer``, without its check.
+
+    For the async token view, which checks the password itself.
+    """
+
+    email = serializers.CharField()
+    password = serializers.CharField(trim_whitespace=False)
+
+
+class UserProvisionSerializer(serializers.Serializer):
+    file = serializers.FileField()
+
+
+class ProvisionJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProvisionJob
+        fields = ("id", "status", "report", "created_at", "finished_at")
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+
+from user.authentication import revoke_user_tokens
+from user.models import User
+
+# Fields that, when changed, invalidate the claims in issued tokens
+CLAIMED_FIELDS = ("is_active", "is_staff", "email")
+
+
+@receiver(pre_save, sender=User)
+def revoke_tokens_on_claim_change(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(CLAIMED_FIELDS):
+        # e.g. the last_login update on every login
+        return
+    previous = User.objects.filter(pk=instance.pk).values(*CLAIMED_FIELDS).first()
+    if previous is not None and any(
+        previous[field] != getattr(instance, field) for field in CLAIMED_FIELDS
+    ):
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_delete(sender, instance, **kwargs):
+    revoke_user_tokens(instance.pk)
@@ -0,0 +1,79 @@
+import io
+
+from celery import chord, shared_task
+from django.utils import timezone
+
+from user.models import ProvisionJob
+from user.provisioning import (
+    ProvisionFormatError,
+    plan_provisioning,
+    provision_lines,
+)
+
+
+def _finish(job_id, report, status):
+    # Only a running job finishes, once
+    return ProvisionJob.objects.filter(
+        pk=job_id, status=ProvisionJob.StatusChoices.RUNNING
+    ).update(report=report, status=status, csv="", finished_at=timezone.now())
+
+
+@shared_task
+def run_provision_job(job_id):
+    """Validate a ``ProvisionJob`` and create its users in a chord of chunks.
+
+    Celery's prefork workers are daemonic and may not start the process
+    pool ``provision_users`` hashes with. Each chunk is a task of its own
+    instead, hashed in its worker's process; the Celery workers run the
+    chunks in parallel.
+    """
+    started = ProvisionJob.objects.filter(
+        pk=job_id, status=ProvisionJob.StatusChoices.PENDING
+    ).update(status=ProvisionJob.StatusChoices.RUNNING, started_at=timezone.now())
+    if not started:
+        # Delivered again after it ran
+        return None
+    job = ProvisionJob.objects.get(pk=job_id)
+    try:
+        report, chunks = plan_provisioning(io.StringIO(job.csv))
+    except Exception as error:
+        _finish(job_id, {"error": str(error)}, ProvisionJob.StatusChoices.FAILED)
+        if not isinstance(error, ProvisionFormatError):
+            raise
+        return None
+    report["chunks"] = len(chunks)
+    ProvisionJob.objects.filter(pk=job_id).update(report=report)
+    if chunks:
+        chord(provision_job_chunk.si(job_id, lines) for lines in chunks)(
+            finish_provision_job.s(job_id).on_error(fail_provision_job.si(job_id))
+        )
+    else:
+        finish_provision_job([], job_id)
+    return {"job": job_id, "chunks": len(chunks)}
+
+
+@shared_task
+def provision_job_chunk(job_id, lines):
+    job = ProvisionJob.objects.get(pk=job_id)
+    return provision_lines(io.StringIO(job.csv), lines)
+
+
+@shared_task
+def finish_provision_job(results, job_id):
+    job = ProvisionJob.objects.get(pk=job_id)
+    report = job.report
+    for result in results:
+        report["created"] += result["created"]
+        report["existing"] += result["existing"]
+    report["seconds"] = round((timezone.now() - job.started_at).total_seconds(), 3)
+    _finish(job_id, report, ProvisionJob.StatusChoices.DONE)
+    return report
+
+
+@shared_task
+def fail_provision_job(job_id):
+    # Users created by the chunks that did run stay; the upload can be
+    # sent again
+    job = ProvisionJob.objects.get(pk=job_id)
+    report = {**job.report, "error": "A chunk of the upload failed."}
+    _finish(job_id, report, ProvisionJob.StatusChoices.FAILED)
@@ -1,7 +1,25 @@
-from django.contrib.auth import get_user_model
+import io
+import os
+import tempfile
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model, hashers
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import override_settings
+from redis.exceptions import ConnectionError as RedisConnectionError
 from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
 from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book.models import Book
+from library_service.redis_client import get_redis
+from user.models import ProvisionJob
+from user.provisioning import provision_users
+from user.tasks import fail_provision_job, run_provision_job
 
 User = get_user_model()
 
@@ -77,3 +95,412 @@ class UserTests(APITestCase):
 
         response = self.client.patch(self.manage_user_url, payload)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# One test process: the in-process Redis is as shared as a real server
+SHARED_REDIS = {
+    "BACKEND": "library_service.redis_client.FakeRedis",
+    "OPTIONS": {"shared": True},
+}
+
+
+@override_settings(REDIS_CLIENT=SHARED_REDIS)
+class ClaimsAuthenticationTests(APITestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.user = User.objects.create_user(
+            email="reader@example.com", password="testpass123"
+        )
+        Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            cover=Book.CoverChoices.HARD,
+            inventory=3,
+            daily_fee="1.50",
+        )
+        self.books_url = reverse("books:book-list")
+
+    def login(self, email="reader@example.com", password="testpass123"):
+        response = self.client.post(
+            reverse("user:token_obtain_pair"), {"email": email, "password": password}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def get_books(self, access):
+        return self.client.get(self.books_url, HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_token_carries_claims(self):
+        token = AccessToken(self.login()["access"])
+        self.assertEqual(token["email"], "reader@example.com")
+        self.assertIs(token["is_staff"], False)
+        self.assertIn("auth_time", token)
+
+    @override_settings(JWT_CLAIMS_CACHE_TTL=0)
+    def test_catalog_reads_need_no_user_query(self):
+        access = self.login()["access"]
+        self.get_books(access)
+        # The list is cached; only authentication could still query
+        with self.assertNumQueries(0):
+            response = self.get_books(access)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Without the claims the user row is loaded
+        legacy = AccessToken.for_user(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_books(legacy).status_code, status.HTTP_200_OK)
+
+    @override_settings(JWT_CLAIMS_CACHE_TTL=0)
+    def test_staff_claim_allows_catalog_writes(self):
+        staff = User.objects.create_user(
+            email="staff@example.com", password="testpass123", is_staff=True
+        )
+        payload = {
+            "title": "Emma",
+            "author": "Jane Austen",
+            "cover": "SOFT",
+            "inventory": 1,
+            "daily_fee": "1.00",
+        }
+        for email, expected in (
+            ("reader@example.com", status.HTTP_403_FORBIDDEN),
+            (staff.email, status.HTTP_201_CREATED),
+        ):
+            access = self.login(email)["access"]
+            response = self.client.post(
+                self.books_url, payload, HTTP_AUTHORIZATION=f"Bearer {access}"
+            )
+            self.assertEqual(response.status_code, expected)
+
+    def test_deactivation_revokes_tokens(self):
+        tokens = self.login()
+        self.assertEqual(self.get_books(tokens["access"]).status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.get_books(tokens["access"])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data["code"], "token_revoked")
+
+        # A refreshed access token keeps the original auth_time
+        refreshed = self.client.post(
+            reverse("user:token_refresh"), {"refresh": tokens["refresh"]}
+        ).data["access"]
+        response = self.get_books(refreshed)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.get_books(self.login()["access"]).status_code, 200)
+
+    def test_changing_claims_revokes_tokens(self):
+        access = self.login()["access"]
+        self.user.last_login = None
+        self.user.save(update_fields=["last_login"])
+        self.assertEqual(self.get_books(access).status_code, status.HTTP_200_OK)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.get_books(access)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cache_skips_revocation_lookup(self):
+        access = self.login()["access"]
+        with patch(
+            "user.authentication.revoked_since", return_value=None
+        ) as revoked_since:
+            for _ in range(3):
+                self.assertEqual(self.get_books(access).status_code, 200)
+        revoked_since.assert_called_once()
+
+    @override_settings(JWT_CLAIMS_CACHE_TTL=0)
+    def test_falls_back_to_database_without_redis(self):
+        access = self.login()["access"]
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with patch(
+            "user.authentication.revoked_since", side_effect=RedisConnectionError
+        ):
+            response = self.get_books(access)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data["code"], "user_inactive")
+
+    def test_saves_users_without_redis(self):
+        self.user.is_active = False
+        with patch.object(
+            get_redis(), "set", side_effect=RedisConnectionError
+        ), self.assertLogs("user.authentication", "ERROR"):
+            self.user.save()
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+
+    def test_in_process_redis_checks_the_database(self):
+        with override_settings(
+            REDIS_CLIENT={"BACKEND": "library_service.redis_client.FakeRedis"}
+        ):
+            access = self.login()["access"]
+            self.assertEqual(self.get_books(access).status_code, 200)
+            # Another process deactivated the user: no revocation here
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            response = self.get_books(access)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data["code"], "user_inactive")
+
+
+FAST_HASHER_COST = {
+    "scrypt": {"work_factor": 2**4, "block_size": 8, "parallelism": 1},
+    "pbkdf2": {"iterations": 10},
+}
+SCRYPT_FIRST = [
+    "user.hashers.ScryptPasswordHasher",
+    "user.hashers.PBKDF2PasswordHasher",
+]
+
+
+@override_settings(PASSWORD_HASHERS=SCRYPT_FIRST, PASSWORD_HASHER_COST=FAST_HASHER_COST)
+class PasswordHashingTests(APITestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.credentials = {"email": "reader@example.com", "password": "testpass123"}
+        with override_settings(PASSWORD_HASHERS=SCRYPT_FIRST[::-1]):
+            self.user = User.objects.create_user(**self.credentials)
+
+    def test_cost_comes_from_settings(self):
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$10$"))
+        user = User.objects.create_user(email="new@example.com", password="newpass123")
+        self.assertTrue(user.password.startswith("scrypt$16$"))
+
+    def test_login_rehashes_outdated_hash(self):
+        url = reverse("user:token_obtain_pair")
+        response = self.client.post(url, self.credentials)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("scrypt$16$"))
+
+        with override_settings(
+            PASSWORD_HASHER_COST={**FAST_HASHER_COST, "scrypt": {"work_factor": 2**5}}
+        ):
+            self.client.post(url, self.credentials)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("scrypt$32$"))
+        # A new hash is not a claim change: earlier tokens stay valid
+        response = self.client.get(
+            reverse("books:book-list"),
+            HTTP_AUTHORIZATION=f"Bearer {response.data['access']}",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    async def test_async_register_and_token(self):
+        credentials = {"email": "new@example.com", "password": "newpass123"}
+        response = await self.async_client.post(
+            reverse("user:create-async"), credentials, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["email"], credentials["email"])
+        self.assertNotIn("password", response.json())
+        user = await User.objects.aget(email=credentials["email"])
+        self.assertTrue(user.password.startswith("scrypt$16$"))
+
+        response = await self.async_client.post(
+            reverse("user:token_obtain_pair-async"),
+            credentials,
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(AccessToken(response.json()["access"])["email"], user.email)
+
+        response = await self.async_client.post(
+            reverse("user:create-async"), credentials, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_async_token_hashes_in_pool(self):
+        threads = []
+        verify_password = hashers.verify_password
+
+        def recording_verify_password(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return verify_password(*args, **kwargs)
+
+        with patch(
+            "django.contrib.auth.hashers.verify_password", recording_verify_password
+        ):
+            response = await self.async_client.post(
+                reverse("user:token_obtain_pair-async"),
+                self.credentials,
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith("password-hash"))
+        # Rehashed as the sync login does
+        await self.user.arefresh_from_db()
+        self.assertTrue(self.user.password.startswith("scrypt$16$"))
+
+    async def test_async_token_rejects_bad_credentials(self):
+        self.user.is_active = False
+        await self.user.asave()
+        for credentials in (
+            {**self.credentials, "password": "wrongpass"},
+            {**self.credentials, "email": "nobody@example.com"},
+            self.credentials,
+        ):
+            response = await self.async_client.post(
+                reverse("user:token_obtain_pair-async"),
+                credentials,
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(
+                response.json()["detail"],
+                "No active account found with the given credentials",
+            )
+            self.assertIn("WWW-Authenticate", response)
+
+
+@override_settings(PASSWORD_HASHERS=SCRYPT_FIRST, PASSWORD_HASHER_COST=FAST_HASHER_COST)
+class UserProvisioningTests(APITestCase):
+    CSV = (
+        "email,password\n"
+        "ann@example.com,temppass1\n"
+        "existing@example.com,temppass2\n"
+        "not-an-email,temppass3\n"
+        "bob@Example.COM,temppass4\n"
+        "ann@example.com,temppass5\n"
+        "cid@example.com,abc\n"
+        "dee@example.com,temppass6\n"
+    )
+
+    def setUp(self):
+        get_redis().flushdb()
+        self.existing = User.objects.create_user(
+            email="existing@example.com", password="oldpass123"
+        )
+        self.url = reverse("user:provision")
+
+    def upload(self, content, user=None):
+        self.client.force_authenticate(
+            user or User.objects.create_user(email="staff@example.com", is_staff=True)
+        )
+        return self.client.post(
+            self.url,
+            {"file": SimpleUploadedFile("users.csv", content.encode())},
+            format="multipart",
+        )
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True, USER_PROVISION_BATCH_SIZE=2)
+    @patch("os.cpu_count", return_value=4)
+    @patch(
+        "user.provisioning.ProcessPoolExecutor",
+        side_effect=AssertionError(
+            "daemonic processes are not allowed to have children"
+        ),
+    )
+    def test_creates_new_users(self, executor, cpu_count):
+        # With the default workers, as a prefork worker that cannot fork runs it
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(self.CSV)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], ProvisionJob.StatusChoices.PENDING)
+
+        response = self.client.get(
+            reverse("user:provision-job", args=[response.data["id"]])
+        )
+        self.assertEqual(response.data["status"], ProvisionJob.StatusChoices.DONE)
+        report = response.data["report"]
+        self.assertEqual(
+            {key: report[key] for key in ("rows", "created", "existing")},
+            {"rows": 7, "created": 3, "existing": 1},
+        )
+        self.assertEqual(
+            [(e["line"], *e["errors"]) for e in report["errors"]],
+            [(4, "email"), (6, "email"), (7, "password")],
+        )
+        # The temporary passwords are not kept
+        self.assertEqual(ProvisionJob.objects.get().csv, "")
+        self.assertTrue(
+            User.objects.get(email="bob@example.com").check_password("temppass4")
+        )
+        self.assertTrue(
+            User.objects.get(email="ann@example.com").check_password("temppass1")
+        )
+        # Existing users keep their password
+        self.existing.refresh_from_db()
+        self.assertTrue(self.existing.check_password("oldpass123"))
+        self.assertEqual(report["chunks"], 2)
+        executor.assert_not_called()
+
+    def test_failed_chunk_fails_the_job(self):
+        job = ProvisionJob.objects.create(csv=self.CSV)
+        with patch("user.tasks.chord") as chord:
+            run_provision_job(job.pk)
+        # Eager chords never call the errback, so it is checked and run here
+        (callback,) = chord.return_value.call_args.args
+        (errback,) = callback.options["link_error"]
+        self.assertEqual(errback, fail_provision_job.si(job.pk))
+
+        fail_provision_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProvisionJob.StatusChoices.FAILED)
+        self.assertEqual(job.report["rows"], 7)
+        self.assertIn("error", job.report)
+        self.assertEqual(job.csv, "")
+
+    def test_dedupes_and_inserts_per_chunk(self):
+        content = "email,password\n" + "".join(
+            f"user{i}@example.com,temppass{i}\n" for i in range(4)
+        )
+        # Per chunk of two: one existing-email query, one insert and one
+        # query for the users it inserted
+        with self.assertNumQueries(6):
+            report = provision_users(io.StringIO(content), batch_size=2, workers=1)
+        self.assertEqual(report["created"], 4)
+
+    def test_users_registered_since_the_check_are_existing(self):
+        content = "email,password\nann@example.com,temppass1\n" + (
+            "existing@example.com,temppass2\n"
+        )
+        with patch("user.provisioning._existing_emails", return_value=set()):
+            report = provision_users(io.StringIO(content), workers=1)
+        self.assertEqual((report["created"], report["existing"]), (1, 1))
+        self.existing.refresh_from_db()
+        self.assertTrue(self.existing.check_password("oldpass123"))
+
+    def test_hashes_in_process_pool(self):
+        content = "email,password\n" + "".join(
+            f"user{i}@example.com,temppass{i}\n" for i in range(6)
+        )
+        report = provision_users(io.StringIO(content), workers=2)
+        self.assertEqual(report["created"], 6)
+        user = User.objects.get(email="user5@example.com")
+        self.assertTrue(user.password.startswith("scrypt$16$"))
+        self.assertTrue(user.check_password("temppass5"))
+
+    def test_rejects_bad_files(self):
+        response = self.upload("mail,pass\nann@example.com,temppass1\n")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Missing columns", response.data["file"])
+        self.assertFalse(ProvisionJob.objects.exists())
+
+    def test_staff_only(self):
+        response = self.upload(self.CSV, user=self.existing)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(User.objects.filter(email="ann@example.com").exists())
+
+    def test_command(self):
+        out, err = io.StringIO(), io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cohort.csv")
+            with open(path, "w") as cohort:
+                cohort.write(self.CSV)
+            call_command(
+                "provision_users",
+                path,
+                "--batch-size",
+                "4",
+                "--workers",
+                "1",
+                stdout=out,
+                stderr=err,
+            )
+        self.assertIn("4 rows: 2 created, 1 existing, 1 rejected", out.getvalue())
+        self.assertIn("Created 3 of 7 users", out.getvalue())
+        self.assertIn("Line 7:", err.getvalue())
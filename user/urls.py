@@ -6,7 +6,14 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
 )
 
-from user.views import CreateUserView, ManageUserView
+from user.views import (
+    CreateUserAsyncView,
+    CreateUserView,
+    ManageUserView,
+    ProvisionJobView,
+    ProvisionUsersView,
+    TokenObtainPairAsyncView,
+)
 
 app_name = "user"
 
@@ -16,4 +23,13 @@ urlpatterns = [
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("token/verify/", TokenVerifyView.as_view(), name="token_verify"),
     path("me/", ManageUserView.as_view(), name="manage"),
+    path("provision/", ProvisionUsersView.as_view(), name="provision"),
+    path("provision/<int:pk>/", ProvisionJobView.as_view(), name="provision-job"),
+    # Async variants of register and token, for ASGI deployments
+    path("register/async/", CreateUserAsyncView.as_view(), name="create-async"),
+    path(
+        "token/async/",
+        TokenObtainPairAsyncView.as_view(),
+        name="token_obtain_pair-async",
+    ),
 ]
@@ -1,6 +1,30 @@
-from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated
-from user.serializers import UserSerializer
+import io
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rest_framework import generics, status
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework_simplejwt.serializers import TokenObtainSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from library_service.asyncapi import AsyncAPIView
+from user.hashers import amake_password
+from user.models import ProvisionJob
+from user.provisioning import ProvisionFormatError, read_csv
+from user.serializers import (
+    ManageUserSerializer,
+    ProvisionJobSerializer,
+    TokenCredentialsSerializer,
+    UserProvisionSerializer,
+    UserSerializer,
+)
+from user.tasks import run_provision_job
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -8,8 +32,90 @@ class CreateUserView(generics.CreateAPIView):
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
-    serializer_class = UserSerializer
+    serializer_class = ManageUserSerializer
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
         return self.request.user
+
+
+class ProvisionUsersView(generics.GenericAPIView):
+    serializer_class = UserProvisionSerializer
+    permission_classes = (IsAdminUser,)
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request):
+        """Queue the users in an uploaded CSV of emails and passwords (staff only).
+
+        The users are created in Celery; poll ``provision/<id>/`` for the
+        report. Emails that already have a user are skipped and invalid
+        rows are reported; the rest are created in chunks.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            content = serializer.validated_data["file"].read().decode("utf-8-sig")
+            # Checks the header only; the rows are read by the task
+            next(read_csv(io.StringIO(content)), None)
+        except (ProvisionFormatError, UnicodeDecodeError) as error:
+            raise ValidationError({"file": str(error)})
+        with transaction.atomic():
+            job = ProvisionJob.objects.create(created_by=request.user, csv=content)
+            transaction.on_commit(lambda: run_provision_job.delay(job.pk))
+        return Response(
+            ProvisionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED
+        )
+
+
+class ProvisionJobView(generics.RetrieveAPIView):
+    queryset = ProvisionJob.objects.all()
+    serializer_class = ProvisionJobSerializer
+    permission_classes = (IsAdminUser,)
+
+
+class CreateUserAsyncView(AsyncAPIView):
+    """``CreateUserView`` for ASGI, hashing in the hasher thread pool."""
+
+    authentication_class = None
+
+    async def post(self, request):
+        serializer = UserSerializer(data=request.data)
+        # The unique email validator queries the database
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        user = await get_user_model().objects.acreate_user(**serializer.validated_data)
+        return self.respond(UserSerializer(user).data, status=status.HTTP_201_CREATED)
+
+
+class TokenObtainPairAsyncView(AsyncAPIView):
+    """``TokenObtainPairView`` for ASGI, hashing in the hasher thread pool.
+
+    Checks the credentials as ``ModelBackend`` does, including rehashing an
+    outdated password hash.
+    """
+
+    authentication_class = None
+
+    async def post(self, request):
+        serializer = TokenCredentialsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        email = serializer.validated_data["email"]
+        password = serializer.validated_data["password"]
+
+        user = await get_user_model().objects.filter(email=email).afirst()
+        if user is None:
+            # Take as long as a wrong password, as ModelBackend does
+            await amake_password(password)
+        elif not await user.acheck_password(password):
+            user = None
+        if user is None or not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                TokenObtainSerializer.default_error_messages["no_active_account"],
+                "no_active_account",
+            )
+
+        refresh = import_string(jwt_settings.TOKEN_OBTAIN_SERIALIZER).get_token(user)
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            await sync_to_async(update_last_login)(None, user)
+        return self.respond(
+            {"refresh": str(refresh), "access": str(refresh.access_token)}
+        )